@@ -0,0 +1,227 @@
+"""Benchmarks the custom_validate parse and compare hot paths offline using recorded or synthesised device output.
+
+Synthesised (default) creates NX-OS 'show ip route vrf all' and 'show bgp vrf all ipv4 unicast' output with --routes and --prefixes
+entries spread over --vrfs VRFs, a --static fraction of them are static routes (or local BGP prefixes) that make up the desired state.
+Recorded uses the output of a host (--recorded folder, --host) in the same layout as ans.replay, the collector cache and nxos_sim
+(file per cmd) along with its desired state (--desired). --scale clones every route and BGP prefix that many times (with new prefixes)
+so a small lab's output can be made as big as a production table. --save writes the output used to a folder that can be replayed.
+
+Each cmd is timed parsing (json and streaming if ijson is installed) and comparing (napalm and native engine), then the whole host
+is run through validation as custom_validate does it (--workers, --snapshot). Times are the best of --runs.
+
+python custom_val_builder/benchmark.py --routes 100000 --prefixes 20000
+python custom_val_builder/benchmark.py --recorded ~/recorded --host DC1-N9K-BORDER01 --desired ~/device_configs/DC1-N9K-BORDER01/validate/nxos_desired_state.yml --scale 50
+
+-synthesise: Creates the route and BGP table output and desired state
+-scale: Clones every route and BGP prefix in the output
+-load_recorded: Loads the output and desired state of a recorded host
+-bench: Times the parse and compare of each cmd and the validation of the whole host
+"""
+
+import argparse
+import copy
+import io
+import ipaddress
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import yaml
+
+# Shared helpers (module_utils) are in the root of the repo which isn't on the python path of the builder
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from module_utils import columnar, parsers
+from module_utils.collector import cmd_filename
+from module_utils.compare import compare as native_compare
+from module_utils.validation import validate
+from napalm.base import validate as napalm_validate
+
+RTE_CMD = 'show ip route vrf all'
+BGP_CMD = 'show bgp vrf all ipv4 unicast'
+
+
+############################################ Output of the device ############################################
+# PREFIXES: Unique /24s from 10.0.0.0, NUM is the index of the prefix
+def prefix(num, base='10.0.0.0'):
+    return '{}/24'.format(ipaddress.IPv4Address(base) + num * 256)
+
+
+def synthesise(routes, prefixes, vrfs, static):
+    vrf_names = ['default'] + ['VRF{:03d}'.format(idx) for idx in range(1, vrfs)]
+    rte_vrf, bgp_vrf = ([] for i in range(2))
+    rte_desired, bgp_desired = ({} for i in range(2))
+    static_every = max(int(round(1 / static)), 1) if static > 0 else 0
+
+    for vrf_idx, vrf in enumerate(vrf_names):
+        rte_rows, bgp_rows = ([] for i in range(2))
+        for num in range(vrf_idx, routes, vrfs):
+            pfx = prefix(num)
+            if static_every != 0 and num % static_every == 0:
+                path = {'ipnexthop': '192.168.1.1', 'ifname': 'Vlan10', 'uptime': 'P1D', 'pref': '1', 'metric': '0',
+                        'clientname': 'static', 'ubest': 'true'}
+                rte_desired[pfx] = {'vrf': vrf.replace('default', 'global'), 'ad': '1', 'next-hop': '192.168.1.1'}
+            else:
+                path = {'ipnexthop': '192.168.100.{}'.format(num % 250 + 1), 'ifname': 'Eth1/1', 'uptime': 'P1D', 'pref': '110',
+                        'metric': '41', 'clientname': 'ospf-DC_UNDERLAY', 'type': 'intra', 'tag': '0', 'ubest': 'true'}
+            rte_rows.append({'ipprefix': pfx, 'ucast-nhops': '1', 'mcast-nhops': '0', 'attached': 'false',
+                             'TABLE_path': {'ROW_path': [path]}})
+        for num in range(vrf_idx, prefixes, vrfs):
+            pfx = prefix(num, '172.16.0.0')
+            path_type = 'local' if static_every != 0 and num % static_every == 0 else 'external'
+            if path_type == 'local':
+                bgp_desired[pfx] = {'vrf': vrf.replace('default', 'global'), 'best': 'bestpath', 'type': 'local', 'status': 'valid'}
+            bgp_rows.append({'ipprefix': pfx, 'totalpaths': '1', 'bestpathnr': '1',
+                             'TABLE_path': {'ROW_path': [{'pathnr': '0', 'status': 'valid', 'best': 'bestpath', 'type': path_type,
+                                                          'statuscode': '*', 'bestcode': '>', 'typecode': 'l' if path_type == 'local' else 'e',
+                                                          'ipnexthop': '0.0.0.0', 'weight': '32768', 'origin': 'i',
+                                                          'aspath': '' if path_type == 'local' else '65001 65002'}]}})
+        rte_vrf.append({'vrf-name-out': vrf, 'TABLE_addrf': {'ROW_addrf': {'addrf': 'ipv4', 'TABLE_prefix': {'ROW_prefix': rte_rows}}}})
+        bgp_vrf.append({'vrf-name-out': vrf, 'vrf-router-id': '192.168.101.1', 'vrf-local-as': '65001',
+                        'TABLE_afi': {'ROW_afi': {'afi': '1', 'TABLE_safi': {'ROW_safi': {'safi': '1', 'af-name': 'IPv4 Unicast',
+                                      'TABLE_rd': {'ROW_rd': {'TABLE_prefix': {'ROW_prefix': bgp_rows}}}}}}}})
+
+    cmd_output = {RTE_CMD + ' | json': json.dumps({'TABLE_vrf': {'ROW_vrf': rte_vrf}}),
+                  BGP_CMD + ' | json': json.dumps({'TABLE_vrf': {'ROW_vrf': bgp_vrf}})}
+    return cmd_output, {RTE_CMD: rte_desired, BGP_CMD: bgp_desired}
+
+
+# SCALE: Every ROW_prefix entry is cloned (times - 1) with a prefix from 100.64.0.0 upwards, the originals are kept unchanged
+def scale(cmd_output, times):
+    counter = [0]
+
+    def clone_rows(elem):
+        if isinstance(elem, dict):
+            for key, value in elem.items():
+                if key == 'ROW_prefix':
+                    rows = value if isinstance(value, list) else [value]
+                    clones = []
+                    for each_row in rows:
+                        for idx in range(times - 1):
+                            clone = copy.deepcopy(each_row)
+                            clone['ipprefix'] = prefix(counter[0], '100.64.0.0')
+                            counter[0] += 1
+                            clones.append(clone)
+                    elem[key] = rows + clones
+                else:
+                    clone_rows(value)
+        elif isinstance(elem, list):
+            for each_elem in elem:
+                clone_rows(each_elem)
+
+    scaled = {}
+    for cmd, output in cmd_output.items():
+        if output == None or times <= 1:
+            scaled[cmd] = output
+            continue
+        json_output = json.loads(output)
+        clone_rows(json_output)
+        scaled[cmd] = json.dumps(json_output)
+    return scaled
+
+
+def load_recorded(directory, host, desired_file):
+    with open(os.path.expanduser(desired_file), 'r') as file_content:
+        tmp_desired_state = yaml.safe_load(file_content)['cmds']
+    cmd_output, desired_state = ({} for i in range(2))
+    for each_cmd in tmp_desired_state:
+        desired_state.update(each_cmd)
+        cmd = list(each_cmd)[0] + ' | json'
+        filename = os.path.join(os.path.expanduser(directory), host, cmd_filename(cmd))
+        cmd_output[cmd] = None
+        if os.path.exists(filename):
+            with open(filename, 'r') as file_content:
+                cmd_output[cmd] = file_content.read()
+    return cmd_output, desired_state
+
+
+# SAVE: Same layout as ans.replay and nxos_sim (folder per host, file per cmd) along with the desired state
+def save(directory, host, cmd_output, desired_state):
+    host_dir = os.path.join(os.path.expanduser(directory), host)
+    os.makedirs(host_dir, exist_ok=True)
+    for cmd, output in cmd_output.items():
+        if output != None:
+            with open(os.path.join(host_dir, cmd_filename(cmd)), 'w') as file_content:
+                file_content.write(output)
+    with open(os.path.join(host_dir, 'nxos_desired_state.yml'), 'w') as file_content:
+        yaml.safe_dump({'cmds': [{cmd: desired} for cmd, desired in desired_state.items()]}, file_content, default_flow_style=False)
+
+
+############################################ Benchmark ############################################
+# BEST: Best time (secs) of running func runs times, also returns the result of the last run
+def best(func, runs):
+    times = []
+    for idx in range(runs):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def bench(cmd_output, desired_state, runs, workers, snapshot):
+    print('{:<45}{:>10}{:>10}{:>12}{:>10}{:>10}{:>10}'.format('cmd', 'size (MB)', 'json', 'stream', 'entries', 'napalm', 'native'))
+    for cmd, output in cmd_output.items():
+        if output == None:
+            continue
+        reg_cmd = parsers.lookup_cmd('nxos', cmd)
+        if reg_cmd == None:
+            continue
+        key, parser = parsers.PARSERS['nxos'][reg_cmd]
+        json_time, actual_state = best(lambda: parser(json.loads(output)), runs)
+        stream_time = '-'
+        if parsers.ijson != None and reg_cmd in parsers.STREAM_PARSERS['nxos']:
+            stream_parser = parsers.STREAM_PARSERS['nxos'][reg_cmd]
+            stream_time = '{:.3f}'.format(best(lambda: stream_parser(io.BytesIO(output.encode())), runs)[0])
+        napalm_time, native_time = ('-' for i in range(2))
+        # DICT: napalm needs nested dicts (it pops from its copy of the actual state), the columnar table (PrefixTable) is only for the native compare
+        dict_state = columnar.to_dict(actual_state)
+        if desired_state.get(key) != None:
+            # napalm removes '_mode' from the desired state so each run gets its own copy
+            napalm_time = '{:.3f}'.format(best(lambda: napalm_validate.compare(copy.deepcopy(desired_state[key]), dict_state), runs)[0])
+            native_time = '{:.3f}'.format(best(lambda: native_compare(desired_state[key], actual_state), runs)[0])
+        print('{:<45}{:>10.2f}{:>10.3f}{:>12}{:>10}{:>10}{:>10}'.format(key[:44], len(output) / 1e6, json_time, stream_time,
+                                                                      len(dict_state), napalm_time, native_time))
+
+    # HOST: Whole host as custom_validate runs it, snapshot is run once first so the timed runs compare against a snapshot
+    native = list(desired_state)
+    state_path = tempfile.mkdtemp() if snapshot else None
+    try:
+        snap = (state_path, 'benchmark') if snapshot else None
+        if snapshot:
+            validate('nxos', cmd_output, copy.deepcopy(desired_state), workers, 0, native, snap)
+        host_time, report = best(lambda: validate('nxos', cmd_output, copy.deepcopy(desired_state), workers, 0, native, snap), runs)
+    finally:
+        if state_path != None:
+            shutil.rmtree(state_path)
+    print('\nHost validation (native, workers {}, snapshot {}): {:.3f}s, complies {}'.format(
+        workers, snapshot, host_time, all([each_cmpl.get('complies', True) for each_cmpl in report.values()])))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the custom_validate parse and compare offline')
+    parser.add_argument('--routes', type=int, default=50000, help='Routes in the synthesised route table')
+    parser.add_argument('--prefixes', type=int, default=20000, help='Prefixes in the synthesised BGP table')
+    parser.add_argument('--vrfs', type=int, default=4, help='VRFs the synthesised routes and prefixes are spread over')
+    parser.add_argument('--static', type=float, default=0.1, help='Fraction of synthesised routes/prefixes that are in the desired state')
+    parser.add_argument('--recorded', help='Folder of recorded output (folder per host, file per cmd) rather than synthesised')
+    parser.add_argument('--host', help='Host in the recorded folder')
+    parser.add_argument('--desired', help='Desired state file (nxos_desired_state.yml) of the recorded host')
+    parser.add_argument('--scale', type=int, default=1, help='Times to clone every route and BGP prefix')
+    parser.add_argument('--runs', type=int, default=3, help='Times each is run, the best time is shown')
+    parser.add_argument('--workers', type=int, default=1, help='Processes used to validate the host')
+    parser.add_argument('--snapshot', action='store_true', help='Validate the host against a snapshot of the same output')
+    parser.add_argument('--save', help='Folder to save the output and desired state to (can be used with ans.replay or nxos_sim)')
+    args = parser.parse_args()
+
+    if args.recorded != None:
+        if args.host == None or args.desired == None:
+            parser.error('--recorded needs --host and --desired')
+        cmd_output, desired_state = load_recorded(args.recorded, args.host, args.desired)
+    else:
+        cmd_output, desired_state = synthesise(args.routes, args.prefixes, args.vrfs, args.static)
+    cmd_output = scale(cmd_output, args.scale)
+    if args.save != None:
+        save(args.save, args.host or 'benchmark', cmd_output, desired_state)
+    bench(cmd_output, desired_state, args.runs, args.workers, args.snapshot)
@@ -24,8 +24,14 @@ import json
 from collections import defaultdict
 import os
 import re
+import sys
 from pprint import pprint
 
+# Shared helpers (module_utils) are in the root of the repo which isn't on the python path of filter plugins
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from module_utils.parsers import parse
+from module_utils.report import ComplianceReport
+
 class FilterModule(object):
     def filters(self):
         return {
@@ -46,17 +52,10 @@ class FilterModule(object):
                 except NotImplementedError:
                     report[cmd] = {"skipped": True, "reason": "NotImplemented"}
 
-        # Results of compliance report (complies = validation result, skipped = alidation didn't run)
-        existing_report = {}
-        existing_report['complies'] = all([each_cmpl.get("complies", True) for each_cmpl in report.values()])
-        existing_report['skipped']= [cmd for cmd, output in report.items() if output.get("skipped", False)]
-
-        # Updates report and writes it to file
-        existing_report.update(report)
-        with open('files/compliance_report.json', 'w') as file_content:
-            json.dump(existing_report, file_content)
+        # Adds the compliance result (complies = validation result, skipped = validation didn't run) and writes it to file
+        complies = ComplianceReport().add(report).write(os.path.abspath('files/compliance_report.json'))
 
-        print("Report Complies: {}".format(existing_report['complies']))
+        print("Report Complies: {}".format(complies))
         print("View the report using 'cat files/compliance_report.json | python -m json.tool'")
 
 
@@ -65,6 +64,9 @@ class FilterModule(object):
 
     def val_builder(self, desired_state, output, tag):
         cmd_output, actual_state= ({} for i in range(2))
+        # Output of all cmds run in one napalm_cli session is a single result rather than a list of per-cmd (loop) results
+        if isinstance(output, dict):
+            output = [output]
 
         ############ Tasks run based on the flag that the playbook is run with ############
 
@@ -99,99 +101,7 @@ class FilterModule(object):
 
 
 ############################################ Device data-model generators ############################################
-# Creates the data model from the output returned by the device
+# Creates the data model from the output returned by the device using the same parsers as custom_validate (module_utils/parsers)
+# To build a new validation register a parser for the command in module_utils/parsers/nxos.py
     def device_dm(self, cmd_output, actual_state):
-       # Fixes issues due to shit NXOS JSON making dict rather than list if only item
-        def shit_nxos(main_dict, parent_dict, child_dict):
-            if isinstance(main_dict[parent_dict][child_dict], dict):
-                main_dict[parent_dict][child_dict] = [main_dict[parent_dict][child_dict]]
-
-        # For each cmd serializes json (long sting) into normal dictionaries and runs pre-cmd data-model manipulation
-        for cmd, output in cmd_output.items():
-            tmp_dict = defaultdict(dict)
-            # Ansible output is in serialized json (long sting), needs making into json so can be used like a normal dictionary
-            if output != None:
-                json_output = json.loads(output)
-
-            # EMPTY: If output is empty just adds an empty dictionary
-            if output == None:
-                actual_state[cmd.replace(" | json", '')] = tmp_dict
-
-            # INT_STATUS: Is a 1 deep nested dict {intf_name: {attribute: value}}}
-            elif "show interface status" in cmd:
-                # Loops through interfaces in creates temp dict of each interface in format {intf_name: {attribute: value}}
-                for intf in json_output['TABLE_interface']['ROW_interface']:
-                    tmp_dict[intf['interface']]['state'] = intf['state']
-                    tmp_dict[intf['interface']]['vlan'] = intf['vlan']
-                    intf.setdefault('name', None)
-                    tmp_dict[intf['interface']]['name'] = intf['name']
-                # Adds the output gathered to the actual state dictionary
-                actual_state["show interface status"] = dict(tmp_dict)
-
-            # OSPF_INT_BRIEF: Is a 1 deep nested dict {interfaces: {attribute: value}}
-            elif "show ip ospf interface brief" in cmd:
-                # Apply NXOS 'dict to list' fix incase only one interface
-                shit_nxos(json_output, 'TABLE_ctx', 'ROW_ctx')
-                for each_proc in json_output['TABLE_ctx']['ROW_ctx']:
-                    shit_nxos(each_proc, 'TABLE_intf', 'ROW_intf')
-
-                    # Loops through interfaces in OSPF process and creates temp dict of each interface in format {intf_name: {attribute: value}}
-                    for each_intf in each_proc['TABLE_intf']['ROW_intf']:
-                        tmp_dict[each_intf['ifname']]['proc'] = each_proc['ptag']
-                        tmp_dict[each_intf['ifname']]['area'] = each_intf['area']
-                        tmp_dict[each_intf['ifname']]['status'] = each_intf['admin_status']
-                        tmp_dict[each_intf['ifname']]['nbr_count'] = each_intf['nbr_total']
-                # Adds the output gathered to the actual state dictionary
-                actual_state["show ip ospf interface brief vrf all"] = dict(tmp_dict)
-
-
-            # show ip route: Is a 1 deep nested dict {route: {attribute: value}} with multiple attributes per-route
-            elif "show ip route" in cmd:
-                for each_vrf in json_output['TABLE_vrf']['ROW_vrf']:
-                    # These dictionaries only exist if there are routes in the routing table (for example if L3 interface in the VRF)
-                    try:
-                        # Loops each prefix (ipprefix) and attributes (TABLE_path.ROW_path) of that prefix
-                        for each_rte in each_vrf['TABLE_addrf']['ROW_addrf']['TABLE_prefix']['ROW_prefix']:
-                            # Will have multiple paths if a route has multiple ECMP in the routing table
-                            shit_nxos(each_rte, 'TABLE_path', 'ROW_path')
-                            for each_path in each_rte['TABLE_path']['ROW_path']:
-                                # If is a static route (clientname) adds to temp dict in format {route: {attribute: value}}.
-                                if each_path['clientname'] == 'static':
-                                    tmp_dict[each_rte['ipprefix']]['vrf'] = each_vrf['vrf-name-out'].replace('default', 'global')
-                                    tmp_dict[each_rte['ipprefix']]['next-hop'] = each_path.get('ipnexthop', each_path.get('ifname'))
-                                    tmp_dict[each_rte['ipprefix']]['ad'] = each_path['pref']
-                                # Need 'discard' to catch any aggregate routes that are suppressed, also sets AD to 254 (for some reason is 220).
-                                elif each_path.get('type') == 'discard':
-                                    tmp_dict[each_rte['ipprefix']]['vrf'] = each_vrf['vrf-name-out'].replace('default', 'global')
-                                    tmp_dict[each_rte['ipprefix']]['next-hop'] = each_path.get('ipnexthop', each_path.get('ifname'))
-                                    tmp_dict[each_rte['ipprefix']]['ad'] = '254'
-                    except:
-                        pass
-                # Adds the output gathered to the actual state dictionary
-                actual_state["show ip route vrf all"] = dict(tmp_dict)
-
-
-            # BGP_TABLE: Is a 1 deep nested dict {prefix: {attribute: value}} with multiple attributes per prefix
-            if "show bgp vrf all ipv4 unicast" in cmd:
-                # Apply NXOS 'dict to list' fix incase only one element
-                shit_nxos(json_output, 'TABLE_vrf', 'ROW_vrf')
-                for each_vrf in json_output['TABLE_vrf']['ROW_vrf']:
-                    # Anything after 'ROW_safi' only exists if BGP table is configured and populated
-                    try:
-                        # Loops each prefix (ipprefix) and paths (ROW_path) for that prefix, paths hold the prefix attributes
-                        for each_net in each_vrf['TABLE_afi']['ROW_afi']['TABLE_safi']['ROW_safi']['TABLE_rd']['ROW_rd']['TABLE_prefix']['ROW_prefix']:
-                            shit_nxos(each_net, 'TABLE_path', 'ROW_path')
-                            # Loops through the each path (can be multiple) for each prefix, only adds entry if a local are summary prefix
-                            for each_path in each_net['TABLE_path']['ROW_path']:
-                                if each_path['type'] == 'local' or each_path['type'] == 'aggregate':
-                                    # Temp dict in the format {prefix: {attribute: value}}
-                                    tmp_dict[each_net['ipprefix']]['vrf'] = each_vrf['vrf-name-out'].replace('default', 'global')
-                                    tmp_dict[each_net['ipprefix']]['type'] = each_path['type']
-                                    tmp_dict[each_net['ipprefix']]['status'] = each_path['status']
-                                    tmp_dict[each_net['ipprefix']]['best'] = each_path['best']
-                    except:
-                        pass
-                # Adds the output gathered to the actual state dictionary
-                actual_state["show bgp vrf all ipv4 unicast"] = dict(tmp_dict)
-
-        return actual_state
\ No newline at end of file
+        return parse('nxos', cmd_output, actual_state)
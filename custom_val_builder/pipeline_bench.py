@@ -0,0 +1,129 @@
+"""Benchmarks the whole build, deploy and validate pipeline against simulated devices (module_utils/nxos_mock) rather than a lab.
+
+Build renders config.cfg of every host in the inventory (--inventory, output of ansible-inventory --list) with the native renderer
+(module_utils/render, --render_workers) or with --skip_build uses the configs already in --dir_path. The rendered hosts are cloned into
+--devices simulated devices (each clone keeps the group of its host, so is in the same wave) that are deployed in waves by the deploy
+orchestrator (module_utils/deploy, --concurrency) using the mock napalm driver with --latency (secs per commit, the other operations
+are scaled from the defaults) and --jitter.
+
+Validate gathers the output of the desired state cmds from every device (napalm cli, --concurrency at once) and validates it the same as
+custom_validate (module_utils/validation, native engine). The recorded output and desired state are got from --template (a folder of
+recorded output with a nxos_desired_state.yml, such as made by benchmark.py --save) or synthesised (--routes, --prefixes).
+
+python custom_val_builder/pipeline_bench.py --inventory inv.json --devices 500 --concurrency 50 --latency 2
+python custom_val_builder/pipeline_bench.py --inventory inv.json --skip_build --devices 500 --template ~/recorded/benchmark
+
+-clone: Creates the simulated device names and configs from the rendered hosts
+-gather: Gets the desired state cmds output from all the devices at the same time
+-main: Runs and times each stage
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+# Shared helpers (module_utils) are in the root of the repo which isn't on the python path of the builder
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmark import save, synthesise
+from module_utils.deploy import Deployer, plan_waves
+from module_utils.nxos_mock import DEFAULT_LATENCY, SimFabric, driver_factory
+from module_utils.render import REPO, load_inventory, load_vars, render
+from module_utils.validation import validate
+
+
+# CLONE: Round robin over the rendered hosts, clone names end in the clone number so MLAG pair members alternate (odd/even)
+def clone(configs, groups, devices):
+    sim_configs, sim_groups = {}, {}
+    hosts = sorted(configs)
+    for idx in range(devices):
+        host = hosts[idx % len(hosts)]
+        sim_host = '{}-{:04d}'.format(host, idx // len(hosts) + 1)
+        sim_configs[sim_host] = configs[host]
+        for group, members in groups.items():
+            if host in members and group != 'all':
+                sim_groups.setdefault(group, []).append(sim_host)
+    return sim_configs, sim_groups
+
+
+def gather(factory, hosts, cmds, concurrency):
+    def gather_host(host):
+        device = factory(host)
+        device.open()
+        try:
+            return host, device.cli(cmds)
+        finally:
+            device.close()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return dict(pool.map(gather_host, hosts))
+
+
+def timed(name, func):
+    start = time.perf_counter()
+    result = func()
+    print('{:<10}{:>10.2f}s'.format(name, time.perf_counter() - start))
+    return result
+
+
+def main(args):
+    all_vars, groups = load_inventory(args.inventory)
+    work_dir = tempfile.mkdtemp()
+    try:
+        dir_path = args.dir_path or os.path.join(work_dir, 'device_configs')
+        if args.skip_build:
+            configs = {host: os.path.join(os.path.expanduser(dir_path), host, 'config', 'config.cfg') for host in groups['all']}
+        else:
+            play_vars = load_vars(args.vars)
+            configs = timed('build', lambda: render(groups['all'], all_vars, groups, play_vars, dir_path, None, args.render_workers))
+        sim_configs, sim_groups = clone(configs, groups, args.devices)
+
+        # LATENCY: --latency is the commit time, the other operations keep the same proportion to it as the defaults
+        latency = {operation: delay * args.latency / DEFAULT_LATENCY['commit'] for operation, delay in DEFAULT_LATENCY.items()}
+        template = args.template
+        if template == None:
+            cmd_output, desired_state = synthesise(args.routes, args.prefixes, 4, 0.1)
+            save(work_dir, 'template', cmd_output, desired_state)
+            template = os.path.join(work_dir, 'template')
+        fabric = SimFabric(os.path.join(work_dir, 'sim'), template, latency, args.jitter).create(sim_configs)
+        factory = driver_factory(fabric)
+
+        deployer = Deployer(factory, sim_configs, timeout=args.timeout)
+        waves = plan_waves(list(sim_configs), sim_groups, concurrency=args.concurrency)
+        result = timed('deploy', lambda: deployer.run(waves))
+        deployed = [host for host, status in result['hosts'].items() if status == 'deployed']
+        print('{:<10}{} waves, {}/{} devices deployed'.format('', len(result['waves']), len(deployed), len(sim_configs)))
+
+        with open(os.path.join(os.path.expanduser(template), 'nxos_desired_state.yml'), 'r') as file_content:
+            desired_state = {cmd: state for each_cmd in yaml.safe_load(file_content)['cmds'] for cmd, state in each_cmd.items()}
+        cmds = [cmd + ' | json' for cmd in desired_state]
+        outputs = timed('gather', lambda: gather(factory, deployed, cmds, args.concurrency))
+        reports = timed('validate', lambda: [validate('nxos', outputs[host], desired_state, args.workers, 1000000, list(desired_state))
+                                             for host in deployed])
+        complies = [all(each_cmd.get('complies', True) for each_cmd in report.values()) for report in reports]
+        print('{:<10}{}/{} devices comply'.format('', complies.count(True), len(complies)))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks build, deploy and validate against simulated devices')
+    parser.add_argument('--inventory', required=True, help='Output of ansible-inventory --list (JSON)')
+    parser.add_argument('--vars', default=os.path.join(REPO, 'vars'), help='Folder of the variable files')
+    parser.add_argument('--dir_path', help='Folder config.cfg is written to (default a temporary folder)')
+    parser.add_argument('--skip_build', action='store_true', help='Use the configs already in --dir_path rather than rendering them')
+    parser.add_argument('--render_workers', type=int, default=1, help='Processes used to render the hosts')
+    parser.add_argument('--devices', type=int, default=500, help='Number of simulated devices')
+    parser.add_argument('--concurrency', type=int, default=50, help='Devices deployed (per wave) and gathered from at the same time')
+    parser.add_argument('--timeout', type=int, default=360, help='Per-device deploy timeout (secs)')
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY['commit'], help='Seconds a commit takes')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Up to this fraction of the latency is added at random')
+    parser.add_argument('--template', help='Folder of recorded output and nxos_desired_state.yml used by all devices')
+    parser.add_argument('--routes', type=int, default=1000, help='Routes in the synthesised route table (no --template)')
+    parser.add_argument('--prefixes', type=int, default=500, help='Prefixes in the synthesised BGP table (no --template)')
+    parser.add_argument('--workers', type=int, default=1, help='Processes used to validate each device')
+    main(parser.parse_args())
@@ -0,0 +1,59 @@
+"""Diffs the config.cfg of each host against the last config deployed to it (module_utils/deployed) so hosts whose config
+hasn't changed are not deployed. Is offline (no connection to the device) and needs ans.state_path, without it every host is deployed.
+The diff of the changed sections is saved to the diff folder (<host>_offline.txt) of ans.dir_path.
+With mode auto (ans.deploy_mode) a host whose changes are only added lines is merged rather than replaced, just the changed snippets
+are deployed (the changed sections of them are joined into config/merge.cfg).
+
+-cfg_diff: Returns whether the hosts config has changed, the added, removed and modified sections and the deploy mode (none, merge or replace)
+-cfg_deployed: Saves the config as the last deployed config of the host, used after it has been successfully deployed
+-cfg_forget: Deletes the last deployed config of the host as the device config has been changed some other way (merge or rollback)
+"""
+
+import os
+import sys
+
+# Shared helpers (module_utils) are in the root of the repo which isn't on the python path of filter plugins
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from module_utils.deployed import DeployedConfig, read_config
+from module_utils.trace import traced
+
+
+class FilterModule(object):
+    def filters(self):
+        return {
+            'cfg_diff': self.cfg_diff,
+            'cfg_deployed': self.cfg_deployed,
+            'cfg_forget': self.cfg_forget
+        }
+
+    def cfg_dir(self, hostname, dir_path):
+        return os.path.join(os.path.expanduser(dir_path), hostname, 'config')
+
+    @traced('cfg_diff', 'hostname')
+    def cfg_diff(self, hostname, dir_path, state_path=None, mode='replace'):
+        if state_path == None:
+            return {'changed': True, 'hash': None, 'added': [], 'removed': [], 'modified': [], 'mode': 'replace',
+                    'reason': 'no state_path', 'merge': []}
+        config, snippets = read_config(self.cfg_dir(hostname, dir_path))
+        deployed = DeployedConfig(state_path, hostname)
+        result = deployed.diff(config, snippets, mode)
+        if result['changed']:
+            with open(os.path.join(os.path.expanduser(dir_path), 'diff', hostname + '_offline.txt'), 'w') as file_content:
+                file_content.write(result['diff'])
+        # MERGE: Only the changed sections of the changed snippets are deployed, in the same order as config.cfg
+        if result['mode'] == 'merge':
+            with open(os.path.join(self.cfg_dir(hostname, dir_path), 'merge.cfg'), 'w') as file_content:
+                file_content.write(deployed.merge_config(snippets, result['merge']))
+        # The diff is only in the file so the fact is small
+        del result['diff']
+        return result
+
+    def cfg_deployed(self, hostname, dir_path, state_path=None):
+        if state_path != None:
+            DeployedConfig(state_path, hostname).save(*read_config(self.cfg_dir(hostname, dir_path)))
+        return hostname
+
+    def cfg_forget(self, hostname, state_path=None):
+        if state_path != None:
+            DeployedConfig(state_path, hostname).clear()
+        return hostname
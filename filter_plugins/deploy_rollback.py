@@ -0,0 +1,45 @@
+"""Rolls back the hosts changed by the last deploy using the running config saved before it (module_utils/rollback) rather than getting
+rollback_config.txt from each device. Is run once for the play, all the hosts with a saved config are rolled back at the same time (up
+to ans.rollback.concurrency) and any whose running config already matches it are skipped. Hosts without a saved config that weren't
+marked as unchanged (deployed before the running config was saved) are rolled back to the device's rollback_config.txt. Needs ans.state_path.
+
+-cfg_rb_save: Saves the running config got before the host is deployed (napalm_get_facts), marks the host unchanged if it is not being deployed
+-cfg_rollback: Rolls back all hosts with a saved config, returns {host: status}
+"""
+
+import os
+import sys
+
+# Shared helpers (module_utils) are in the root of the repo which isn't on the python path of filter plugins
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from module_utils.deploy import napalm_factory
+from module_utils.rollback import RollbackConfig, roll_back
+from module_utils.trace import traced
+
+
+class FilterModule(object):
+    def filters(self):
+        return {
+            'cfg_rb_save': self.cfg_rb_save,
+            'cfg_rollback': self.cfg_rollback
+        }
+
+    # RUNNING: Is None for hosts not being deployed so a rollback leaves them alone
+    def cfg_rb_save(self, hostname, running, state_path=None):
+        if state_path != None:
+            if running == None:
+                RollbackConfig(state_path, hostname).unchanged()
+            else:
+                RollbackConfig(state_path, hostname).save(running)
+        return hostname
+
+    # SETTINGS: ans.rollback, concurrency (hosts at once), timeout (secs per device) and optional_args (napalm)
+    @traced('cfg_rollback')
+    def cfg_rollback(self, hosts, hostvars, creds, state_path, dir_path, settings=None, check_mode=False, driver_factory=None):
+        settings = settings or {}
+        if driver_factory == None:
+            os_type = hostvars[hosts[0]]['ansible_network_os'] if len(hosts) != 0 else 'nxos'
+            driver_factory = napalm_factory(os_type, {host: hostvars[host].get('ansible_host', host) for host in hosts},
+                                            creds['username'], creds['password'], settings.get('timeout', 360), settings.get('optional_args'))
+        return roll_back(driver_factory, hosts, state_path, os.path.join(os.path.expanduser(dir_path), 'diff'), settings.get('timeout', 360),
+                         settings.get('concurrency', 10), check_mode)
@@ -0,0 +1,115 @@
+"""Deploys (replace) the config.cfg of all hosts in waves (module_utils/deploy) rather than the napalm_install_config task of each host
+at once. Is run once for the play, only hosts whose config has changed (cfg_diff) are deployed and in check mode the configs are only
+diffed. Hosts that cfg_diff (mode auto) found only need their changed snippets are merged (merge.cfg) rather than replaced. Hosts that
+are deployed are saved as the last deployed config (module_utils/deployed) and any rolled back are forgotten. With ans.state_path the
+running config of each host is saved just before it is deployed (module_utils/rollback) for the rb tag, hosts not changed by this
+deploy are marked as unchanged so only the hosts it affected are rolled back.
+
+The health gate between waves is custom_validate, the actual state of the hosts in the wave is gathered (collector, ans.collect settings)
+and compared against their desired state (validate/<os>_desired_state.yml), a host that doesn't comply fails the wave. Hosts without a
+desired state file are not checked.
+
+-cfg_deploy: Deploys all hosts in waves, returns {complete, waves, hosts: {host: status}}
+-health_gate: Returns the health function that runs custom_validate against the hosts of a wave
+"""
+
+import os
+import sys
+import yaml
+
+# Shared helpers (module_utils) are in the root of the repo which isn't on the python path of filter plugins
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from module_utils.collector import Collector, cmd_filename
+from module_utils.deploy import Deployer, napalm_factory, plan_waves
+from module_utils.deployed import DeployedConfig, read_config
+from module_utils.report import ComplianceReport
+from module_utils.rollback import RollbackConfig, capture
+from module_utils.trace import traced
+
+
+class FilterModule(object):
+    def filters(self):
+        return {
+            'cfg_deploy': self.cfg_deploy
+        }
+
+    # HEALTH: {host: True or reason}, the compliance report of each host is saved to reports the same as post-validation
+    def health_gate(self, hostvars, dir_path, creds, collect, validate):
+        from module_utils.validation import validate as validate_cmds      # Needs napalm so only imported if the gate is used
+
+        @traced('health_gate')
+        def health(hosts):
+            devices, desired_state, result = ({} for i in range(3))
+            for host in hosts:
+                host_dir = os.path.join(dir_path, host, 'validate')
+                filename = os.path.join(host_dir, hostvars[host]['ansible_network_os'] + '_desired_state.yml')
+                if not os.path.exists(filename):
+                    result[host] = True
+                    continue
+                with open(filename, 'r') as file_content:
+                    cmds = yaml.safe_load(file_content)['cmds']
+                desired_state[host] = {cmd: state for each_cmd in cmds for cmd, state in each_cmd.items()}
+                devices[host] = {'address': hostvars[host].get('ansible_host', host), 'cache': os.path.join(host_dir, 'actual_state'),
+                                 'cmds': [cmd + ' | json' for cmd in desired_state[host]]}
+            if len(devices) == 0:
+                return result
+            collected = Collector(creds['username'], creds['password'], **collect).run(devices)
+            for host, dev in devices.items():
+                if collected[host] != 'ok':
+                    result[host] = collected[host]
+                    continue
+                cmd_output = {}
+                for cmd in dev['cmds']:
+                    filename = os.path.join(dev['cache'], cmd_filename(cmd))
+                    cmd_output[cmd] = None
+                    if os.path.exists(filename):
+                        with open(filename, 'r') as file_content:
+                            cmd_output[cmd] = file_content.read()
+                report = validate_cmds(hostvars[host]['ansible_network_os'], cmd_output, desired_state[host], validate.get('workers', 1),
+                                       validate.get('min_size', 1000000), validate.get('native'))
+                filename = os.path.join(dir_path, 'reports', host + '_compliance_report.json')
+                if ComplianceReport().add(report).write(filename, validate.get('compact', False)):
+                    result[host] = True
+                else:
+                    result[host] = 'not compliant, see {}'.format(filename)
+            return result
+        return health
+
+    # SETTINGS: ans.deploy, waves ([{group, pairs, concurrency}]), concurrency (default per wave), timeout (secs per device),
+    # on_failure (stop or rollback), health (custom_validate gate between waves) and optional_args (napalm)
+    @traced('cfg_deploy')
+    def cfg_deploy(self, hosts, hostvars, groups, dir_path, creds, settings, state_path=None, check_mode=False, collect=None,
+                   validate=None, driver_factory=None):
+        dir_path = os.path.expanduser(dir_path)
+        settings = settings or {}
+        all_hosts = hosts
+        # Only hosts whose config has changed since it was last deployed (no cfg_diff is deployed)
+        hosts = [host for host in hosts if hostvars[host].get('cfg_diff', {}).get('changed', True)]
+        # MERGE: Hosts that cfg_diff (mode auto) found only need the changed snippets merged
+        merge = [host for host in hosts if hostvars[host].get('cfg_diff', {}).get('mode') == 'merge']
+        configs = {host: os.path.join(dir_path, host, 'config', 'merge.cfg' if host in merge else 'config.cfg') for host in hosts}
+        if driver_factory == None:
+            os_type = hostvars[hosts[0]]['ansible_network_os'] if len(hosts) != 0 else 'nxos'
+            driver_factory = napalm_factory(os_type, {host: hostvars[host].get('ansible_host', host) for host in hosts},
+                                            creds['username'], creds['password'], settings.get('timeout', 360), settings.get('optional_args'))
+        health = None
+        if settings.get('health', False) and not check_mode:
+            health = self.health_gate(hostvars, dir_path, creds, collect or {}, validate or {})
+
+        deployer = Deployer(driver_factory, configs, os.path.join(dir_path, 'diff'), settings.get('timeout', 360),
+                            settings.get('on_failure', 'stop'), health, check_mode, merge,
+                            capture(state_path) if state_path != None else None)
+        result = deployer.run(plan_waves(hosts, groups, settings.get('waves'), settings.get('concurrency', 10)))
+
+        if state_path != None and not check_mode:
+            for host, status in result['hosts'].items():
+                if status == 'deployed':
+                    DeployedConfig(state_path, host).save(*read_config(os.path.join(dir_path, host, 'config')))
+                # Committed but then failed, unhealthy or rolled back so is deployed again next run
+                elif host in deployer.committed:
+                    DeployedConfig(state_path, host).clear()
+            # ROLLBACK: Only hosts that may have been changed keep the running config saved before the deploy
+            for host in all_hosts:
+                if result['hosts'].get(host) != 'deployed' and host not in deployer.committed:
+                    RollbackConfig(state_path, host).unchanged()
+        return result
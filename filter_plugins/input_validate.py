@@ -14,7 +14,7 @@ bse.adv.exec_timeout: Validates the timeouts are integers
 
 -core fabric configuration variables using fabric.yml:
 fbc.network_size: Ensures the number of each type of device is within the limits and constraints
-fbc.num_intf: Ensures is one number, then a comma and then up to 3
+fbc.num_intf: Ensures is a valid port-space, the first and last port (1,64) or slot/port ranges including breakout sub-ports (1/1-48, 1/49/1-4)
 fbc.route.authentication: Ensure that the BGP and OSPF contains no whitespace
 fbc.route.ospf: Ensures that the OSPF process is present and area in dotted decimal format
 fbc.route.bgp.as_num: Ensures that the AS is present, cant make more specific incase is 2-byte or 4-byte ASNs
@@ -64,6 +64,7 @@ svc_intf.intf.single_homed.tenant: Ensures that the VRF exists on the switch tha
 svc_intf.intf.homed.ip_vlan: Ensures that the VLAN exists on the switch that an SVI or interface using that VLAN is being configured
 svc_intf.intf.single_homed.intf_num): Ensures that the SVI does not have duplicate entries on the same switch
 svc_intf.adv.homed.first/last: Ensures that the reserved interface, loopback and Port-Channel ranges are integers
+svc_intf.adv.homed.first/last_intf: Ensures that the reserved interface ranges are ports of the leaf and border switches (fbc.num_intf)
 svc_intf.intf.loopback: Ensures are enough free loopbacks in the range (range minus conflicting static assignments) for number of loopbacks defined
 svc_intf.intf.single_homed: Ensures are enough free ports in the range (range minus conflicting static assignments) for number of interfaces defined
 svc_intf.intf.dual_homed: Ensures are enough free ports in the range (range minus conflicting static assignments) for number of interfaces defined
@@ -139,13 +140,22 @@ svc_rte.adv.bgp_naming:  MUST contain 'name' and 'val' as is replaced when creat
 svc_rte.adv.dflt_pl:  MUST contain 'name' and 'val' as is replaced when creating the PL name
 svc_rte.adv.redist: Ensures that it contain both 'src' and 'dst' as are swapped to the source and destination of the redistribution
 svc_rte.adv.bgp.redist: Ensures that it contains 'src', 'dst' and 'val' as swapped to the source, destination and metric value
+svc_rte.adv.dedup_filters: Ensures that it is boolean
 """
 
+import os
 import re
+import sys
 import ipaddress
 from collections import defaultdict
 from pprint import pprint
 
+# Shared helpers (module_utils) are in the root of the repo which isn't on the python path of filter plugins
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from module_utils.intf_alloc import IntfAllocator
+from module_utils.port_space import PortSpace
+from module_utils.trace import traced
+
 class FilterModule(object):
     def filters(self):
         return {
@@ -272,18 +282,14 @@ class FilterModule(object):
         dup = [i for i in set(input_list) if input_list.count(i) > 1]
         self.assert_equal(errors, len(dup), 0, error_message.format(*args, dup))
 
-    # INTF: Asserts whether there are enough free interfaces to accommodate all the defined interfaces
-    def check_used_intfs(self, errors, intf_type, per_dev_used_intf, intf_range):
+    # INTF: Asserts whether there are enough free interfaces to accommodate all the defined interfaces. Uses the same allocator as svc_intf_dm
+    def check_used_intfs(self, errors, intf_type, per_dev_used_intf, first, last):
         for switch, intf in per_dev_used_intf.items():
-            used_intf = len(intf)
-            aval_intf = []
-            for x in intf:                      # Gets only the statically defined interface numbers
-                if x != 'dummy':
-                    aval_intf.append(x)
-            aval_intf.extend(intf_range)           # Adds range of intfs to static intfs
-            total_intf = len(set(aval_intf))    # Removes duplicate intfs to find how many available interfaces from range
-            self.assert_equal_less(errors, used_intf, total_intf, "-svc_intf.intf.{} Are more defined interfaces ({}) than free interfaces ({})" \
-                                   " in the {} reserved range on {}".format(intf_type, used_intf, total_intf, intf_type, switch))
+            # Reserves the statically defined interface numbers, whatever is left in the range is free for dynamic assignment
+            intf_range = IntfAllocator(first, last, [x for x in intf if x != 'dummy'])
+            need_intf = intf.count('dummy')
+            self.assert_equal_less(errors, need_intf, intf_range.num_free(), "-svc_intf.intf.{} Are more dynamically assigned interfaces ({}) than free " \
+                                   "interfaces ({}) in the {} reserved range on {}".format(intf_type, need_intf, intf_range.num_free(), intf_type, switch))
 
     # FABRIC_INTF: Asserts whether interfaces or loopbacks are duplicated/ overlap (same interface used for both fabric and service interfaces)
     def check_used_fbc_intfs(self, errors, intf_type, intf_fmt, per_dev_used_intf, intf_range, fbc_intf):
@@ -315,6 +321,7 @@ class FilterModule(object):
 
 
 ######################## Validate formatting of variables within the base.yml file ########################
+    @traced('input_bse_validate')
     def base(self, device_name, base, services, mgmt_acl):
         addr = base['addr']
         users = base['users']
@@ -393,6 +400,7 @@ class FilterModule(object):
 
 
 ######################## Validate formatting of variables within the fabric.yml file ########################
+    @traced('input_fbc_validate')
     def fabric(self, network_size, num_intf, route, acast_gw_mac, nve_hold_time, adv_route, bse_intf, lp, mlag, addr_incre):
         fabric_errors = ['Check the contents of fabric.yml for the following issues:']
 
@@ -406,10 +414,12 @@ class FilterModule(object):
         self.assert_regex_match(fabric_errors, '^[024]$', str(network_size['num_border']),
                                 "-fbc.network_size.num_border is '{}', valid values are 0, 2 and 4".format(network_size['num_border']))
 
-        # NUMBER_INTERFACES (fbc.num_intf): Ensures is one number, then a comma and then up to 3 numbers
+        # NUMBER_INTERFACES (fbc.num_intf): Ensures is the first and last port (1,64) or a list of slot/port ranges (1/1-48, 1/49/1-4, 2/1-36)
         for dev_type, intf in num_intf.items():
-            self.assert_regex_match(fabric_errors, r'^\d,\d{1,3}$', str(intf),
-                                    "-fbc.num_intf.{} '{}' is not a valid, must be a digit, comma and 1 to 3 digits".format(dev_type, intf))
+            try:
+                PortSpace(bse_intf['intf_fmt'], intf)
+            except ValueError as err:
+                fabric_errors.append("-fbc.num_intf.{} '{}' is not valid, {}".format(dev_type, intf, err))
 
         # PWORD (fbc.route.authentication): Ensure that the BGP and OSPF contains no whitespaces
         self.assert_regex_search(fabric_errors, '^\S+$', route.get('authentication', 'dummy'), "-fbc.route.authentication contains whitespaces")
@@ -479,6 +489,7 @@ class FilterModule(object):
 
 
 ######################## Validate formatting of variables within the service_tenant.yml file ########################
+    @traced('input_svc_tnt_validate')
     def svc_tnt(self, svc_tnt, adv, fbc_mlag):
         # Used by duplicate VLAN check
         all_vl_num, all_vl_name, num_bdr_tnt, num_lf_tnt, all_bdr_vl, tnt_bdr_vl, all_lf_vl, tnt_lf_vl, all_tnt = ([] for i in range(9))
@@ -596,6 +607,7 @@ class FilterModule(object):
 
 
 ######################## Validate formatting of variables within the service_interface.yml file ########################
+    @traced('input_svc_intf_validate')
     def svc_intf(self, svc_intf, adv, network_size, tenants, dev_name, fbc):
         sh_per_dev_intf, dh_per_dev_intf, per_dev_po, per_dev_intf, lp_per_dev_intf = (defaultdict(list) for i in range(5))
         svcintf_vrf_on_lf, svcintf_vl_on_lf, svcintf_vrf_on_bdr, svcintf_vl_on_bdr, svctnt_vl_on_lf, svctnt_vl_on_bdr = ([] for i in range(6))
@@ -821,14 +833,21 @@ class FilterModule(object):
                 for po_num in range(intf['first_po'], intf['last_po'] + 1):
                      po_intf.append(po_num)
 
+        # PORT_SPACE (svc_intf.adv.homed.first/last_intf): Ensures that the reserved interface ranges are ports of the leaf and border switches (fbc.num_intf)
+        for dev_type in [dev_type for dev_type in ['leaf', 'border'] if fbc['network_size']['num_' + dev_type] != 0]:
+            space = PortSpace(fbc['adv']['bse_intf']['intf_fmt'], fbc['num_intf'][dev_type])
+            for homed, homed_intf in [('single_homed', sh_intf), ('dual_homed', dh_intf)]:
+                missing_intf = [intf_num for intf_num in homed_intf if space.port_id(fbc['adv']['bse_intf']['intf_fmt'] + str(intf_num)) == None]
+                self.assert_equal(svc_intf_errors, len(missing_intf), 0, "-svc_intf.adv.{} interfaces {} are not ports on the {} switches "\
+                                                                         "(fbc.num_intf.{})".format(homed, missing_intf, dev_type, dev_type))
         # LP_INTF_RANGE (svc_intf.intf.loopback): Ensures are enough free loopbacks in the range (minus conflicting static) for number of loopbacks defined
-        self.check_used_intfs(svc_intf_errors, 'loopback', lp_per_dev_intf, lp_intf)
+        self.check_used_intfs(svc_intf_errors, 'loopback', lp_per_dev_intf, adv['single_homed']['first_lp'], adv['single_homed']['last_lp'])
         # SH_INTF_RANGE (svc_intf.intf.single_homed): Ensures are enough free ports in the range (minus conflicting static) for number of interfaces defined
-        self.check_used_intfs(svc_intf_errors, 'single_homed', sh_per_dev_intf, sh_intf)
+        self.check_used_intfs(svc_intf_errors, 'single_homed', sh_per_dev_intf, adv['single_homed']['first_intf'], adv['single_homed']['last_intf'])
         # DH_INTF_RANGE (svc_intf.intf.dual_homed): Ensures are enough free ports in the range (minus conflicting static) for number of interfaces defined
-        self.check_used_intfs(svc_intf_errors, 'dual_homed', dh_per_dev_intf, dh_intf)
+        self.check_used_intfs(svc_intf_errors, 'dual_homed', dh_per_dev_intf, adv['dual_homed']['first_intf'], adv['dual_homed']['last_intf'])
         # PO_INTF_RANGE (svc_intf.intf.dual_homed): Ensures are enough free port-channels in the range (minus conflicting static) for number of POs defined
-        self.check_used_intfs(svc_intf_errors, 'port_channel', per_dev_po, po_intf)
+        self.check_used_intfs(svc_intf_errors, 'port_channel', per_dev_po, adv['dual_homed']['first_po'], adv['dual_homed']['last_po'])
 
         # Combines the SH and DH per device interface dictionaries
         for d in (sh_per_dev_intf, dh_per_dev_intf):
@@ -838,9 +857,9 @@ class FilterModule(object):
         # TOTAL_INTF (svc_intf.intf.homed): Make sure that are not more defined interfaces (single and dual_homed) than there are actual interfaces on the switch
         for switch, intf in per_dev_intf.items():
             if dev_name['leaf'] in switch:
-                max_intf = int(fbc['num_intf']['leaf'].split(',')[1])
+                max_intf = PortSpace(fbc['adv']['bse_intf']['intf_fmt'], fbc['num_intf']['leaf']).num_ports()
             elif dev_name['border'] in switch:
-                max_intf = int(fbc['num_intf']['border'].split(',')[1])
+                max_intf = PortSpace(fbc['adv']['bse_intf']['intf_fmt'], fbc['num_intf']['border']).num_ports()
             else:
                 max_intf = 1
             self.assert_equal_less(svc_intf_errors, len(intf), max_intf, "-svc_intf.intf.homed Are more defined interfaces ({}) than the maximum "\
@@ -874,6 +893,7 @@ class FilterModule(object):
 
 
 ######################## Validate formatting of variables within the service_route.yml file ########################
+    @traced('input_svc_rte_validate')
     def svc_rte(self, bgp_grp, bgp_tnt_adv, ospf, route, adv, fbc, svc_intf, dev_name, tenants):
         fbc_tnt_lp, lf_intf, bdr_intf, all_devices  = ([] for i in range(4))
         svctnt_vrf_on_bdr, svctnt_vrf_on_lf = (['global'] for i in range(2))
@@ -937,10 +957,8 @@ class FilterModule(object):
                     l3vl_on_lf[tnt['tenant_name']].append('Vlan' + str(vl['num']))
 
         # INTF: Creates a list of all interfaces on the leafs and borders to be used for redist connected statement
-        for intf_num in range(int(fbc['num_intf']['border'].split(',')[0]), int(fbc['num_intf']['border'].split(',')[1]) + 1):
-            bdr_intf.append(fbc['adv']['bse_intf']['intf_fmt'] + str(intf_num))
-        for intf_num in range(int(fbc['num_intf']['leaf'].split(',')[0]), int(fbc['num_intf']['leaf'].split(',')[1]) + 1):
-            lf_intf.append(fbc['adv']['bse_intf']['intf_fmt'] + str(intf_num))
+        bdr_intf.extend(PortSpace(fbc['adv']['bse_intf']['intf_fmt'], fbc['num_intf']['border']).names())
+        lf_intf.extend(PortSpace(fbc['adv']['bse_intf']['intf_fmt'], fbc['num_intf']['leaf']).names())
 
         # ALL_SW_INTF_TNT: Creates nested dict of all interfaces in each tenant on each switch {sw: tnt: [intf, intf]}
         # 1. Joins the loopback and layer3 interface dict (of tuples) into the one dictionary
@@ -1535,6 +1553,10 @@ class FilterModule(object):
                 self.assert_regex_search(svc_rte_errors, r'val\S*src\S*dst|src\S*val\S*dst|src\S*dst\S*val|val\S*dst\S*src |dst\S*val\S*src|dst\S*src\S*val', rm_pl,
                                          "-svc_rte.adv.redist.{} '{}' is not correct, it must contain 'src', 'dst' and 'val' within its name".format(key, rm_pl))
 
+        # DEDUP_FILTERS (svc_rte.adv.dedup_filters): Ensures that it is boolean
+        if adv.get('dedup_filters') != None:
+            self.assert_boolean(svc_rte_errors, adv['dedup_filters'], "-svc_rte.adv.dedup_filters '{}' should be True or False".format(adv['dedup_filters']))
+
         # The value returned to Ansible Assert module to determine whether failed or not
         if len(svc_rte_errors) == 1:
             return "'service_route.yml unittest pass'"             # For some reason ansible assert needs the inside quotes
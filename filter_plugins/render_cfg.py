@@ -0,0 +1,32 @@
+"""Renders the full config (config.cfg) of all hosts in one task with the native renderer (module_utils/render) rather than
+the template task of each role and assemble. Is run once for the play, the templates are compiled once and the hosts are
+rendered in a process pool (workers).
+
+-render_cfg: Renders and writes config.cfg of all hosts, returns {host: config.cfg}
+"""
+
+import os
+import sys
+
+# Shared helpers (module_utils) are in the root of the repo which isn't on the python path of filter plugins
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from module_utils.render import render, HOST_VARS
+from module_utils.trace import traced
+
+
+class FilterModule(object):
+    def filters(self):
+        return {
+            'render_cfg': self.render_cfg
+        }
+
+    # HOSTVARS: Ansible hostvars, only the inventory variables used by the templates are taken from each host
+    # PLAY_VARS: The variable files used by the templates {bse, fbc, svc_tnt, svc_intf, svc_rte}, services files can be None
+    # CHECK_MODE: The interface ledger is only read
+    @traced('render_cfg')
+    def render_cfg(self, hosts, hostvars, groups, play_vars, dir_path, state_path=None, workers=1, check_mode=False):
+        all_vars = {}
+        for host in hostvars:
+            all_vars[host] = {key: hostvars[host][key] for key in HOST_VARS if key in hostvars[host]}
+        play_vars = {name: value for name, value in play_vars.items() if value != None}
+        return render(list(hosts), all_vars, dict(groups), play_vars, dir_path, state_path, workers, check_mode)
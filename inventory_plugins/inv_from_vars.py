@@ -58,6 +58,7 @@ var_dicts:
 # ==================================== Plugin ==================================
 # Modules used to format data ready for creating the inventory
 import os
+import sys
 import yaml
 from ipaddress import ip_network
 from collections import defaultdict
@@ -65,6 +66,11 @@ from collections import defaultdict
 from ansible.errors import AnsibleParserError
 from ansible.module_utils._text import to_native, to_text
 from ansible.plugins.inventory import BaseInventoryPlugin, Constructable, Cacheable
+from ansible.utils.vars import combine_vars, load_extra_vars
+
+# Shared helpers (module_utils) are in the root of the repo which isn't on the python path of inventory plugins
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from module_utils import trace
 
 # Ansible Inventory plugin class that holds pre-built methods that run automatically (verify_file, parse) without needing to be called
 class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
@@ -319,12 +325,17 @@ class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
                 elif each_var == 'addr_incre':
                     self.addr_incre = all_vars[file_name]['fbc']['adv'][each_var]
 
-        # 3. Creates a data model of the hostnames and device specific IP interface addresses
-        self.create_ip()
-        # 4. Creates a data model of all the fabric interfaces
-        self.create_intf()
-        # 5. Uses  the data models to create the inventory containing groups, hosts and host_vars
-        self.create_inventory()
+        # 2d. TRACE: Is the first thing the run does (ansible-playbook process) so sets the trace settings for all the workers, -e overrides the var file
+        ans = combine_vars({'ans': (all_vars.get('ansible') or {}).get('ans', {})}, load_extra_vars(loader))['ans']
+        trace.configure(ans.get('trace'), ans.get('dir_path'))
+
+        with trace.span('inventory'):
+            # 3. Creates a data model of the hostnames and device specific IP interface addresses
+            self.create_ip()
+            # 4. Creates a data model of all the fabric interfaces
+            self.create_intf()
+            # 5. Uses  the data models to create the inventory containing groups, hosts and host_vars
+            self.create_inventory()
 
 
    # Example ways to test variable format is correct before running other methods
@@ -0,0 +1,5 @@
+"""Helpers shared by the inventory plugin, filter plugins and standalone tools.
+
+The filter plugins are loaded by Ansible straight from their role directories so this package is not on their
+python path, each plugin that uses it adds the root of the repo to sys.path before importing from it.
+"""
@@ -0,0 +1,131 @@
+"""Works out which switches are affected by a change to the service input (service_interface.yml or service_route.yml).
+
+Without it any edit to the input regenerates the data-model and re-renders the config snippet of every switch in the fabric.
+A snapshot of the input is kept from the last run and diffed against the current input, each top-level element (interface,
+BGP group, tnt_advertise tenant, OSPF process, static route group) that was added, removed, changed or moved affects the switches
+in any of its 'switch' lists (and their MLAG peer for dual-homed interfaces). A change to anything else the DM or template uses
+(adv settings, fabric.yml) or to the templates and code that build them (hash of their source) affects all switches. State outside
+the input that a switch's DM is built from (its interface ledger) is kept as a digest per switch, a switch whose digest is not the
+same as at the last commit is affected. Only the affected switches are regenerated, the rest use their cached copy.
+
+The snapshot and per-switch cache ({name}.json DM and {name}.conf snippet) are in the svc_cache folder of ans.state_path.
+The new snapshot is staged and only replaces the old once all switches have been regenerated and cached (commit), it records
+the hosts that completed the run (and their digests at that point) so a switch that failed or was not in the last run is always regenerated.
+
+-source_hash: Hash of the contents of the template and code files, part of the shared settings
+-affected: List of hosts that need regenerating (all hosts if there is no snapshot or a shared setting has changed)
+-host_dir: Creates (if doesn't exist) and returns the cache folder for a host
+-stage: Writes the new snapshot as pending
+-commit: Replaces the snapshot with the pending snapshot adding the hosts that have a valid cache
+"""
+
+from difflib import SequenceMatcher
+import hashlib
+import json
+import os
+import tempfile
+
+
+# SOURCE_HASH: Files are hashed in name order so the hash only changes if the contents do
+def source_hash(filenames):
+    sha = hashlib.sha256()
+    for filename in sorted(filenames):
+        sha.update(filename.encode())
+        with open(filename, 'rb') as file_content:
+            sha.update(file_content.read())
+    return sha.hexdigest()
+
+
+class ChangeSet(object):
+    def __init__(self, directory, name, sections, shared, digests=None):
+        self.cache_dir = os.path.join(os.path.expanduser(directory), 'svc_cache')
+        self.name = name
+        self.digests = digests
+        self.new = {'sections': {sect: [self.canonical(elem) for elem in elems or []] for sect, elems in sections.items()},
+                    'shared': self.canonical(shared)}
+        self.new_elem = {sect: list(elems or []) for sect, elems in sections.items()}
+        self.old = None
+        snapshot = os.path.join(self.cache_dir, name + '_input.json')
+        if os.path.exists(snapshot):
+            with open(snapshot, 'r') as file_content:
+                self.old = json.load(file_content)
+
+    # CANONICAL: Input element as a string so elements can be compared regardless of key order
+    def canonical(self, elem):
+        return json.dumps(elem, sort_keys=True, default=str)
+
+    # SWITCHES: All switches found in any 'switch' list (or string) within the element, peers and interfaces inherit the group/process switch
+    def switches(self, elem):
+        found = set()
+        if isinstance(elem, dict):
+            for key, value in elem.items():
+                if key == 'switch':
+                    found.update([value] if isinstance(value, str) else value or [])
+                else:
+                    found.update(self.switches(value))
+        elif isinstance(elem, list):
+            for each_elem in elem:
+                found.update(self.switches(each_elem))
+        return found
+
+    # MLAG_PAIR: Both switches of the MLAG pair, dual-homed interfaces are only defined against the odd numbered switch
+    def mlag_pair(self, switch):
+        try:
+            sw_num = int(switch[-2:])
+        except ValueError:
+            return [switch]
+        odd_num = sw_num - (1 - sw_num % 2)
+        return [switch[:-2] + "{:02d}".format(odd_num), switch[:-2] + "{:02d}".format(odd_num + 1)]
+
+    def affected(self, hosts, mlag_sections=()):
+        hosts = list(hosts)
+        # FULL: No snapshot or adv/fabric settings changed, so is no way to know which hosts are affected
+        if self.old == None or self.old.get('shared') != self.new['shared']:
+            return hosts
+        changed_sw = set()
+        for sect in set(self.old['sections']) | set(self.new['sections']):
+            old_elems = self.old['sections'].get(sect, [])
+            new_elems = self.new['sections'].get(sect, [])
+            # DIFF: Elements in any inserted, deleted or replaced block (a moved element is a delete and an insert)
+            for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_elems, new_elems, autojunk=False).get_opcodes():
+                if tag == 'equal':
+                    continue
+                elems = [json.loads(elem) for elem in old_elems[i1:i2]] + self.new_elem.get(sect, [])[j1:j2]
+                for switch in self.switches(elems):
+                    changed_sw.update(self.mlag_pair(switch) if sect in mlag_sections else [switch])
+        # DIGESTS: Hosts whose state (interface ledger) has changed since the last commit
+        if self.digests != None:
+            old_digests = self.old.get('digests', {})
+            changed_sw.update(host for host in hosts if self.digests.get(host) != old_digests.get(host))
+        # CACHE: Only unaffected hosts that completed the last run have a cache that can be used
+        return [host for host in hosts if host in changed_sw or host not in self.old.get('valid', [])]
+
+    def host_dir(self, host):
+        path = os.path.join(self.cache_dir, host)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def stage(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(tmp_fd, 'w') as file_content:
+            json.dump(self.new, file_content)
+        os.replace(tmp_name, os.path.join(self.cache_dir, self.name + '_input.pending.json'))
+
+    # DIGESTS: {host: digest} got after the hosts were regenerated (the run may have added to their ledger)
+    @staticmethod
+    def commit(directory, name, hosts, digests=None):
+        cache_dir = os.path.join(os.path.expanduser(directory), 'svc_cache')
+        pending = os.path.join(cache_dir, name + '_input.pending.json')
+        if not os.path.exists(pending):
+            return
+        with open(pending, 'r') as file_content:
+            snapshot = json.load(file_content)
+        snapshot['valid'] = sorted(hosts)
+        if digests != None:
+            snapshot['digests'] = digests
+        tmp_fd, tmp_name = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(tmp_fd, 'w') as file_content:
+            json.dump(snapshot, file_content)
+        os.replace(tmp_name, os.path.join(cache_dir, name + '_input.json'))
+        os.remove(pending)
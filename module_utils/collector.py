@@ -0,0 +1,127 @@
+"""Gathers the command output needed by custom_validate from all devices in the fabric at the same time (asyncio).
+
+Post-validation using napalm_cli is limited to Ansible forks (20) devices at a time, each blocking until all its commands
+return, so a large fabric is validated in rounds. The collector talks NX-API (JSON-RPC over http/https, what the napalm nxos
+driver uses) to every device at once, a semaphore caps how many are in progress. Each device has a timeout for its
+request and a failed or timed out device is retried (with exponential backoff) before being given up on.
+
+The raw output of each command is saved in the per-host cache folder (one file per command, same layout as nxos_sim uses
+for recorded output) from where it is loaded by custom_validate (cached_cli). The folder is emptied first and nothing is
+saved for a failed device or command so custom_validate never validates output from an older run.
+
+-cmd_filename: The file (in the host cache folder) a commands output is saved in
+-Collector: Holds the settings (concurrency, timeout, retries, backoff, transport and port) and credentials
+-collect_host: Gets the output of all the commands from one device (one HTTP request) and saves it to its cache folder
+-collect: Runs collect_host for all devices at the same time (bounded by concurrency), returns {host: 'ok' or error}
+-run: Runs collect in its own event loop
+"""
+
+import asyncio
+import base64
+import json
+import os
+import ssl
+import tempfile
+
+
+# CMD_FILENAME: The file in the cache folder the output of a command is saved in
+def cmd_filename(cmd):
+    return '_'.join(cmd.replace('| json', '').lower().split()) + '.json'
+
+
+class Collector(object):
+    def __init__(self, username, password, concurrency=50, timeout=30, retries=2, backoff=1, transport='https', port=None):
+        self.auth = base64.b64encode('{}:{}'.format(username, password).encode()).decode()
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.transport = transport
+        self.port = port or (443 if transport == 'https' else 80)
+
+    # REQUEST: All cmds sent as one JSON-RPC batch (cli_ascii so output is the same raw string napalm_cli returns)
+    async def request(self, address, port, cmds):
+        body = json.dumps([{'jsonrpc': '2.0', 'method': 'cli_ascii', 'params': {'cmd': cmd, 'version': 1}, 'id': idx + 1}
+                           for idx, cmd in enumerate(cmds)]).encode()
+        ssl_ctx = None
+        if self.transport == 'https':
+            ssl_ctx = ssl.create_default_context()
+            ssl_ctx.check_hostname = False
+            ssl_ctx.verify_mode = ssl.CERT_NONE             # NX-API uses a self-signed certificate by default
+        reader, writer = await asyncio.open_connection(address, port, ssl=ssl_ctx)
+        try:
+            writer.write(('POST /ins HTTP/1.1\r\nHost: {}\r\nContent-Type: application/json-rpc\r\nAuthorization: Basic {}\r\n'
+                          'Content-Length: {}\r\nConnection: close\r\n\r\n').format(address, self.auth, len(body)).encode() + body)
+            await writer.drain()
+            status = (await reader.readline()).decode().split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if line == '':
+                    break
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+            if headers.get('transfer-encoding', '').lower() == 'chunked':
+                data = b''
+                while True:
+                    size = int((await reader.readline()).strip(), 16)
+                    if size == 0:
+                        break
+                    data += await reader.readexactly(size)
+                    await reader.readline()
+            elif 'content-length' in headers:
+                data = await reader.readexactly(int(headers['content-length']))
+            else:
+                data = await reader.read()
+        finally:
+            writer.close()
+        if len(status) < 2 or status[1] != '200':
+            raise ConnectionError('HTTP {}'.format(' '.join(status[1:])))
+        result = json.loads(data.decode())
+        return result if isinstance(result, list) else [result]
+
+    def save(self, host_dir, cmds, result):
+        os.makedirs(host_dir, exist_ok=True)
+        for each_file in os.listdir(host_dir):
+            os.remove(os.path.join(host_dir, each_file))
+        for cmd, each_result in zip(cmds, result):
+            # ERROR: Command the device didn't understand is not saved so is no output (None), same as napalm_cli
+            if each_result.get('result') == None:
+                continue
+            tmp_fd, tmp_name = tempfile.mkstemp(dir=host_dir, suffix='.tmp')
+            with os.fdopen(tmp_fd, 'w') as file_content:
+                file_content.write(each_result['result'].get('msg', ''))
+            os.replace(tmp_name, os.path.join(host_dir, cmd_filename(cmd)))
+
+    async def collect_host(self, semaphore, host, address, port, cmds, host_dir):
+        error = None
+        for attempt in range(self.retries + 1):
+            # BACKOFF: Waits 1x, 2x, 4x, etc the backoff before a retry (doesn't hold a concurrency slot while waiting)
+            if attempt != 0:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            async with semaphore:
+                try:
+                    result = await asyncio.wait_for(self.request(address, port, cmds), self.timeout)
+                    self.save(host_dir, cmds, result)
+                    return host, 'ok'
+                except asyncio.TimeoutError:
+                    error = 'timed out after {}s'.format(self.timeout)
+                except (OSError, ValueError, asyncio.IncompleteReadError) as err:
+                    error = '{}: {}'.format(type(err).__name__, err)
+        self.save(host_dir, [], [])                 # Empties the cache so old output is not validated
+        return host, 'failed ({} attempts), {}'.format(self.retries + 1, error)
+
+    # DEVICES: {host: {'address': ip_or_name, 'cmds': [cmds], 'cache': host_cache_folder}}, optional 'port' overrides the default port
+    async def collect(self, devices):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        result = await asyncio.gather(*[self.collect_host(semaphore, host, dev['address'], dev.get('port', self.port), dev['cmds'],
+                                                          dev['cache'])
+                                        for host, dev in devices.items()])
+        return dict(result)
+
+    def run(self, devices):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.collect(devices))
+        finally:
+            loop.close()
@@ -0,0 +1,154 @@
+"""Columnar table for the parsed routing and BGP tables, a prefix per row rather than a dict per prefix.
+
+A route or BGP table parsed into {prefix: {attribute: value}} holds a dict (and the same attribute names) for every prefix,
+for a full table that is hundreds of bytes a prefix. PrefixTable stores each prefix as an integer network and length and each
+attribute as the id of the value in a per-attribute table of the values seen (VRFs, next-hops, ADs, etc are mostly the same
+few values), so a prefix is a few bytes in each of the parallel arrays. Prefixes are looked up by a binary search of the sorted
+keys, anything that isn't an IPv4 prefix is kept in a dict.
+
+It is read-only mapping of {prefix: {attribute: value}} (a dict is created for a prefix when it is read) so the native compare
+and snapshot read it as they would the dict. napalm compare and the DM output need nested dicts, rather than converting a
+table (to_dict) the parsers build a DictTable for them instead.
+
+-add: Adds or (if already in the table) replaces the attributes of a prefix, the prefix keeps its original position
+-DictTable: Plain dict {prefix: {attribute: value}} with the same add, parsers build it rather than a PrefixTable if it is only going to be converted
+-to_dict: Converts the table (or returns anything that isn't a table) to nested dicts {prefix: {attribute: value}}
+"""
+
+from array import array
+from bisect import bisect_left
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import socket
+
+OTHER = 255         # Length of a row whose key isn't an IPv4 prefix, net is then the index of the key in other_keys
+
+
+# KEY: IPv4 prefix as (network, length), None if the string isn't exactly how the prefix would be written back
+def prefix_key(prefix):
+    try:
+        addr, sep, length = prefix.partition('/')
+        packed = socket.inet_aton(addr)
+    except (AttributeError, OSError):
+        return None
+    if sep == '' or not length.isdigit() or int(length) > 32 or socket.inet_ntoa(packed) != addr:
+        return None
+    return int.from_bytes(packed, 'big'), int(length)
+
+
+class PrefixTable(Mapping):
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.net, self.length = array('I'), array('B')
+        self.columns = [array('B') for each_field in self.fields]        # Widened (H, I) when there are more values
+        self.values = [[] for each_field in self.fields]            # Value of each id
+        self.value_ids = [{} for each_field in self.fields]         # Id of each value, used when adding
+        self.other_keys, self.other = [], {}
+        # Build index {key: row} used when adding, replaced by the sorted keys (sort_keys, sort_rows) once read
+        self.index = {}
+        self.sort_keys, self.sort_rows = array('Q'), array('I')
+
+    def add(self, prefix, attributes):
+        key = prefix_key(prefix)
+        row = self.row(prefix, key)
+        if row == None:
+            if self.index == None:
+                self.thaw()
+            row = len(self.net)
+            if key == None:
+                self.other[prefix] = row
+                self.other_keys.append(prefix)
+                key = (len(self.other_keys) - 1, OTHER)
+            else:
+                self.index[(key[0] << 6) | key[1]] = row
+            self.net.append(key[0])
+            self.length.append(key[1])
+            for column in self.columns:
+                column.append(0)
+        for idx, each_field in enumerate(self.fields):
+            value = attributes[each_field]
+            value_id = self.value_ids[idx].get(value)
+            if value_id == None:
+                value_id = len(self.values[idx])
+                self.value_ids[idx][value] = value_id
+                self.values[idx].append(value)
+                if value_id >= 2 ** (8 * self.columns[idx].itemsize):
+                    self.columns[idx] = array('H' if value_id < 2 ** 16 else 'I', self.columns[idx])
+            self.columns[idx][row] = value_id
+
+    # FREEZE: Drops the build index for sorted arrays of the keys and their rows (binary search)
+    def freeze(self):
+        ordered = sorted(self.index.items())
+        self.sort_keys = array('Q', [each_key for each_key, row in ordered])
+        self.sort_rows = array('I', [row for each_key, row in ordered])
+        self.index = None
+
+    def thaw(self):
+        self.index = dict(zip(self.sort_keys, self.sort_rows))
+        self.sort_keys, self.sort_rows = array('Q'), array('I')
+
+    def row(self, prefix, key=None):
+        key = prefix_key(prefix) if key == None else key
+        if key == None:
+            return self.other.get(prefix)
+        num = (key[0] << 6) | key[1]
+        if self.index != None:
+            return self.index.get(num)
+        pos = bisect_left(self.sort_keys, num)
+        if pos < len(self.sort_keys) and self.sort_keys[pos] == num:
+            return self.sort_rows[pos]
+        return None
+
+    def key(self, row):
+        if self.length[row] == OTHER:
+            return self.other_keys[self.net[row]]
+        return '{}/{}'.format(socket.inet_ntoa(self.net[row].to_bytes(4, 'big')), self.length[row])
+
+    def attributes(self, row):
+        return {each_field: self.values[idx][self.columns[idx][row]] for idx, each_field in enumerate(self.fields)}
+
+    def get(self, prefix, default=None):
+        if self.index != None:
+            self.freeze()
+        row = self.row(prefix) if isinstance(prefix, str) else None
+        return default if row == None else self.attributes(row)
+
+    def __getitem__(self, prefix):
+        attributes = self.get(prefix)
+        if attributes == None:
+            raise KeyError(prefix)
+        return attributes
+
+    def __contains__(self, prefix):
+        if self.index != None:
+            self.freeze()
+        return isinstance(prefix, str) and self.row(prefix) != None
+
+    def __iter__(self):
+        for row in range(len(self.net)):
+            yield self.key(row)
+
+    def __len__(self):
+        return len(self.net)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def to_dict(self):
+        return {self.key(row): self.attributes(row) for row in range(len(self.net))}
+
+
+# DICT_TABLE: For napalm compare and the DM output, parsing straight into it saves building a PrefixTable only to convert it
+class DictTable(dict):
+    def __init__(self, fields):
+        super(DictTable, self).__init__()
+        self.fields = tuple(fields)
+
+    def add(self, prefix, attributes):
+        self[prefix] = {each_field: attributes[each_field] for each_field in self.fields}
+
+
+def to_dict(table):
+    return table.to_dict() if isinstance(table, PrefixTable) else table
@@ -0,0 +1,115 @@
+"""Native replacement for napalm validate.compare that gives the same report for large tables (routes, interfaces, VNIs).
+
+napalm deep copies the actual state at every nested dict (the whole table for a routing table) and runs every desired value
+through re.search, so a table of tens of thousands of entries takes seconds. This walks the desired state looking up each key
+in the actual state (hash lookup, nothing is copied), the extra keys of '_mode: strict' are the difference of the key sets and
+a desired value equal to the actual value matches without a regex. Everything else (lists, numeric '<'/'>' and '<->' range
+values, regex values) is compared the same way napalm does, so the complies/present/missing/extra report is the same.
+
+-compare: Same arguments and result as napalm validate.compare (unlike napalm the desired state is not changed)
+-compare_dict: Compares a dict, can be given the result of keys that haven't changed since the last run (snapshot)
+"""
+
+import re
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from napalm.base import validate as napalm_validate
+from napalm.base.exceptions import ValidationException
+
+MISSING = object()
+
+
+# STRIP_MODE: napalm pops '_mode' from each desired dict it compares, so it isn't in the desired values of its report
+def strip_mode(src):
+    if isinstance(src, dict) and "_mode" in src:
+        return {key: value for key, value in src.items() if key != "_mode"}
+    return src
+
+
+# MODE: Same modes (and error for an unknown one) as napalm
+def strict_mode(mode_string):
+    for mode in mode_string.split():
+        if mode != "strict":
+            raise ValidationException("mode '{}' not recognized".format(mode))
+    return "strict" in mode_string.split()
+
+
+def compare_list(src, dst, strict):
+    result = {"complies": True, "present": [], "missing": [], "extra": []}
+    dst = list(dst)
+    for src_element in src:
+        # Only elements napalm compares (there is an actual element left) have '_mode' removed
+        src_element = strip_mode(src_element) if len(dst) != 0 else src_element
+        for idx, dst_element in enumerate(dst):
+            match = compare(src_element, dst_element)
+            if match["complies"] if isinstance(match, dict) else match:
+                result["present"].append(src_element)
+                dst.pop(idx)
+                break
+        else:
+            result["complies"] = False
+            result["missing"].append(src_element)
+    if strict and dst:
+        result["extra"] = dst
+        result["complies"] = False
+    return result
+
+
+# PREVIOUS: {key: present entry} of keys known to be unchanged (snapshot) that are used rather than compared. CMP: Compare used per key
+def compare_dict(src, dst, strict, previous=None, cmp=None):
+    result = {"complies": True, "present": {}, "missing": [], "extra": []}
+    previous, cmp = previous or {}, cmp or compare
+    # NOT_DICT: napalm fails if the actual state isn't a dict (or columnar table), here all keys are just missing
+    dst = dst if isinstance(dst, Mapping) else {}
+    for key, src_element in src.items():
+        if key == "_mode":
+            continue
+        # One lookup (get) rather than 'in' and then get, a columnar table lookup is a binary search
+        dst_element = dst.get(key, MISSING)
+        if dst_element is MISSING:
+            result["missing"].append(key)
+            result["complies"] = False
+            continue
+        if key in previous:
+            result["present"][key] = previous[key]
+            result["complies"] = result["complies"] and previous[key]["complies"]
+            continue
+        match = cmp(src_element, dst_element)
+        if isinstance(match, dict):
+            result["present"][key] = {} if match["complies"] else {"diff": match}
+            complies, nested = match["complies"], True
+        else:
+            result["present"][key] = {} if match else {"expected_value": strip_mode(src_element), "actual_value": dst_element}
+            complies, nested = match, False
+        if not complies:
+            result["complies"] = False
+        result["present"][key]["complies"] = complies
+        result["present"][key]["nested"] = nested
+    if strict:
+        result["extra"] = [key for key in dst if key not in src]
+        if result["extra"]:
+            result["complies"] = False
+    return result
+
+
+def compare(src, dst):
+    if isinstance(src, dict):
+        strict = strict_mode(src.get("_mode", ""))
+        if "list" in src:
+            # This can happen with nested lists
+            if not isinstance(dst, list):
+                return False
+            return compare_list(src["list"], dst, strict)
+        return compare_dict(src, dst, strict)
+    elif isinstance(src, str):
+        # NUMERIC: '<', '>' and '<->' (range) are left to napalm
+        if src.startswith("<") or src.startswith(">") or "<->" in src:
+            return napalm_validate.compare(src, dst)
+        # EQUAL: Same value always complies (re.search of itself or src == dst), saves compiling a regex per value
+        if src == dst or (not isinstance(dst, str) and src == str(dst)):
+            return True
+        return bool(re.search(src, str(dst))) or src == dst
+    return napalm_validate.compare(src, dst)
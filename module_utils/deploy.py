@@ -0,0 +1,182 @@
+"""Deploys the config of all hosts in waves rather than all at once, so both members of an MLAG pair (or all the spines) are never being
+replaced at the same time.
+
+The waves are a list of inventory groups in the order they are deployed, for example the borders, then the spines one at a time and then
+the leafs. If a wave has pairs the group is split into the first (odd numbered) and second (even numbered) members of each MLAG pair so
+only one member of a pair is deployed at once. The hosts in a wave are deployed at the same time up to its concurrency (threads, each
+device is mostly waiting on NX-OS) and any hosts not in a wave are deployed last. After each wave the health gate (if set) is run on its
+hosts and the next wave is only started if it passes.
+
+Each host has a timeout for its whole deploy (open, load, diff and commit), a timed out device is treated as failed although napalm
+carries on in the background. On a failed or unhealthy host no more waves are started (on_failure stop) or all hosts committed in this
+run are rolled back (on_failure rollback, napalm rollback to the checkpoint taken before the commit), newest wave first.
+
+The driver is any napalm style driver (open, load_replace_candidate, compare_config, commit_config, discard_config, rollback and close)
+got from driver_factory(host) so it can be tested against a local mock driver rather than real devices. Before loading the config the
+capture hook (if set) can save anything from the device (the running config for module_utils/rollback) and the skip hook can stop a
+host being deployed at all.
+
+-plan_waves: Splits the hosts to deploy into the waves, returns [{name, concurrency, hosts}]
+-napalm_factory: Returns a driver_factory that creates napalm drivers from the hosts address and the credentials
+-Deployer: Holds the settings (waves, concurrency, timeout, on_failure), driver_factory and health gate
+-deploy_host: Replaces (or merges) the config of one host, returns its status
+-run_wave: Runs deploy_host for all hosts of the wave at the same time (bounded by concurrency)
+-run: Runs all the waves, returns {complete, waves, hosts: {host: status}}
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from module_utils.trace import span, traced
+
+# DEFAULT_WAVES: Borders a pair member at a time, spines one at a time and then leafs a pair member at a time
+DEFAULT_WAVES = [{'group': 'border', 'pairs': True}, {'group': 'spine', 'concurrency': 1}, {'group': 'leaf', 'pairs': True}]
+
+
+# PAIR_MEMBER: MLAG pairs are consecutive devices (01 & 02, 03 & 04), odd numbered devices are the first member (same as the inventory)
+def first_member(host):
+    return int(host[-2:]) % 2 != 0 if host[-2:].isdigit() else True
+
+
+def plan_waves(hosts, groups, waves=None, concurrency=10):
+    all_waves, planned = [], set()
+    for wave in waves or DEFAULT_WAVES:
+        members = [host for host in groups.get(wave['group'], []) if host in hosts and host not in planned]
+        planned.update(members)
+        if wave.get('pairs', False):
+            steps = [('{} (first of pair)'.format(wave['group']), [host for host in members if first_member(host)]),
+                     ('{} (second of pair)'.format(wave['group']), [host for host in members if not first_member(host)])]
+        else:
+            steps = [(wave['group'], members)]
+        for name, step_hosts in steps:
+            if len(step_hosts) != 0:
+                all_waves.append({'name': name, 'concurrency': wave.get('concurrency', concurrency), 'hosts': step_hosts})
+    # OTHER: Hosts not in any of the wave groups are deployed last
+    other = [host for host in hosts if host not in planned]
+    if len(other) != 0:
+        all_waves.append({'name': 'other', 'concurrency': concurrency, 'hosts': other})
+    return all_waves
+
+
+# NAPALM: DEVICES is {host: address}, OPTIONAL_ARGS is passed to the driver (transport, port, etc)
+def napalm_factory(os_type, devices, username, password, timeout=360, optional_args=None):
+    from napalm import get_network_driver           # Only imported if deploying to real devices, a mock driver doesn't need napalm
+    driver = get_network_driver(os_type)
+
+    def factory(host):
+        return driver(devices.get(host, host), username, password, timeout=timeout, optional_args=optional_args or {})
+    return factory
+
+
+class Deployer(object):
+    # CONFIGS: {host: config_file}. HEALTH: health(hosts) returns {host: True or reason it is unhealthy}, None is no health gate
+    # MERGE: Hosts whose config_file is merged (only the changed snippets) rather than replacing the config
+    # CAPTURE: capture(host, device) is run before the config is loaded (saves the running config), SKIP: skip(host, device) returns the
+    # status of a host that doesn't need deploying (None if it does). DIFF_FILE: Name of the diff file in diff_dir ({} is the host)
+    def __init__(self, driver_factory, configs, diff_dir=None, timeout=360, on_failure='stop', health=None, dry_run=False, merge=(),
+                 capture=None, skip=None, diff_file='{}.txt'):
+        self.driver_factory = driver_factory
+        self.configs = configs
+        self.merge = set(merge)
+        self.capture = capture
+        self.skip = skip
+        self.diff_file = diff_file
+        self.diff_dir = diff_dir
+        self.timeout = timeout
+        self.on_failure = on_failure
+        self.health = health
+        self.dry_run = dry_run
+        self.committed = []
+
+    # PUSH: Result is updated as it goes so a timed out host still shows how far it got (committing means it may need rolling back)
+    def push(self, host, result):
+        device = self.driver_factory(host)
+        device.open()
+        try:
+            if self.skip != None:
+                result['status'] = self.skip(host, device)
+                if result['status'] != None:
+                    return
+            if self.capture != None and not self.dry_run:
+                result['stage'] = 'capturing'
+                self.capture(host, device)
+            result['stage'] = 'loading'
+            if host in self.merge:
+                device.load_merge_candidate(filename=self.configs[host])
+            else:
+                device.load_replace_candidate(filename=self.configs[host])
+            diff = device.compare_config()
+            if self.diff_dir != None:
+                with open(os.path.join(self.diff_dir, self.diff_file.format(host)), 'w') as file_content:
+                    file_content.write(diff)
+            if self.dry_run or diff.strip() == '':
+                device.discard_config()
+                result['status'] = 'no changes' if diff.strip() == '' else 'would change'
+                return
+            result['stage'] = 'committing'
+            device.commit_config()
+            result['status'] = 'deployed'
+        finally:
+            device.close()
+
+    @traced('deploy', 'host')
+    def deploy_host(self, host):
+        result = {'stage': 'opening', 'status': None}
+
+        def worker():
+            try:
+                self.push(host, result)
+            except Exception as err:
+                result['status'] = 'failed ({}), {}: {}'.format(result['stage'], type(err).__name__, err)
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            result['status'] = 'failed ({}), timed out after {}s'.format(result['stage'], self.timeout)
+        if result['stage'] == 'committing':
+            self.committed.append(host)
+        return host, result['status']
+
+    @traced('rollback', 'host')
+    def rollback_host(self, host):
+        device = self.driver_factory(host)
+        try:
+            device.open()
+            device.rollback()
+            device.close()
+            return host, 'rolled back'
+        except Exception as err:
+            return host, 'rollback failed, {}: {}'.format(type(err).__name__, err)
+
+    def run_wave(self, wave, method):
+        with span('deploy_wave', wave=wave['name'], hosts=len(wave['hosts'])):
+            with ThreadPoolExecutor(max_workers=max(1, min(wave['concurrency'], len(wave['hosts'])))) as pool:
+                return dict(pool.map(method, wave['hosts']))
+
+    # FAILED: Any host that isn't deployed, unchanged or (dry_run) would change
+    def failed(self, statuses):
+        return [host for host, status in statuses.items() if status not in ['deployed', 'no changes', 'would change']]
+
+    def run(self, waves):
+        hosts = {host: 'not deployed' for wave in waves for host in wave['hosts']}
+        done_waves = []
+        for wave in waves:
+            statuses = self.run_wave(wave, self.deploy_host)
+            hosts.update(statuses)
+            done_waves.append(wave)
+            # HEALTH: Only hosts that were deployed are checked, nothing changed on the others
+            deployed = [host for host in wave['hosts'] if statuses[host] == 'deployed']
+            if len(self.failed(statuses)) == 0 and self.health != None and len(deployed) != 0:
+                for host, health in self.health(deployed).items():
+                    if health != True:
+                        hosts[host] = 'unhealthy, {}'.format(health)
+            if len(self.failed({host: hosts[host] for host in wave['hosts']})) != 0:
+                if self.on_failure == 'rollback':
+                    for done_wave in reversed(done_waves):
+                        rollback_wave = dict(done_wave, hosts=[host for host in done_wave['hosts'] if host in self.committed])
+                        if len(rollback_wave['hosts']) != 0:
+                            for host, status in self.run_wave(rollback_wave, self.rollback_host).items():
+                                hosts[host] = status if hosts[host] == 'deployed' else '{}, {}'.format(hosts[host], status)
+                return {'complete': False, 'waves': [each_wave['name'] for each_wave in done_waves], 'hosts': hosts}
+        return {'complete': True, 'waves': [each_wave['name'] for each_wave in done_waves], 'hosts': hosts}
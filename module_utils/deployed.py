@@ -0,0 +1,165 @@
+"""Keeps a normalised copy of the last config deployed to each host so a new config can be diffed against it offline.
+
+Replacing the config of an NX-OS device takes minutes even if nothing has changed. The config.cfg of each host that was
+successfully deployed is saved (in the deployed folder of ans.state_path) normalised, so whitespace and blank lines don't count
+as a change, along with its hash. The next build compares the hash of its config.cfg with it and only if different diffs the
+two section by section (a section is a top-level line and the indented lines under it), hosts with no changes are not deployed.
+As the diff is against what was deployed rather than the device, anything changed on the device outside of the playbook is
+only put back when the host is next deployed (or its deployed folder is deleted).
+
+The snippets config.cfg is joined from (base.conf, fabric.conf, svc_tnt.conf, svc_intf.conf, svc_rte.conf and dflt_intf.conf) are
+also saved with a hash of each. In auto mode a changed config is only merged (just the changed sections of the changed snippets) if that provably gives the
+same config as a replace, every changed snippet only adds lines. If any line is removed (including a changed value), a snippet is
+removed, a changed snippet has replace only (!#) lines or the snippets of the last deploy are unknown the whole config is replaced.
+
+-diff: Returns the added, removed and changed sections of the new config (all of them if there is no saved config) and the deploy mode
+-merge_config: The changed sections of the snippets being merged
+-read_config: Reads a hosts config.cfg and the snippets it was joined from
+-save: Saves the normalised config, its snippets and their hashes as the last deployed config
+-clear: Deletes the saved config so the host is deployed next time (config changed by merge or rollback)
+"""
+
+import difflib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+
+def normalise(config):
+    return '\n'.join(line.rstrip() for line in config.splitlines() if line.strip() != '') + '\n'
+
+
+# SECTIONS: {top-level line: lines}, the lines of any top-level line used more than once (vrf context, etc) are joined
+def sections(config):
+    all_sections, header = {}, None
+    for line in config.splitlines():
+        if not line.startswith(' ') or header == None:
+            header = line
+        all_sections.setdefault(header, []).append(line)
+    return all_sections
+
+
+# READ_CONFIG: config.cfg and {snippet: config} of the snippets it was joined from (the .conf files, same as assemble uses)
+def read_config(cfg_dir):
+    snippets = {}
+    for snippet in sorted(os.listdir(os.path.expanduser(cfg_dir))):
+        if snippet.endswith('.conf'):
+            with open(os.path.join(os.path.expanduser(cfg_dir), snippet), 'r') as file_content:
+                snippets[snippet] = file_content.read()
+    with open(os.path.join(os.path.expanduser(cfg_dir), 'config.cfg'), 'r') as file_content:
+        return file_content.read(), snippets
+
+
+def digest(config):
+    return hashlib.sha256(config.encode()).hexdigest()
+
+
+# REMOVED_LINES: Lines (per section) of the old config that are not in the new config, a merge can't remove them
+def removed_lines(old_config, new_config):
+    old_sections, new_sections = sections(old_config), sections(new_config)
+    removed = []
+    for header, lines in old_sections.items():
+        removed.extend((Counter(lines) - Counter(new_sections.get(header, []))).elements())
+    return removed
+
+
+class DeployedConfig(object):
+    def __init__(self, directory, hostname):
+        self.host_dir = os.path.join(os.path.expanduser(directory), 'deployed', hostname)
+        self.filename = os.path.join(self.host_dir, 'config.cfg')
+        self.hash_file = os.path.join(self.host_dir, 'config.json')
+        self.snippet_dir = os.path.join(self.host_dir, 'snippets')
+
+    # LOAD: Returns the config, its hash and the hash of each snippet ({} if the snippets weren't saved)
+    def load(self):
+        if not os.path.exists(self.filename) or not os.path.exists(self.hash_file):
+            return None, None, {}
+        try:
+            with open(self.hash_file, 'r') as file_content:
+                hashes = json.load(file_content)
+            config_hash = hashes['hash']
+        except (ValueError, KeyError):
+            return None, None, {}
+        with open(self.filename, 'r') as file_content:
+            return file_content.read(), config_hash, hashes.get('snippets', {})
+
+    def load_snippet(self, name):
+        with open(os.path.join(self.snippet_dir, name), 'r') as file_content:
+            return file_content.read()
+
+    # MODE: merge (only the changed snippets) if it gives the same config as a replace, otherwise replace. Returns mode, reason, changed snippets
+    def deploy_mode(self, snippets, old_hashes):
+        changed = sorted(name for name in set(snippets) | set(old_hashes) if digest(snippets.get(name, '')) != old_hashes.get(name))
+        if len(old_hashes) == 0:
+            return 'replace', 'snippets of the last deploy are unknown', changed
+        for name in changed:
+            if name not in snippets:
+                return 'replace', '{} has been removed'.format(name), changed
+            if any(line.lstrip().startswith('!#') for line in snippets[name].splitlines()):
+                return 'replace', '{} has replace only (!#) lines'.format(name), changed
+            if name in old_hashes and len(removed_lines(self.load_snippet(name), snippets[name])) != 0:
+                return 'replace', '{} has lines removed or changed'.format(name), changed
+        return 'merge', 'only lines added to {}'.format(', '.join(changed)), changed
+
+    # DIFF: CHANGED is False only if the config is the same as the last deployed, DIFF is a unified diff of each changed section
+    # SNIPPETS: {snippet: config}, with mode auto MODE is merge if only the changed snippets (MERGE) need to be deployed, otherwise replace
+    def diff(self, config, snippets=None, mode='replace'):
+        config = normalise(config)
+        config_hash = digest(config)
+        old_config, old_hash, old_hashes = self.load()
+        result = {'changed': config_hash != old_hash, 'hash': config_hash, 'added': [], 'removed': [], 'modified': [], 'diff': '',
+                  'mode': 'none', 'reason': 'no changes', 'merge': []}
+        if not result['changed']:
+            return result
+        result['mode'], result['reason'] = 'replace', 'mode is replace'
+        if mode == 'auto' and snippets != None:
+            snippets = {name: normalise(snippet) for name, snippet in snippets.items()}
+            result['mode'], result['reason'], result['merge'] = self.deploy_mode(snippets, old_hashes)
+        old_sections, new_sections = sections(old_config or ''), sections(config)
+        result['added'] = [header for header in new_sections if header not in old_sections]
+        result['removed'] = [header for header in old_sections if header not in new_sections]
+        result['modified'] = [header for header in new_sections if header in old_sections
+                              and new_sections[header] != old_sections[header]]
+        all_diff = []
+        for header in result['modified'] + result['added'] + result['removed']:
+            all_diff.extend(difflib.unified_diff(old_sections.get(header, []), new_sections.get(header, []),
+                                                 'deployed', 'config.cfg', lineterm=''))
+        result['diff'] = '\n'.join(all_diff)
+        return result
+
+    # MERGE_CONFIG: The sections (top-level line and the lines under it) of the merge snippets that are new or have lines added
+    def merge_config(self, snippets, names):
+        lines = []
+        for name in names:
+            old_sections = {}
+            if os.path.exists(os.path.join(self.snippet_dir, name)):
+                old_sections = sections(self.load_snippet(name))
+            for header, section in sections(normalise(snippets[name])).items():
+                if old_sections.get(header) != section:
+                    lines.extend(section)
+        return '\n'.join(lines) + '\n'
+
+    def write(self, filename, content):
+        tmp_fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(filename), suffix='.tmp')
+        with os.fdopen(tmp_fd, 'w') as file_content:
+            file_content.write(content)
+        os.replace(tmp_name, filename)
+
+    # SAVE: The hashes are removed first and written last so an interrupted save is never used (no hashes is no deployed config)
+    def save(self, config, snippets=None):
+        config = normalise(config)
+        snippets = {name: normalise(snippet) for name, snippet in (snippets or {}).items()}
+        if os.path.exists(self.hash_file):
+            os.remove(self.hash_file)
+        shutil.rmtree(self.snippet_dir, ignore_errors=True)
+        os.makedirs(self.snippet_dir, exist_ok=True)
+        for name, snippet in snippets.items():
+            self.write(os.path.join(self.snippet_dir, name), snippet)
+        self.write(self.filename, config)
+        self.write(self.hash_file, json.dumps({'hash': digest(config), 'snippets': {name: digest(snippet) for name, snippet in snippets.items()}}))
+
+    def clear(self):
+        shutil.rmtree(self.host_dir, ignore_errors=True)
@@ -0,0 +1,62 @@
+"""Interface, loopback and port-channel number allocator used when dynamically assigning from the svc_intf.adv ranges.
+
+A reserved range (first to last) is held as a bitmap (python int) where a set bit means that number is free. Reserving,
+releasing and finding the next free number are single bit operations rather than building, subtracting and sorting lists
+of every number in the range, so stays quick with modular chassis of 400+ ports and ranges of thousands of port-channels.
+
+Used by both input_validate (svc_intf: Is there enough free numbers in each range) and format_dm (svc_intf_dm: Assign the numbers)
+so the check and the assignment can never disagree. Pinned (statically defined) numbers are reserved first so are always honoured.
+
+-reserve: Marks a number as used, returns False if it was outside the range or already used
+-release: Marks a number as free again (if within the range)
+-next_free: The lowest free number in the range (None if the range is full)
+-allocate: Reserves and returns the lowest free number (None if the range is full)
+-num_free: How many free numbers are left in the range
+"""
+
+
+class IntfAllocator(object):
+    def __init__(self, first, last, used=None):
+        self.first = first
+        self.last = last
+        # BITMAP: Bit 0 is the first number in the range, all bits start as set (free)
+        self.free = (1 << (last - first + 1)) - 1 if last >= first else 0
+        for num in used or []:
+            self.reserve(num)
+
+    def __contains__(self, num):
+        return isinstance(num, int) and self.first <= num <= self.last
+
+    def __len__(self):
+        return self.num_free()
+
+    def reserve(self, num):
+        if num not in self:
+            return False
+        bit = 1 << (num - self.first)
+        if not self.free & bit:
+            return False
+        self.free &= ~bit
+        return True
+
+    def release(self, num):
+        if num in self:
+            self.free |= 1 << (num - self.first)
+
+    def is_free(self, num):
+        return num in self and bool(self.free & (1 << (num - self.first)))
+
+    # NEXT_FREE: free & -free isolates the lowest set bit, its position is the offset of the lowest free number
+    def next_free(self):
+        if self.free == 0:
+            return None
+        return self.first + (self.free & -self.free).bit_length() - 1
+
+    def allocate(self):
+        num = self.next_free()
+        if num is not None:
+            self.free &= self.free - 1          # Clears the lowest set bit
+        return num
+
+    def num_free(self):
+        return bin(self.free).count('1')
@@ -0,0 +1,87 @@
+"""Ledger of the interface, loopback and port-channel numbers dynamically assigned by svc_intf_dm.
+
+Without it assignment is positional (the Nth interface needing a number gets the Nth free number), so adding one interface
+near the top of service_interface.yml shifts every later assignment and causes a large config change on many ports.
+The ledger records what each interface was given keyed by a stable identity (interface type and description) so on the
+next run it gets the same number back, only new interfaces are assigned new numbers.
+
+The ledger is a JSON file per switch and homed type ({switch}_single_homed.json or {odd_mlag_switch}_dual_homed.json)
+stored in the intf_ledger folder of ans.state_path, as Ansible runs the hosts in parallel this means a file is only ever
+written by that switch (or MLAG pair that will both write the same content). It is written atomically (temp file and rename).
+A read_only ledger gives the same numbers (new interfaces still get the next free number) but is never written, is used by
+post-validation, check mode and the roles that only need the DM (base and intf_cleanup) so only the services role records assignments.
+
+-pair_name: The switch dual-homed numbers are stored under, the odd numbered (first) member of the MLAG pair
+-digest: Hash of the ledger files a switch uses, part of the service_interface change set (module_utils/change_set)
+-key: Creates the identity of the interface, if the description is used more than once on the switch adds the occurrence number
+-get: Gets the number the interface was assigned in the ledger (None if not in it)
+-set: Records the number the interface has been assigned
+-save: Removes any interfaces no longer defined (frees their numbers) and writes the ledger if it has changed (unless read_only)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from module_utils.deploy import first_member
+
+
+def pair_name(switch):
+    return switch if first_member(switch) else switch[:-2] + "{:02d}".format(int(switch[-2:]) - 1)
+
+
+# DIGEST: Changes if the ledger of the switch is edited or deleted between runs so its cached DM isn't used (a missing file hashes as empty)
+def digest(directory, switch):
+    sha = hashlib.sha256()
+    for filename in [IntfLedger.path(directory, switch, 'single_homed'), IntfLedger.path(directory, pair_name(switch), 'dual_homed')]:
+        sha.update(os.path.basename(filename).encode())
+        if os.path.exists(filename):
+            with open(filename, 'rb') as file_content:
+                sha.update(file_content.read())
+    return sha.hexdigest()
+
+
+class IntfLedger(object):
+    def __init__(self, directory, switch, homed, read_only=False):
+        self.read_only = read_only
+        self.filename = self.path(directory, switch, homed)
+        self.entries, self.seen = {}, {}
+        self.changed = False
+        if os.path.exists(self.filename):
+            with open(self.filename, 'r') as file_content:
+                self.entries = json.load(file_content)
+
+    @staticmethod
+    def path(directory, switch, homed):
+        return os.path.join(os.path.expanduser(directory), 'intf_ledger', '{}_{}.json'.format(switch, homed))
+
+    def key(self, intf):
+        key = '{}:{}'.format(intf['type'], intf['descr'])
+        self.seen[key] = self.seen.get(key, 0) + 1
+        if self.seen[key] > 1:
+            key = '{}#{}'.format(key, self.seen[key])
+            self.seen[key] = 1
+        return key
+
+    def get(self, key, field):
+        return self.entries.get(key, {}).get(field)
+
+    def set(self, key, field, num):
+        if self.get(key, field) != num:
+            self.entries.setdefault(key, {})[field] = num
+            self.changed = True
+
+    def save(self):
+        for key in list(self.entries):
+            if key not in self.seen:
+                del self.entries[key]
+                self.changed = True
+        if not self.changed or self.read_only:
+            return
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        tmp_fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(self.filename), suffix='.tmp')
+        with os.fdopen(tmp_fd, 'w') as file_content:
+            json.dump(self.entries, file_content, indent=2, sort_keys=True)
+        os.replace(tmp_name, self.filename)
+        self.changed = False
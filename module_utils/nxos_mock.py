@@ -0,0 +1,227 @@
+"""Mock NAPALM NX-OS driver and simulated devices, used to test and load test deploy and validation without any real switches.
+
+Each simulated device is a folder (directory/<host>) holding its running config (running-config.cfg), the checkpoint taken before the
+last commit (checkpoint.cfg) and the recorded output of the show commands in the same layout as nxos_sim and the collector cache (a JSON
+file per command, such as show_ip_ospf_neighbors_detail.json). Commands not recorded for a device are got from the template folder (if
+set) so hundreds of devices can share the one set of recorded output. As the state is in files it is kept between driver instances and
+processes, the same folders can be served over NX-API by nxos_sim for the collector.
+
+MockNxosDriver has the napalm driver methods used by napalm_install_config, napalm_cli and the deploy orchestrator (open,
+load_replace_candidate, load_merge_candidate, compare_config, commit_config, discard_config, rollback, cli, get_config, get_facts and
+close).
+Latency is the seconds each operation takes (open, load, commit, rollback, cli) with up to jitter (fraction) added at random,
+fail is {operation: [hosts]} that raise an error on that operation.
+
+Run on its own it creates the device folders, --template copies the recorded output into every device so nxos_sim can serve them.
+
+python -m module_utils.nxos_mock ~/sim --devices 500 --template ~/recorded/DC1-N9K-LEAF01
+
+-SimFabric: The simulated devices (folder), template, latency, jitter and fail, creates the device folders
+-MockNxosDriver: napalm style driver for one simulated device
+-driver_factory: Returns a driver_factory (module_utils/deploy) for the simulated devices
+"""
+
+import argparse
+import difflib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from module_utils.collector import cmd_filename
+from module_utils.deployed import normalise
+
+try:
+    from napalm.base import NetworkDriver
+    from napalm.base.exceptions import CommandErrorException, CommitError, MergeConfigException, ReplaceConfigException
+except ImportError:
+    NetworkDriver = object
+    CommandErrorException, CommitError, MergeConfigException, ReplaceConfigException = (Exception for i in range(4))
+
+# LATENCY: Defaults are roughly a N9Kv, the commit (replace) is the slowest
+DEFAULT_LATENCY = {'open': 0.5, 'load': 0.2, 'commit': 5, 'rollback': 5, 'cli': 0.1}
+
+
+class SimFabric(object):
+    def __init__(self, directory, template=None, latency=None, jitter=0, fail=None):
+        self.directory = os.path.expanduser(directory)
+        self.template = os.path.expanduser(template) if template != None else None
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.jitter = jitter
+        self.fail = fail or {}
+        self.locks, self.lock = {}, threading.Lock()
+
+    # CREATE: Device folders (with an empty running config) for the hosts that don't already have one
+    def create(self, hosts):
+        for host in hosts:
+            host_dir = os.path.join(self.directory, host)
+            os.makedirs(host_dir, exist_ok=True)
+            if not os.path.exists(os.path.join(host_dir, 'running-config.cfg')):
+                self.write(host, 'running-config.cfg', 'hostname {}\n'.format(host))
+        return self
+
+    def hosts(self):
+        return sorted(host for host in os.listdir(self.directory) if os.path.isdir(os.path.join(self.directory, host)))
+
+    # LOCK: One operation at a time per device, the same as a config session
+    def device_lock(self, host):
+        with self.lock:
+            return self.locks.setdefault(host, threading.Lock())
+
+    def wait(self, host, operation):
+        if host in self.fail.get(operation, []):
+            raise RuntimeError('{} failed on {} (simulated)'.format(operation, host))
+        delay = self.latency.get(operation, 0)
+        time.sleep(delay + delay * self.jitter * random.random())
+
+    def read(self, host, filename):
+        path = os.path.join(self.directory, host, filename)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as file_content:
+            return file_content.read()
+
+    def write(self, host, filename, content):
+        host_dir = os.path.join(self.directory, host)
+        tmp_fd, tmp_name = tempfile.mkstemp(dir=host_dir, suffix='.tmp')
+        with os.fdopen(tmp_fd, 'w') as file_content:
+            file_content.write(content)
+        os.replace(tmp_name, os.path.join(host_dir, filename))
+
+    # OUTPUT: Recorded output of the device, if not recorded for the device from the template. None if neither has it
+    def output(self, host, cmd):
+        for folder in [os.path.join(self.directory, host), self.template]:
+            if folder != None and os.path.exists(os.path.join(folder, cmd_filename(cmd))):
+                with open(os.path.join(folder, cmd_filename(cmd)), 'r') as file_content:
+                    return file_content.read()
+        return None
+
+
+class MockNxosDriver(NetworkDriver):
+    # OPTIONAL_ARGS: fabric (SimFabric) or directory, template, latency, jitter and fail to create one (napalm only passes plain values)
+    def __init__(self, hostname, username='', password='', timeout=60, optional_args=None):
+        optional_args = optional_args or {}
+        self.hostname = hostname
+        self.timeout = timeout
+        self.fabric = optional_args.get('fabric')
+        if self.fabric == None:
+            self.fabric = SimFabric(optional_args['directory'], optional_args.get('template'), optional_args.get('latency'),
+                                    optional_args.get('jitter', 0), optional_args.get('fail'))
+        self.candidate, self.replace = None, True
+
+    def open(self):
+        if not os.path.isdir(os.path.join(self.fabric.directory, self.hostname)):
+            raise ConnectionError('{} is not a simulated device'.format(self.hostname))
+        self.fabric.wait(self.hostname, 'open')
+
+    def close(self):
+        self.candidate = None
+
+    def is_alive(self):
+        return {'is_alive': True}
+
+    def load_candidate(self, filename, config, error):
+        try:
+            self.fabric.wait(self.hostname, 'load')
+        except RuntimeError as err:
+            raise error(str(err))
+        if filename != None:
+            with open(os.path.expanduser(filename), 'r') as file_content:
+                config = file_content.read()
+        return normalise(config or '')
+
+    def load_replace_candidate(self, filename=None, config=None):
+        self.candidate, self.replace = self.load_candidate(filename, config, ReplaceConfigException), True
+
+    # MERGE: The merged lines are added to the end of the running config (good enough for a diff and the running config)
+    def load_merge_candidate(self, filename=None, config=None):
+        self.candidate, self.replace = self.load_candidate(filename, config, MergeConfigException), False
+
+    def running(self):
+        return normalise(self.fabric.read(self.hostname, 'running-config.cfg') or '')
+
+    def new_config(self):
+        if self.replace:
+            return self.candidate
+        running = self.running()
+        return running + ''.join(line + '\n' for line in self.candidate.splitlines() if line not in running.splitlines())
+
+    # COMPARE: Lines removed (-) and added (+) by the candidate, empty if there is no change (same as napalm)
+    def compare_config(self):
+        if self.candidate == None:
+            return ''
+        return '\n'.join(line for line in difflib.unified_diff(self.running().splitlines(), self.new_config().splitlines(), n=0, lineterm='')
+                         if line[:1] in '+-' and line[:3] not in ['+++', '---'])
+
+    def commit_config(self, message='', revert_in=None):
+        if self.candidate == None:
+            raise CommitError('No candidate config loaded')
+        with self.fabric.device_lock(self.hostname):
+            try:
+                self.fabric.wait(self.hostname, 'commit')
+            except RuntimeError as err:
+                raise CommitError(str(err))
+            self.fabric.write(self.hostname, 'checkpoint.cfg', self.running())
+            self.fabric.write(self.hostname, 'running-config.cfg', self.new_config())
+        self.candidate = None
+
+    def discard_config(self):
+        self.candidate = None
+
+    def rollback(self):
+        with self.fabric.device_lock(self.hostname):
+            checkpoint = self.fabric.read(self.hostname, 'checkpoint.cfg')
+            if checkpoint == None:
+                raise ReplaceConfigException('No checkpoint to roll back to')
+            self.fabric.wait(self.hostname, 'rollback')
+            self.fabric.write(self.hostname, 'running-config.cfg', checkpoint)
+
+    # CLI: {cmd: output} the same as napalm (raw string), show running-config is the simulated running config
+    def cli(self, commands, encoding='text'):
+        self.fabric.wait(self.hostname, 'cli')
+        result = {}
+        for cmd in commands:
+            if cmd.strip() == 'show running-config':
+                result[cmd] = self.running()
+                continue
+            output = self.fabric.output(self.hostname, cmd)
+            if output == None:
+                raise CommandErrorException('% Invalid command at {} ({})'.format(cmd, self.hostname))
+            result[cmd] = output
+        return result
+
+    # GET_CONFIG: Same keys as napalm, only the running config is simulated (startup is the same as running)
+    def get_config(self, retrieve='all', full=False, sanitized=False):
+        self.fabric.wait(self.hostname, 'cli')
+        running = self.running()
+        return {'running': running if retrieve in ['all', 'running'] else '', 'startup': running if retrieve in ['all', 'startup'] else '',
+                'candidate': ''}
+
+    def get_facts(self):
+        return {'hostname': self.hostname, 'fqdn': self.hostname, 'vendor': 'Cisco', 'model': 'Nexus9000 (simulated)',
+                'os_version': 'mock', 'serial_number': '', 'uptime': 0, 'interface_list': []}
+
+
+def driver_factory(fabric, timeout=360):
+    def factory(host):
+        return MockNxosDriver(host, timeout=timeout, optional_args={'fabric': fabric})
+    return factory
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Creates the folders of simulated NX-OS devices used by the mock napalm driver')
+    parser.add_argument('directory', help='Folder to create a folder per simulated device in')
+    parser.add_argument('--devices', type=int, default=10, help='Number of devices (SIM-0001 upwards) if --hosts is not used')
+    parser.add_argument('--hosts', nargs='*', help='Names of the devices')
+    parser.add_argument('--template', help='Folder of recorded output copied into every device')
+    args = parser.parse_args()
+    fabric = SimFabric(args.directory).create(args.hosts or ['SIM-{:04d}'.format(idx) for idx in range(1, args.devices + 1)])
+    if args.template != None:
+        for host in fabric.hosts():
+            for each_file in os.listdir(os.path.expanduser(args.template)):
+                if each_file.endswith('.json') and fabric.read(host, each_file) == None:
+                    with open(os.path.join(os.path.expanduser(args.template), each_file), 'r') as file_content:
+                        fabric.write(host, each_file, file_content.read())
+    print(json.dumps({'directory': fabric.directory, 'devices': len(fabric.hosts())}))
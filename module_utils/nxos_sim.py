@@ -0,0 +1,121 @@
+"""Fake NX-OS NX-API endpoint that serves recorded command output, used to test validation without any real devices.
+
+Answers the NX-API JSON-RPC calls (POST /ins) made by the napalm nxos driver (transport http) for 'cli' (structured
+output) and 'cli_ascii' (raw text, what napalm_cli uses). The recorded output of each command is a JSON file named after
+the normalised command (without '| json', lowercase and spaces replaced with _) in a folder per device, for example
+recorded/DC1-N9K-LEAF01/show_ip_ospf_neighbors_detail.json. This is the same as the collector cache so the output it gathered
+(or from the custom_val_builder 'disc' tag) can be served back. A command that has not been recorded returns the NX-OS 'invalid command' error.
+
+Each device is served on its own port (first_port upwards in the order of the sorted device folders), point the napalm
+provider at it with optional_args {transport: http, port: xxxx}. The number of requests and commands per device is counted
+so it can be checked how many sessions/round trips a collection method takes, delay (secs) simulates a slow device and drop
+closes the connection of that many requests without answering (a device dropping the session) before it answers normally.
+
+python -m module_utils.nxos_sim recorded/ --port 8080 --delay 2
+
+-NxosSim: Server for one device, start (in a thread) and stop
+-serve_fabric: Starts a server for every device folder, returns {device: port}
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from module_utils.collector import cmd_filename
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    # DISCONNECT: Clients giving up on a slow (delay) device is expected so isn't printed
+    def handle_error(self, request, client_address):
+        pass
+
+
+class NxosSim(object):
+    def __init__(self, directory, port, address='127.0.0.1', delay=0, drop=0):
+        self.directory = os.path.expanduser(directory)
+        self.delay = delay
+        self.drop = drop
+        self.requests, self.commands = (0 for i in range(2))
+        sim = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'           # Keep-alive so a napalm session is one TCP connection
+
+            def do_POST(self):
+                sim.requests += 1
+                time.sleep(sim.delay)
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or '[]')
+                if sim.requests <= sim.drop:
+                    self.close_connection = True
+                    return
+                result = [sim.answer(each_call) for each_call in (body if isinstance(body, list) else [body])]
+                data = json.dumps(result if isinstance(body, list) else result[0]).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json-rpc')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((address, port), Handler)
+        self.port = self.server.server_address[1]
+
+    # ANSWER: One JSON-RPC call, 'cli' returns the output as a dict (body) and 'cli_ascii' as a string (msg)
+    def answer(self, call):
+        self.commands += 1
+        cmd = call.get('params', {}).get('cmd', '')
+        filename = os.path.join(self.directory, cmd_filename(cmd))
+        if not os.path.exists(filename):
+            return {'jsonrpc': '2.0', 'id': call.get('id'),
+                    'error': {'code': -32602, 'message': 'Invalid params', 'data': {'msg': '% Invalid command\n'}}}
+        with open(filename, 'r') as file_content:
+            output = file_content.read()
+        if call.get('method') == 'cli_ascii':
+            result = {'msg': output}
+        else:
+            result = {'body': json.loads(output)}
+        return {'jsonrpc': '2.0', 'id': call.get('id'), 'result': result}
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def serve_fabric(directory, first_port=0, address='127.0.0.1', delay=0, drop=0):
+    servers = {}
+    directory = os.path.expanduser(directory)
+    for idx, device in enumerate(sorted(os.listdir(directory))):
+        if os.path.isdir(os.path.join(directory, device)):
+            port = first_port + idx if first_port != 0 else 0
+            servers[device] = NxosSim(os.path.join(directory, device), port, address, delay, drop).start()
+    return servers
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves recorded NX-OS command output over NX-API')
+    parser.add_argument('directory', help='Folder holding a folder of recorded output per device')
+    parser.add_argument('--port', type=int, default=8080, help='Port of the first device, each device is on the next port')
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--delay', type=float, default=0, help='Seconds each request takes to answer')
+    parser.add_argument('--drop', type=int, default=0, help='Number of requests each device drops before answering')
+    args = parser.parse_args()
+    servers = serve_fabric(args.directory, args.port, args.address, args.delay, args.drop)
+    for device, sim in servers.items():
+        print('{} >> http://{}:{}/ins'.format(device, args.address, sim.port))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for sim in servers.values():
+            sim.stop()
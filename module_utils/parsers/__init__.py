@@ -0,0 +1,138 @@
+"""Registry of the parsers that turn device command output (JSON) into the actual_state data model used by custom_validate.
+
+Each OS has its own module (module_utils/parsers/nxos.py) in which a parser is registered against the normalised command
+(without '| json', lowercase and single spaced) using the register decorator. The parser is found by the longest registered
+command that the run command starts with (a dict lookup per word), so 'show ip route vrf all' uses the 'show ip route' parser.
+The order parsers are registered in doesn't matter. Both custom_validate (nxos_dm) and val_builder (device_dm) use it.
+
+To add a new validation write a function that takes the JSON output (dict) and returns the actual_state for that command
+and decorate it with @register('nxos', 'show xxx'), key is the name of the cmd in the actual_state (defaults to the cmd).
+Parsers registered with table=True (route and BGP tables) take the class of table to build (table), a columnar PrefixTable
+for the native compare or a DictTable (plain nested dicts) for napalm compare and the DM output (parse_cmd columnar).
+
+Commands with very large output (full route or BGP tables) where only a few rows are kept can also have a streaming parser
+(@register_stream) that gets the output as a file object. It uses iter_rows to walk the JSON incrementally (ijson) only
+building one row at a time, so memory is bounded by the result rather than a dict of the whole output. The output (string) is
+given to ijson a chunk at a time (TextReader) so it is never copied whole. If ijson is not installed the normal parser is used.
+
+-normalise_cmd: Removes '| json', lowercase and single spaces
+-register: Decorator that adds a parser to the OS registry
+-register_stream: Decorator that adds a streaming parser for a command that already has a parser
+-TextReader: Binary file object over a string that encodes a chunk of it per read
+-iter_rows: Streams the rows at a path in the JSON returning each as a dict along with the values of any context keys seen before it
+-get_parser: Finds the parser for a command, returns (key, parser) or None
+-parse_cmd: Runs the parser for one command, returns (key, actual_state) or None if there is no parser, columnar for a PrefixTable
+-parse: Runs the parsers for all the commands {cmd: output} and adds the results (as nested dicts) to the actual_state
+"""
+
+from collections import defaultdict
+import importlib
+import json
+
+from module_utils.columnar import DictTable, PrefixTable, to_dict
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
+
+PARSERS, STREAM_PARSERS = (defaultdict(dict) for i in range(2))
+TABLES = defaultdict(set)           # Cmds whose parsers take the table class
+
+
+def normalise_cmd(cmd):
+    return ' '.join(cmd.replace('| json', '').lower().split())
+
+
+def register(os_type, cmd, key=None, table=False):
+    def add_parser(parser):
+        PARSERS[os_type][normalise_cmd(cmd)] = (key or cmd, parser)
+        if table:
+            TABLES[os_type].add(normalise_cmd(cmd))
+        return parser
+    return add_parser
+
+
+def register_stream(os_type, cmd):
+    def add_parser(parser):
+        STREAM_PARSERS[os_type][normalise_cmd(cmd)] = parser
+        return parser
+    return add_parser
+
+
+# LOOKUP: Longest registered cmd the run cmd starts with, returns the registered cmd
+def lookup_cmd(os_type, cmd):
+    # Importing the OS module registers its parsers
+    if os_type not in PARSERS:
+        importlib.import_module(__name__ + '.' + os_type)
+    words = normalise_cmd(cmd).split()
+    for num_words in range(len(words), 0, -1):
+        if ' '.join(words[:num_words]) in PARSERS[os_type]:
+            return ' '.join(words[:num_words])
+    return None
+
+
+def get_parser(os_type, cmd):
+    reg_cmd = lookup_cmd(os_type, cmd)
+    return PARSERS[os_type][reg_cmd] if reg_cmd != None else None
+
+
+# TEXT_READER: ijson reads bytes, encoding the whole output (BytesIO) or a StringIO would hold another full copy of it
+class TextReader(object):
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+
+    def read(self, size=-1):
+        size = len(self.text) - self.pos if size < 0 else size
+        chunk = self.text[self.pos:self.pos + size]
+        self.pos += len(chunk)
+        return chunk.encode()
+
+
+# ROWS: Path is the dotted keys to the rows (ROW_xxx) as if NXOS always used lists, it is matched whether is a dict (single item) or list
+# CTX_KEYS: Values (such as vrf-name-out) from outside the rows, they must come before the rows in the output (as is with NXOS)
+def iter_rows(file_obj, path, ctx_keys=()):
+    builder, depth, ctx = None, 0, {}
+    for prefix, event, value in ijson.parse(file_obj, use_float=True):
+        if builder != None:
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+                if depth == 0:
+                    yield dict(ctx), builder.value
+                    builder = None
+        elif event == 'start_map' and '.'.join(elem for elem in prefix.split('.') if elem != 'item') == path:
+            builder, depth = ObjectBuilder(), 1
+            builder.event(event, value)
+        elif event in ('string', 'number', 'boolean', 'null') and prefix.rsplit('.', 1)[-1] in ctx_keys:
+            ctx[prefix.rsplit('.', 1)[-1]] = value
+
+
+# COLUMNAR: Route and BGP tables are built as a PrefixTable (native compare), otherwise straight into nested dicts (DictTable)
+def parse_cmd(os_type, cmd, output, columnar=True):
+    # EMPTY: If output is empty just adds an empty dictionary
+    if output == None:
+        return cmd.replace(' | json', ''), defaultdict(dict)
+    reg_cmd = lookup_cmd(os_type, cmd)
+    if reg_cmd == None:
+        return None
+    key, parser = PARSERS[os_type][reg_cmd]
+    table = {'table': PrefixTable if columnar else DictTable} if reg_cmd in TABLES[os_type] else {}
+    # STREAM: Walks the serialized json picking out only the rows needed rather than loading it all
+    if ijson != None and reg_cmd in STREAM_PARSERS[os_type]:
+        return key, STREAM_PARSERS[os_type][reg_cmd](TextReader(output), **table)
+    # Ansible output is in serialized json (long sting), needs making into json so can be used like a normal dictionary
+    return key, parser(json.loads(output), **table)
+
+
+def parse(os_type, cmd_output, actual_state=None):
+    actual_state = {} if actual_state == None else actual_state
+    for cmd, output in cmd_output.items():
+        result = parse_cmd(os_type, cmd, output, columnar=False)
+        if result != None:
+            actual_state[result[0]] = to_dict(result[1])
+    return actual_state
@@ -0,0 +1,239 @@
+"""NXOS parsers, formats the JSON output of each command into the same format as the desired_state validation file.
+
+Each parser is registered against the command it parses (see module_utils/parsers/__init__.py) and returns the actual_state
+of that command. The route and BGP tables also have a streaming parser (used if ijson is installed) that only keeps the
+rows the validation uses, both share the per-row (prefix) logic so give the same result. Their actual_state is a columnar
+PrefixTable (module_utils/columnar.py) rather than a dict per prefix, or a DictTable (table) if it is only going to be nested dicts.
+"""
+
+from collections import defaultdict
+
+from module_utils.columnar import PrefixTable
+from module_utils.parsers import iter_rows, register, register_stream
+
+# Attributes of the route and BGP tables, these are columnar (PrefixTable) as can be hundreds of thousands of prefixes
+RTE_FIELDS = ('vrf', 'next-hop', 'ad')
+BGP_FIELDS = ('vrf', 'type', 'status', 'best')
+
+
+# Fixes issues due to shit NXOS JSON making dict rather than list if only item
+def shit_nxos(main_dict, parent_dict, child_dict):
+    if isinstance(main_dict[parent_dict][child_dict], dict):
+        main_dict[parent_dict][child_dict] = [main_dict[parent_dict][child_dict]]
+
+
+# OSPF: Creates a dictionary from the device output to match the format of the validation file
+@register('nxos', 'show ip ospf neighbors detail')
+def ospf_nbr(json_output):
+    tmp_dict = defaultdict(dict)
+    shit_nxos(json_output, 'TABLE_ctx', 'ROW_ctx')
+    for each_proc in json_output['TABLE_ctx']['ROW_ctx']:
+        shit_nxos(each_proc, 'TABLE_nbr', 'ROW_nbr')
+        for each_nhbr in each_proc['TABLE_nbr']['ROW_nbr']:
+            tmp_dict[each_nhbr['rid']] = {'state': each_nhbr['state']}
+    return tmp_dict
+
+
+# PO: Creates a dictionary from the device output to match the format of the validation file
+@register('nxos', 'show port-channel summary')
+def po_summary(json_output):
+    tmp_dict = defaultdict(dict)
+    shit_nxos(json_output, 'TABLE_channel', 'ROW_channel')
+    for po in json_output['TABLE_channel']['ROW_channel']:
+        tmp_dict[po['port-channel']]['oper_status'] = po['status']
+        tmp_dict[po['port-channel']]['protocol'] = po['prtcl']
+        po_mbrs = {}
+        if len(po) == 7:
+            shit_nxos(po, 'TABLE_member', 'ROW_member')
+            for mbr in po['TABLE_member']['ROW_member']:
+                # Creates dict of members to add to as value in the PO dictionary
+                po_mbrs[mbr['port']] = {'mbr_status': mbr['port-status']}
+        tmp_dict[po['port-channel']]['members'] = po_mbrs
+    return tmp_dict
+
+
+# vPC: Creates a dictionary from the device output to match the format of the validation file
+@register('nxos', 'show vpc')
+def vpc(json_output):
+    tmp_dict = defaultdict(dict)
+    tmp_dict['peer-link_po'] = json_output['TABLE_peerlink']['ROW_peerlink']['peerlink-ifindex']
+    tmp_dict['peer-link_vlans'] = json_output['TABLE_peerlink']['ROW_peerlink']['peer-up-vlan-bitset']
+    tmp_dict['vpc_peer_keepalive_status'] = json_output['vpc-peer-keepalive-status']
+    tmp_dict['vpc_peer_status'] = json_output['vpc-peer-status']
+    # TABLE_vpc is only present if are vPCs configured
+    if json_output.get('TABLE_vpc') != None:
+        shit_nxos(json_output, 'TABLE_vpc', 'ROW_vpc')
+        for vpc in json_output['TABLE_vpc']['ROW_vpc']:
+            tmp_dict[vpc['vpc-ifindex']]['consistency_status'] = vpc['vpc-consistency-status']
+            tmp_dict[vpc['vpc-ifindex']]['port_status'] = vpc['vpc-port-state']
+            tmp_dict[vpc['vpc-ifindex']]['vpc_num'] = vpc['vpc-id']
+            tmp_dict[vpc['vpc-ifindex']]['active_vlans'] = vpc['up-vlan-bitset']
+    return tmp_dict
+
+
+@register('nxos', 'show ip int brief include-secondary vrf all')
+def ip_int_brief(json_output):
+    tmp_dict = defaultdict(dict)
+    shit_nxos(json_output, 'TABLE_intf', 'ROW_intf')
+    for intf in json_output['TABLE_intf']['ROW_intf']:
+        tmp_dict[intf['intf-name']]['proto-state'] = intf['proto-state']
+        tmp_dict[intf['intf-name']]['link-state'] = intf['link-state']
+        tmp_dict[intf['intf-name']]['admin-state'] = intf['admin-state']
+        tmp_dict[intf['intf-name']]['tenant'] = intf['vrf-name-out']
+        intf.setdefault('prefix', None)
+        tmp_dict[intf['intf-name']]['prefix'] = intf['prefix']
+    return tmp_dict
+
+
+@register('nxos', 'show nve peers')
+def nve_peers(json_output):
+    tmp_dict = defaultdict(dict)
+    shit_nxos(json_output, 'TABLE_nve_peers', 'ROW_nve_peers')
+    for peer in json_output['TABLE_nve_peers']['ROW_nve_peers']:
+        tmp_dict[peer['peer-ip']] = {'peer-state': peer['peer-state']}
+    return tmp_dict
+
+
+@register('nxos', 'show nve vni')
+def nve_vni(json_output):
+    tmp_dict = defaultdict(dict)
+    shit_nxos(json_output, 'TABLE_nve_vni', 'ROW_nve_vni')
+    for vni in json_output['TABLE_nve_vni']['ROW_nve_vni']:
+        tmp_dict[vni['vni']] = {'type': vni['type'], 'state': vni['vni-state']}
+    return tmp_dict
+
+
+# INT_STATUS: Is a 1 deep nested dict {intf_name: {attribute: value}}}
+@register('nxos', 'show interface status')
+def intf_status(json_output):
+    tmp_dict = defaultdict(dict)
+    shit_nxos(json_output, 'TABLE_interface', 'ROW_interface')
+    for intf in json_output['TABLE_interface']['ROW_interface']:
+        tmp_dict[intf['interface']]['state'] = intf['state']
+        tmp_dict[intf['interface']]['vlan'] = intf['vlan']
+        intf.setdefault('name', None)
+        tmp_dict[intf['interface']]['name'] = intf['name']
+    return tmp_dict
+
+
+@register('nxos', 'show interface trunk')
+def intf_trunk(json_output):
+    tmp_dict = defaultdict(dict)
+    shit_nxos(json_output, 'TABLE_allowed_vlans', 'ROW_allowed_vlans')
+    shit_nxos(json_output, 'TABLE_stp_forward', 'ROW_stp_forward')
+    for allow_vlan, stp_vlan in zip(json_output['TABLE_allowed_vlans']['ROW_allowed_vlans'], json_output['TABLE_stp_forward']['ROW_stp_forward']):
+        tmp_dict[allow_vlan['interface']]['allowed_vlans'] = allow_vlan['allowedvlans']
+        tmp_dict[stp_vlan['interface']]['stpfwd_vlans'] = stp_vlan['stpfwd_vlans']
+    return tmp_dict
+
+
+# OSPF_INT_BRIEF: Is a 1 deep nested dict {interfaces: {attribute: value}}
+@register('nxos', 'show ip ospf interface brief', key='show ip ospf interface brief vrf all')
+def ospf_intf_brief(json_output):
+    tmp_dict = defaultdict(dict)
+    # Apply NXOS 'dict to list' fix incase only one interface
+    shit_nxos(json_output, 'TABLE_ctx', 'ROW_ctx')
+    for each_proc in json_output['TABLE_ctx']['ROW_ctx']:
+        shit_nxos(each_proc, 'TABLE_intf', 'ROW_intf')
+        # Loops through interfaces in OSPF process and creates temp dict of each interface in format {intf_name: {attribute: value}}
+        for each_intf in each_proc['TABLE_intf']['ROW_intf']:
+            tmp_dict[each_intf['ifname']]['proc'] = each_proc['ptag']
+            tmp_dict[each_intf['ifname']]['area'] = each_intf['area']
+            tmp_dict[each_intf['ifname']]['status'] = each_intf['admin_status']
+            tmp_dict[each_intf['ifname']]['nbr_count'] = each_intf['nbr_total']
+    return dict(tmp_dict)
+
+
+# BGP_PREFIX: Adds a prefix to the BGP table if it has a local or summary path, used by the normal and streaming parser
+def bgp_prefix(tmp_table, vrf, each_net):
+    shit_nxos(each_net, 'TABLE_path', 'ROW_path')
+    # Loops through the each path (can be multiple) for each prefix, only adds entry if a local are summary prefix
+    for each_path in each_net['TABLE_path']['ROW_path']:
+        if each_path['type'] == 'local' or each_path['type'] == 'aggregate':
+            # Temp table in the format {prefix: {attribute: value}}
+            tmp_table.add(each_net['ipprefix'], {'vrf': vrf.replace('default', 'global'), 'type': each_path['type'],
+                                                 'status': each_path['status'], 'best': each_path['best']})
+
+
+# BGP_TABLE: Is a 1 deep nested table {prefix: {attribute: value}} with multiple attributes per prefix
+@register('nxos', 'show bgp vrf all ipv4 unicast', table=True)
+def bgp_table(json_output, table=PrefixTable):
+    tmp_table = table(BGP_FIELDS)
+    # Apply NXOS 'dict to list' fix incase only one element
+    shit_nxos(json_output, 'TABLE_vrf', 'ROW_vrf')
+    for each_vrf in json_output['TABLE_vrf']['ROW_vrf']:
+        # Anything after 'ROW_safi' only exists if BGP table is configured and populated
+        try:
+            rd = each_vrf['TABLE_afi']['ROW_afi']['TABLE_safi']['ROW_safi']['TABLE_rd']['ROW_rd']
+            shit_nxos(rd, 'TABLE_prefix', 'ROW_prefix')
+            # Loops each prefix (ipprefix) and paths (ROW_path) for that prefix, paths hold the prefix attributes
+            for each_net in rd['TABLE_prefix']['ROW_prefix']:
+                try:
+                    bgp_prefix(tmp_table, each_vrf['vrf-name-out'], each_net)
+                except:
+                    pass
+        except:
+            pass
+    return tmp_table
+
+
+# STREAM: Same as bgp_table but only builds one prefix at a time rather than the whole table
+@register_stream('nxos', 'show bgp vrf all ipv4 unicast')
+def bgp_table_stream(file_obj, table=PrefixTable):
+    tmp_table = table(BGP_FIELDS)
+    path = 'TABLE_vrf.ROW_vrf.TABLE_afi.ROW_afi.TABLE_safi.ROW_safi.TABLE_rd.ROW_rd.TABLE_prefix.ROW_prefix'
+    for ctx, each_net in iter_rows(file_obj, path, ['vrf-name-out']):
+        try:
+            bgp_prefix(tmp_table, ctx['vrf-name-out'], each_net)
+        except:
+            pass
+    return tmp_table
+
+
+# ROUTE: Adds a route to the route table if it is static or a discard (summary) route, used by the normal and streaming parser
+def route_prefix(tmp_table, vrf, each_rte):
+    # Will have multiple paths if a route has multiple ECMP in the routing table
+    shit_nxos(each_rte, 'TABLE_path', 'ROW_path')
+    for each_path in each_rte['TABLE_path']['ROW_path']:
+        # If is a static route (clientname) adds to temp dict in format {route: {attribute: value}}.
+        if each_path['clientname'] == 'static':
+            tmp_table.add(each_rte['ipprefix'], {'vrf': vrf.replace('default', 'global'), 'ad': each_path['pref'],
+                                                 'next-hop': each_path.get('ipnexthop', each_path.get('ifname'))})
+        # Need 'discard' to catch any aggregate routes that are suppressed, also sets AD to 254 (for some reason is 220).
+        elif each_path.get('type') == 'discard':
+            tmp_table.add(each_rte['ipprefix'], {'vrf': vrf.replace('default', 'global'), 'ad': '254',
+                                                 'next-hop': each_path.get('ipnexthop', each_path.get('ifname'))})
+
+
+# ROUTE_TABLE: Is a 1 deep nested table {route: {attribute: value}} with multiple attributes per-route
+@register('nxos', 'show ip route', key='show ip route vrf all', table=True)
+def route_table(json_output, table=PrefixTable):
+    tmp_table = table(RTE_FIELDS)
+    shit_nxos(json_output, 'TABLE_vrf', 'ROW_vrf')
+    for each_vrf in json_output['TABLE_vrf']['ROW_vrf']:
+        # These dictionaries only exist if there are routes in the routing table (for example if L3 interface in the VRF)
+        try:
+            addrf = each_vrf['TABLE_addrf']['ROW_addrf']
+            shit_nxos(addrf, 'TABLE_prefix', 'ROW_prefix')
+            # Loops each prefix (ipprefix) and attributes (TABLE_path.ROW_path) of that prefix
+            for each_rte in addrf['TABLE_prefix']['ROW_prefix']:
+                try:
+                    route_prefix(tmp_table, each_vrf['vrf-name-out'], each_rte)
+                except:
+                    pass
+        except:
+            pass
+    return tmp_table
+
+
+# STREAM: Same as route_table but only builds one route at a time, a full table is mostly routes that are not kept
+@register_stream('nxos', 'show ip route')
+def route_table_stream(file_obj, table=PrefixTable):
+    tmp_table = table(RTE_FIELDS)
+    path = 'TABLE_vrf.ROW_vrf.TABLE_addrf.ROW_addrf.TABLE_prefix.ROW_prefix'
+    for ctx, each_rte in iter_rows(file_obj, path, ['vrf-name-out']):
+        try:
+            route_prefix(tmp_table, ctx['vrf-name-out'], each_rte)
+        except:
+            pass
+    return tmp_table
@@ -0,0 +1,125 @@
+"""Port-space of a switch, all of its physical interfaces across any number of slots including breakout sub-ports.
+
+Each port is an integer id (slot << 12 | port << 4 | sub-port, sub-port is 0 if not a breakout) so the ids sort in the numeric
+order of the ports (Ethernet1/2, Ethernet1/10, Ethernet1/49/1, Ethernet2/1) and a set of ports is a bitmap (python int) the same
+as IntfAllocator. Working out the unused ports is a bitwise and-not of the used ports, rather than building and diffing lists of
+interface names, and names that aren't a physical port (port-channel, loopback, Vlan) or aren't on the switch are ignored.
+
+num_intf (fbc.num_intf) is either the first and last port on the module of fbc.adv.bse_intf.intf_fmt ('1,64') or a comma
+separated list of slot/port ranges, ports can be broken out into sub-ports ('1/1-48, 1/49/1-4, 1/50-54, 2/1-36').
+
+Used by get_intf (unused interfaces) and input_validate (num_intf format, number of ports and services ranges) so both have
+the same view of what ports a switch has.
+
+-port_id: Integer id of an interface name (None if it isn't a physical port of that interface type)
+-port_name: Interface name of an integer id
+-PortSpace: All the ports of a switch, creates the bitmap of a list of names and the names (or NX-OS ranges) of a bitmap
+"""
+
+import re
+
+PORT_BITS, SUB_BITS = 8, 4
+SUB_MASK = (1 << SUB_BITS) - 1
+INTF_RE = re.compile(r'^(\D+?)(\d+)/(\d+)(?:/(\d+))?$')
+RANGE_RE = re.compile(r'^(\d+)/(\d+)(?:-(\d+))?(?:/(\d+)(?:-(\d+))?)?$')
+
+
+def port_id(slot, port, sub=0):
+    return (slot << (PORT_BITS + SUB_BITS)) | (port << SUB_BITS) | sub
+
+
+def port_name(intf_type, num):
+    slot, port, sub = num >> (PORT_BITS + SUB_BITS), (num >> SUB_BITS) & ((1 << PORT_BITS) - 1), num & SUB_MASK
+    return '{}{}/{}'.format(intf_type, slot, port) + ('/{}'.format(sub) if sub != 0 else '')
+
+
+class PortSpace(object):
+    # INTF_FMT: fbc.adv.bse_intf.intf_fmt (Ethernet1/), the interface type (Ethernet) and slot of the legacy num_intf format are got from it
+    def __init__(self, intf_fmt, num_intf):
+        fmt = re.match(r'^(\D+?)(\d+)/$', intf_fmt)
+        if fmt == None:
+            raise ValueError("intf_fmt '{}' should be the interface type, slot and / (Ethernet1/)".format(intf_fmt))
+        self.intf_type, self.slot = fmt.group(1), int(fmt.group(2))
+        self.ports = 0
+        for first, last in self.parse(str(num_intf)):
+            for num in range(first, last + 1, 1 << SUB_BITS if first & SUB_MASK == 0 else 1):
+                self.ports |= 1 << num
+
+    # PARSE: Returns the (first, last) id of each range, ValueError if the format is wrong
+    def parse(self, num_intf):
+        legacy = re.match(r'^(\d+),(\d+)$', num_intf)
+        if legacy != None:
+            return [self.check_range(self.slot, int(legacy.group(1)), int(legacy.group(2)))]
+        all_ranges = []
+        for each_range in num_intf.split(','):
+            match = RANGE_RE.match(each_range.strip())
+            if match == None:
+                raise ValueError("'{}' should be slot/port, slot/first-last or slot/port/first-last".format(each_range.strip()))
+            slot, first, last, sub_first, sub_last = match.groups()
+            if sub_first != None and last != None:
+                raise ValueError("'{}' can't be a range of ports and sub-ports".format(each_range.strip()))
+            if sub_first != None:
+                all_ranges.append(self.check_range(int(slot), int(first), int(first), int(sub_first), int(sub_last or sub_first)))
+            else:
+                all_ranges.append(self.check_range(int(slot), int(first), int(last or first)))
+        return all_ranges
+
+    def check_range(self, slot, first, last, sub_first=0, sub_last=0):
+        if first > last or sub_first > sub_last or last >= 1 << PORT_BITS or sub_last >= 1 << SUB_BITS or first == 0:
+            raise ValueError('{}/{}-{} is not a valid range of ports'.format(slot, first, last) if sub_first == 0 else
+                             '{}/{}/{}-{} is not a valid range of sub-ports'.format(slot, first, sub_first, sub_last))
+        if sub_first == 0:
+            return port_id(slot, first), port_id(slot, last)
+        return port_id(slot, first, sub_first), port_id(slot, first, sub_last)
+
+    # ID: Only interfaces of the same type (Ethernet) are ports, is None if not in the port-space
+    def port_id(self, intf):
+        match = INTF_RE.match(str(intf))
+        if match == None or match.group(1) != self.intf_type:
+            return None
+        num = port_id(int(match.group(2)), int(match.group(3)), int(match.group(4) or 0))
+        return num if self.ports >> num & 1 else None
+
+    # BITMAP: Bitmap of the interface names that are ports on the switch
+    def bitmap(self, all_intf):
+        ports = 0
+        for intf in all_intf:
+            num = self.port_id(intf)
+            if num != None:
+                ports |= 1 << num
+        return ports
+
+    def ids(self, ports=None):
+        ports = self.ports if ports == None else ports
+        while ports:
+            lowest = ports & -ports                         # Lowest set bit
+            yield lowest.bit_length() - 1
+            ports ^= lowest
+
+    def names(self, ports=None):
+        return [port_name(self.intf_type, num) for num in self.ids(ports)]
+
+    def num_ports(self, ports=None):
+        return bin(self.ports if ports == None else ports).count('1')
+
+    # UNUSED: Ports of the switch not in the list of used interface names
+    def unused(self, used_intf):
+        return self.ports & ~self.bitmap(used_intf)
+
+    # CONTIGUOUS: A port follows the last port (neither broken out), a sub-port the last sub-port of the same port
+    def contiguous(self, last, num):
+        if num & SUB_MASK == 0:
+            return last & SUB_MASK == 0 and last + (1 << SUB_BITS) == num
+        return last + 1 == num
+
+    # RANGES: NX-OS interface ranges of contiguous ports (or sub-ports of a port) in the bitmap (Ethernet1/10-48, Ethernet1/49/1-4)
+    def ranges(self, ports=None):
+        ranges = []
+        for num in self.ids(ports):
+            if len(ranges) != 0 and self.contiguous(ranges[-1][1], num):
+                ranges[-1][1] = num
+            else:
+                ranges.append([num, num])
+        return [port_name(self.intf_type, first) if first == last else
+                '{}-{}'.format(port_name(self.intf_type, first), port_name(self.intf_type, last).split('/')[-1])
+                for first, last in ranges]
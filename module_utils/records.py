@@ -0,0 +1,150 @@
+"""Record types used for the elements of the service data models (svc_tnt_dm, svc_intf_dm and svc_rte_dm).
+
+The DMs used to be nests of plain dicts (each with its own hash table and repeated string keys) with many keys only there
+to hold a default of None. Records store their fields in __slots__ so have no per-object dict, which cuts the memory and
+copy cost when the DMs for every host in the fabric are held in one process.
+
+They still behave like the dicts they replace (mutable mapping), so the filter plugins can keep using get, setdefault,
+pop and del. A field that has not been set is the same as a missing key. Any key that is not a field (extra user settings)
+is held in a small dict that is only created when needed.
+
+Prefix-list and route-map entries are tuples, so are named tuples (PrefixListEntry, RouteMapEntry) that can still be
+indexed (pfx[0]), sorted and put in a set.
+
+Records only live within the filter call that builds a DM, it is returned as plain dicts and tuples (plain). Anything returned
+to Ansible is converted to a string and back (repr and literal_eval) and the run and svc caches are JSON, so records returned
+would be turned into dicts there anyway at the cost of going through their repr.
+
+-plain: Converts the records (and named tuples) of a DM to plain dicts and tuples
+"""
+
+from collections import namedtuple
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+
+class Record(MutableMapping):
+    __slots__ = ('_extra',)
+    _fields = ()
+
+    # FIELDS: All the slots of the class and its parents (other than _extra) are the fields
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = tuple(slot for each_cls in reversed(cls.__mro__) for slot in each_cls.__dict__.get('__slots__', ())
+                            if slot != '_extra')
+        cls._field_set = frozenset(cls._fields)
+
+    def __init__(self, *args, **kwargs):
+        self._extra = None
+        self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self._field_set:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._field_set:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __iter__(self):
+        for field in self._fields:
+            if hasattr(self, field):
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    # PICKLE: Needed to copy (deepcopy) or send the records to other processes as there is no __dict__
+    def __getstate__(self):
+        return dict(self)
+
+    def __setstate__(self, state):
+        self._extra = None
+        self.update(state)
+
+    def copy(self):
+        return type(self)(self)
+
+
+############################################ Service tenant (svc_tnt_dm) ############################################
+class Tenant(Record):
+    __slots__ = ('tnt_name', 'l3_tnt', 'l3vni', 'tnt_vlan', 'tnt_redist', 'rm_name', 'bgp_redist_tag', 'vlans')
+
+
+class Vlan(Record):
+    __slots__ = ('num', 'name', 'vni', 'ip_addr', 'ipv4_bgp_redist', 'create_on_leaf', 'create_on_border', 'vxlan')
+
+
+############################################ Service interface (svc_intf_dm) ############################################
+class ServiceInterface(Record):
+    __slots__ = ('intf_num', 'descr', 'type', 'ip_vlan', 'switch', 'tenant', 'stp', 'dual_homed', 'po_num', 'po_mode',
+                 'po_mbr_descr', 'vpc_num')
+
+
+############################################ Service route (svc_rte_dm) ############################################
+class BgpPeer(Record):
+    __slots__ = ('name', 'descr', 'peer_ip', 'grp', 'remote_as', 'timers', 'bfd', 'ebgp_multihop', 'password',
+                 'update_source', 'default', 'next_hop_self', 'inbound', 'outbound', 'inbound_rm', 'outbound_rm',
+                 'switch', 'tenant')
+
+
+class StaticRoute(Record):
+    __slots__ = ('prefix', 'gateway', 'interface', 'ad', 'next_hop_vrf', 'switch')
+
+
+class PrefixListEntry(namedtuple('PrefixListEntry', 'name seq action prefix')):
+    __slots__ = ()
+
+    def __repr__(self):
+        return repr(tuple(self))
+
+
+# ATTR: Tuple of (bgp_attribute, value) set by the route-map entry, (None, None) if nothing is set
+# SOURCE: Redistribution source (CONN, OSPF_x, BGP_x, STATIC) of a redistribution route-map, None for BGP filtering route-maps
+class RouteMapEntry(namedtuple('RouteMapEntry', 'name seq action match attr source')):
+    __slots__ = ()
+
+    def __new__(cls, name, seq, action, match, attr, source=None):
+        return super(RouteMapEntry, cls).__new__(cls, name, seq, action, match, attr, source)
+
+    def __repr__(self):
+        return repr(tuple(self))
+
+
+# PLAIN: Lists, dicts and tuples are walked as a DM is nests of them, anything else (strings, numbers) is returned as is
+def plain(data):
+    if isinstance(data, (Record, dict)):
+        return {key: plain(value) for key, value in data.items()}
+    elif isinstance(data, tuple):
+        return tuple(plain(elem) for elem in data)
+    elif isinstance(data, list):
+        return [plain(elem) for elem in data]
+    return data
@@ -0,0 +1,322 @@
+"""Native renderer that builds the full config (config.cfg) of every host in one run rather than a template task per role per host.
+
+The playbook renders the base, fabric, tenant, interface, route and default interface templates as separate tasks, each one
+re-reading and compiling the template for every host, and then joins the snippets into config.cfg (assemble). This compiles
+each template once in a shared jinja2 Environment (forked workers inherit the compiled templates), builds the data-models with
+the same filters the roles use (format_dm and get_intf) and renders the hosts in a process pool, each writing its snippets and
+config.cfg directly. The snippets are joined in the same order as assemble so config.cfg is the same as the playbook would create.
+With a state_path only the hosts affected by service_interface or service_route changes have those DMs built and snippets rendered,
+the rest use the copies cached in svc_cache by the last run (the roles and the native renderer share the same cache).
+
+It is run by the render_cfg filter (ans.render in the playbook) or from the command line using the inventory from ansible-inventory:
+ansible-inventory --playbook-dir=$(pwd) -i inv_from_vars_cfg.yml --list > inventory.json
+python -m module_utils.render --inventory inventory.json --workers 4
+
+-Renderer: Compiles the templates once, renders the snippets of a host and joins them into its config.cfg
+-svc_changes: The service_interface and service_route change sets (module_utils/change_set), same as the services role
+-build_hosts: Builds the fabric-wide and per-host data-models and the template variables of each host
+-svc_cache: Caches the service DMs and snippets of the regenerated hosts and moves the change set snapshots on
+-render: Renders and writes config.cfg for all hosts (serially or in a process pool), returns {host: config.cfg}
+"""
+
+import argparse
+import copy
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import importlib.util
+import json
+import os
+import tempfile
+
+import jinja2
+import netaddr
+import yaml
+
+from module_utils.trace import traced
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# SNIPPETS: (snippet file, role, template) in the order the roles are run, config.cfg is joined in filename order (as assemble)
+SNIPPETS = [('base.conf', 'base', 'bse_tmpl.j2'), ('fabric.conf', 'fabric', 'fbc_tmpl.j2'),
+            ('svc_tnt.conf', 'services', 'svc_tnt_tmpl.j2'), ('svc_intf.conf', 'services', 'svc_intf_tmpl.j2'),
+            ('svc_rte.conf', 'services', 'svc_rte_tmpl.j2'), ('dflt_intf.conf', 'intf_cleanup', 'dflt_intf_tmpl.j2')]
+# HOST_VARS: Inventory (inv_from_vars) variables used by the templates and get_intf
+HOST_VARS = ('ansible_host', 'ansible_network_os', 'num_intf', 'intf_lp', 'mlag_peer_ip', 'mlag_kalive_ip', 'intf_fbc',
+             'intf_mlag_peer', 'intf_mlag_kalive')
+VAR_FILES = ['ansible.yml', 'base.yml', 'fabric.yml', 'service_tenant.yml', 'service_interface.yml', 'service_route.yml']
+
+
+# IPADDR: ipaddr and ipmath are Ansible (netcommon) filters, if not importable (run outside of Ansible) the queries the templates use
+try:
+    from ansible_collections.ansible.netcommon.plugins.filter.ipaddr import ipaddr, ipmath
+except ImportError:
+    def ipaddr(value, query=''):
+        try:
+            net = netaddr.IPNetwork(value)
+        except (netaddr.AddrFormatError, TypeError, ValueError):
+            return False
+        if query == '':
+            return value
+        elif query == 'address':
+            # The network address of a subnet isn't an address (same as netcommon)
+            if net.size > 1 and net.ip == net.network:
+                return None
+            return str(net.ip)
+        raise jinja2.TemplateError("ipaddr query '{}' is only supported when run from Ansible".format(query))
+
+    def ipmath(value, amount):
+        try:
+            ip = netaddr.IPNetwork(value).ip if '/' in value else netaddr.IPAddress(value)
+        except (netaddr.AddrFormatError, TypeError, ValueError):
+            raise jinja2.TemplateError('You must pass a valid IP address; {} is invalid'.format(value))
+        if not isinstance(amount, int):
+            raise jinja2.TemplateError('You must pass an integer for arithmetic; {} is not a valid integer'.format(amount))
+        return str(ip + amount)
+
+
+# ROLE_FILTERS: Filters of a roles filter plugin, loaded from its file as Ansible would
+def role_filters(role, plugin):
+    spec = importlib.util.spec_from_file_location(plugin, os.path.join(REPO, 'roles', role, 'filter_plugins', plugin + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.FilterModule().filters()
+
+
+class Renderer(object):
+    # Same settings as the Ansible template module (trim_blocks, trailing newlines kept) and undefined variables fail as in Ansible
+    def __init__(self):
+        template_dirs = sorted(set(os.path.join(REPO, 'roles', role, 'templates') for snippet, role, template in SNIPPETS))
+        self.env = jinja2.Environment(loader=jinja2.FileSystemLoader(template_dirs), trim_blocks=True,
+                                      keep_trailing_newline=True, undefined=jinja2.StrictUndefined)
+        self.env.filters.update({'ipaddr': ipaddr, 'ipmath': ipmath})
+        self.templates = {}
+
+    # COMPILE: Each template is compiled once per OS type, done before the pool is started so the workers inherit them
+    @traced('compile_templates')
+    def compile(self, os_types):
+        for os_type in os_types:
+            for snippet, role, template in SNIPPETS:
+                name = '{}/{}'.format(os_type, template)
+                if name not in self.templates:
+                    self.templates[name] = self.env.get_template(name)
+
+    # SNIPPETS: Services snippets are only created if the service file is used and not on spines (same as the roles)
+    def snippets(self, host_vars):
+        spine = host_vars['bse']['device_name']['spine'] in host_vars['inventory_hostname']
+        for snippet, role, template in SNIPPETS:
+            if role == 'services' and (spine or host_vars.get(snippet.split('.')[0]) == None):
+                continue
+            yield snippet, '{}/{}'.format(host_vars['ansible_network_os'], template)
+
+    def rendered(self, host_vars):
+        rendered = {}
+        for snippet, name in self.snippets(host_vars):
+            # SVC_CACHED: Snippets of hosts not affected by the service input changes are the cached copy
+            if snippet in host_vars.get('svc_cached', {}):
+                rendered[snippet] = host_vars['svc_cached'][snippet]
+                continue
+            if name not in self.templates:
+                self.templates[name] = self.env.get_template(name)
+            rendered[snippet] = self.templates[name].render(host_vars)
+        return rendered
+
+    # CONFIG: Snippets joined as assemble does, in filename order with a newline between any that don't end in one
+    def config(self, host_vars, rendered=None):
+        rendered = rendered or self.rendered(host_vars)
+        config, add_newline = [], False
+        for snippet in sorted(rendered):
+            if add_newline:
+                config.append('\n')
+            config.append(rendered[snippet])
+            add_newline = not rendered[snippet].endswith('\n')
+        return ''.join(config)
+
+    # WRITE: Atomic so a failed render never leaves a partial config.cfg to be deployed. The snippets are also written (same as the
+    # roles) as the offline diff hashes each one to work out whether only the changed snippets can be merged
+    def write(self, directory, host_vars):
+        cfg_dir = os.path.join(os.path.expanduser(directory), host_vars['inventory_hostname'], 'config')
+        os.makedirs(cfg_dir, exist_ok=True)
+        rendered = self.rendered(host_vars)
+        for snippet, config in list(rendered.items()) + [('config.cfg', self.config(host_vars, rendered))]:
+            tmp_fd, tmp_name = tempfile.mkstemp(dir=cfg_dir, suffix='.tmp')
+            with os.fdopen(tmp_fd, 'w') as file_content:
+                file_content.write(config)
+            os.replace(tmp_name, os.path.join(cfg_dir, snippet))
+        return os.path.join(cfg_dir, 'config.cfg')
+
+
+RENDERER = None
+
+
+# RENDER_HOST: Run in the workers, uses the renderer (compiled templates) of the parent if forked otherwise compiles its own
+@traced('render', lambda args: args['host_vars']['inventory_hostname'])
+def render_host(directory, host_vars):
+    global RENDERER
+    if RENDERER == None:
+        RENDERER = Renderer()
+    return host_vars['inventory_hostname'], RENDERER.write(directory, host_vars)
+
+
+# SVC_CHANGES: {name: change set} of the service files used, the same inputs as the roles so both share the svc_cache of state_path
+def svc_changes(hosts, play_vars, state_path):
+    filters = role_filters('services', 'format_dm')
+    fbc, svc_intf, svc_rte = (play_vars.get(each_var) for each_var in ['fbc', 'svc_intf', 'svc_rte'])
+    changes = {}
+    if svc_intf != None:
+        changes['svc_intf'] = filters['svc_changes'](svc_intf['intf'], [svc_intf['adv'], fbc['adv']['bse_intf']], 'svc_intf', hosts,
+                                                     state_path, ['dual_homed'], True)
+    if svc_rte != None:
+        bgp = svc_rte.get('bgp', {})
+        sections = {'group': bgp.get('group', []), 'tnt_advertise': bgp.get('tnt_advertise', []), 'ospf': svc_rte.get('ospf', []),
+                    'static_route': svc_rte.get('static_route', [])}
+        changes['svc_rte'] = filters['svc_changes'](sections, [svc_rte['adv'], fbc], 'svc_rte', hosts, state_path)
+    return changes
+
+
+# BUILD_HOSTS: Template variables of each host, the play variables (bse, fbc, svc_*), its host_vars and the DMs (flt_*) the roles create
+# ALL_VARS: {host: host_vars} of all hosts, GROUPS: {group: [hosts]}, used by the fabric template for the BGP neighbors
+# CHANGES: Change sets (svc_changes), hosts not regenerated use the cached DM and snippet (svc_cached)
+@traced('build_hosts')
+def build_hosts(hosts, all_vars, groups, play_vars, dir_path=None, state_path=None, read_only=False, changes=None):
+    fbc = play_vars['fbc']
+    svc_tnt, svc_intf, svc_rte = (play_vars.get(each_svc) for each_svc in ['svc_tnt', 'svc_intf', 'svc_rte'])
+    filters = dict(role_filters('services', 'format_dm'), **role_filters('intf_cleanup', 'get_intf'))
+    hostvars = {host: {key: host_vars[key] for key in HOST_VARS if key in host_vars} for host, host_vars in all_vars.items()}
+    changes = changes or {}
+
+    # DM: The filters change their input (defaults are added) so each gets its own copy, as each Ansible task templates its own
+    def dm(name, *args):
+        return filters[name](*copy.deepcopy(args))
+
+    # CACHED: The DM and (not on spines) the snippet the last run cached for the host, None if the host is to be regenerated
+    def cached(name, host_vars):
+        chg = changes.get(name)
+        if chg == None or host_vars['inventory_hostname'] in chg['regen']:
+            return None
+        host_dir = os.path.join(chg['cache'], host_vars['inventory_hostname'])
+        with open(os.path.join(host_dir, name + '.json'), 'r') as file_content:
+            svc_dm = json.load(file_content)
+        if play_vars['bse']['device_name']['spine'] not in host_vars['inventory_hostname']:
+            with open(os.path.join(host_dir, name + '.conf'), 'r') as file_content:
+                host_vars['svc_cached'][name + '.conf'] = file_content.read()
+        return svc_dm
+
+    # SVC_TNT: Is not per-device so only built once
+    flt_svc_tnt = None
+    if svc_tnt != None:
+        rm_name = (svc_rte or {}).get('adv', {}).get('redist', {}).get('rm_name', svc_tnt['adv']['redist']['rm_name'])
+        flt_svc_tnt = dm('create_svc_tnt_dm', svc_tnt['tnt'], svc_tnt['adv'], fbc['adv']['mlag']['peer_vlan'], rm_name)
+
+    all_host_vars = []
+    for host in hosts:
+        host_vars = dict(play_vars, **hostvars[host])
+        host_vars.update({'inventory_hostname': host, 'hostvars': hostvars, 'groups': groups, 'flt_svc_tnt': flt_svc_tnt,
+                          'flt_svc_intf': [], 'flt_svc_rte': None, 'svc_cached': {}})
+        if svc_intf != None:
+            host_vars['flt_svc_intf'] = cached('svc_intf', host_vars)
+            if host_vars['flt_svc_intf'] == None:
+                host_vars['flt_svc_intf'] = dm('create_svc_intf_dm', svc_intf['intf'], host, svc_intf['adv'], fbc['adv']['bse_intf'],
+                                               state_path, dir_path, read_only)
+        if svc_rte != None:
+            host_vars['flt_svc_rte'] = cached('svc_rte', host_vars)
+            if host_vars['flt_svc_rte'] == None:
+                bgp = svc_rte.get('bgp', {})
+                host_vars['flt_svc_rte'] = dm('create_svc_rte_dm', host, bgp.get('group', ''), bgp.get('tnt_advertise', ''),
+                                              svc_rte.get('ospf', ''), svc_rte.get('static_route', ''), svc_rte['adv'], fbc)
+        host_vars['flt_dflt_intf'] = dm('get_intf', dict(hostvars[host], inventory_hostname=host), fbc['adv']['bse_intf'],
+                                        host_vars['flt_svc_intf'] if svc_intf != None else None, fbc['adv'].get('dflt_intf_range', False))
+        all_host_vars.append(host_vars)
+    return all_host_vars
+
+
+# SVC_CACHE: Same as the services role, the regenerated hosts DM and snippet are cached and then the snapshot is moved on (not in check mode)
+def svc_cache(directory, all_host_vars, changes, hosts, read_only=False):
+    filters = role_filters('services', 'format_dm')
+    for name, chg in changes.items():
+        for host_vars in all_host_vars:
+            host = host_vars['inventory_hostname']
+            if host not in chg['regen']:
+                continue
+            files = {name + '.json': json.dumps(host_vars['flt_' + name])}
+            if host_vars['bse']['device_name']['spine'] not in host:
+                with open(os.path.join(os.path.expanduser(directory), host, 'config', name + '.conf'), 'r') as file_content:
+                    files[name + '.conf'] = file_content.read()
+            for filename, content in files.items():
+                tmp_fd, tmp_name = tempfile.mkstemp(dir=os.path.join(chg['cache'], host), suffix='.tmp')
+                with os.fdopen(tmp_fd, 'w') as file_content:
+                    file_content.write(content)
+                os.replace(tmp_name, os.path.join(chg['cache'], host, filename))
+        if not read_only:
+            filters['svc_changes_commit'](chg, hosts)
+
+
+def render_serial(directory, all_host_vars):
+    return [render_host(directory, host_vars) for host_vars in all_host_vars]
+
+
+def render_pool(directory, all_host_vars, workers):
+    with ProcessPoolExecutor(max_workers=min(workers, len(all_host_vars))) as pool:
+        futures = [pool.submit(render_host, directory, host_vars) for host_vars in all_host_vars]
+        return [each_future.result() for each_future in futures]
+
+
+# RENDER: Returns {host: config.cfg} in the same order as hosts. The data-models are built in this process as they use the state_path,
+# READ_ONLY (check mode) reads the interface ledger without saving it
+def render(hosts, all_vars, groups, play_vars, dir_path, state_path=None, workers=1, read_only=False):
+    global RENDERER
+    changes = svc_changes(hosts, play_vars, state_path) if state_path != None else {}
+    all_host_vars = build_hosts(hosts, all_vars, groups, play_vars, dir_path, state_path, read_only, changes)
+    RENDERER = Renderer()
+    RENDERER.compile(set(host_vars['ansible_network_os'] for host_vars in all_host_vars))
+    results = None
+    if workers > 1 and len(all_host_vars) > 1:
+        try:
+            results = render_pool(dir_path, all_host_vars, workers)
+        except (BrokenProcessPool, OSError):
+            results = None
+    if results == None:
+        results = render_serial(dir_path, all_host_vars)
+    svc_cache(dir_path, all_host_vars, changes, hosts, read_only)
+    return dict(results)
+
+
+# INVENTORY: {host: host_vars} and {group: [hosts]} (including those of child groups) from the output of ansible-inventory --list
+def load_inventory(filename):
+    with open(filename, 'r') as file_content:
+        inventory = json.load(file_content)
+    all_vars = inventory.get('_meta', {}).get('hostvars', {})
+
+    def group_hosts(group):
+        hosts = list(inventory.get(group, {}).get('hosts', []))
+        for child in inventory.get(group, {}).get('children', []):
+            hosts.extend(each_host for each_host in group_hosts(child) if each_host not in hosts)
+        return hosts
+    groups = {group: group_hosts(group) for group in inventory if group != '_meta'}
+    groups.setdefault('all', list(all_vars))
+    return all_vars, groups
+
+
+def load_vars(directory):
+    play_vars = {}
+    for file_name in VAR_FILES:
+        filename = os.path.join(directory, file_name)
+        if os.path.exists(filename):
+            with open(filename, 'r') as file_content:
+                play_vars.update(yaml.load(file_content, Loader=yaml.FullLoader) or {})
+    return play_vars
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Renders config.cfg of all hosts with the role templates')
+    parser.add_argument('--inventory', required=True, help='Output of ansible-inventory --list (JSON)')
+    parser.add_argument('--vars', default=os.path.join(REPO, 'vars'), help='Folder of the variable files')
+    parser.add_argument('--limit', nargs='+', help='Hosts to render (default all)')
+    parser.add_argument('--dir_path', help='Folder config.cfg is written to (default ans.dir_path)')
+    parser.add_argument('--workers', type=int, default=1, help='Processes used to render the hosts')
+    args = parser.parse_args()
+
+    all_vars, groups = load_inventory(args.inventory)
+    play_vars = load_vars(args.vars)
+    dir_path = args.dir_path or play_vars['ans']['dir_path']
+    configs = render(args.limit or groups['all'], all_vars, groups, play_vars, dir_path, play_vars['ans'].get('state_path'), args.workers)
+    for host, filename in configs.items():
+        print('{}: {}'.format(host, filename))
@@ -0,0 +1,41 @@
+"""Accumulates the compliance report of a host in memory so it is written once at the end of validation.
+
+The napalm_validate report and the custom_validate per-command results are added to the one report which is written to
+reports/<host>_compliance_report.json when all validation is complete. The file is written to a temp file and renamed so an
+interrupted run never leaves a truncated report, compact removes the whitespace from the JSON encoding (smaller reports).
+
+-add: Adds a report or per-command results, 'complies' is only true if everything added complies and 'skipped' is all skipped
+-write: Writes the report to file (atomically), returns whether it complies
+"""
+
+import json
+import os
+import tempfile
+
+
+class ComplianceReport(object):
+    def __init__(self):
+        self.report = {'complies': True, 'skipped': []}
+
+    # ADD: Either a napalm_validate compliance_report (has complies and skipped) or custom_validate results {cmd: result}
+    def add(self, report):
+        for name, result in (report or {}).items():
+            if name == 'complies':
+                self.report['complies'] = self.report['complies'] and result
+            elif name == 'skipped':
+                self.report['skipped'].extend([each_skip for each_skip in result if each_skip not in self.report['skipped']])
+            else:
+                self.report[name] = result
+                self.report['complies'] = self.report['complies'] and result.get('complies', True)
+                if result.get('skipped', False) and name not in self.report['skipped']:
+                    self.report['skipped'].append(name)
+        return self
+
+    def write(self, filename, compact=False):
+        directory = os.path.dirname(filename)
+        os.makedirs(directory, exist_ok=True)
+        tmp_fd, tmp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(tmp_fd, 'w') as file_content:
+            json.dump(self.report, file_content, separators=(',', ':') if compact else None)
+        os.replace(tmp_name, filename)
+        return self.report['complies']
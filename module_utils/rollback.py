@@ -0,0 +1,102 @@
+"""Keeps a copy of the running config each host had before it was deployed so a rollback doesn't need anything from the device.
+
+Just before a host's config is replaced (or merged) its running config is got from the device and saved (in the rollback folder of
+ans.state_path) along with its hash. Hosts that weren't changed by the last deploy are marked as unchanged (no copy), so a rollback
+only touches the hosts that deploy affected. The rollback replaces the config of all those hosts at the same time (up to concurrency)
+with the saved copy, any host whose running config already has the same hash as the copy (never committed or already rolled back) is
+skipped. Hosts with neither a copy nor the unchanged mark (deployed before the copies were kept) are rolled back on the device to the
+checkpoint napalm took before its last commit (rollback_config.txt), if the device doesn't have it the rollback of that host fails.
+
+The hash ignores the comment (!) lines as NX-OS adds the time (!Time) to the running config each time it is shown.
+
+-config_hash: Hash of a config ignoring the comment lines and whitespace
+-RollbackConfig: Saves and loads the rollback config of a host or marks it as unchanged by the last deploy
+-capture: Returns the capture function for the deployer that saves the running config of each host before it is deployed
+-roll_back: Replaces the config of the hosts with their rollback config (skipping those already at it or unchanged), returns {host: status}
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+from module_utils.deploy import Deployer
+from module_utils.deployed import digest, normalise
+
+
+def config_hash(config):
+    return digest(normalise('\n'.join(line for line in config.splitlines() if not line.startswith('!'))))
+
+
+class RollbackConfig(object):
+    def __init__(self, directory, hostname):
+        self.host_dir = os.path.join(os.path.expanduser(directory), 'rollback', hostname)
+        self.filename = os.path.join(self.host_dir, 'config.cfg')
+        self.hash_file = os.path.join(self.host_dir, 'config.json')
+
+    # LOAD: Returns the hash of the saved config, 'unchanged' if the host wasn't changed by the last deploy or None if there is neither
+    # (never captured or the save was interrupted)
+    def load(self):
+        if not os.path.exists(self.hash_file):
+            return None
+        try:
+            with open(self.hash_file, 'r') as file_content:
+                saved = json.load(file_content)
+        except ValueError:
+            return None
+        if saved.get('unchanged', False):
+            return 'unchanged'
+        return saved.get('hash') if os.path.exists(self.filename) else None
+
+    def write(self, filename, content):
+        tmp_fd, tmp_name = tempfile.mkstemp(dir=self.host_dir, suffix='.tmp')
+        with os.fdopen(tmp_fd, 'w') as file_content:
+            file_content.write(content)
+        os.replace(tmp_name, filename)
+
+    # SAVE: Same as the deployed config the hash is removed first and written last so an interrupted save is never used
+    def save(self, config):
+        if os.path.exists(self.hash_file):
+            os.remove(self.hash_file)
+        os.makedirs(self.host_dir, exist_ok=True)
+        self.write(self.filename, config)
+        self.write(self.hash_file, json.dumps({'hash': config_hash(config)}))
+
+    # UNCHANGED: The last deploy didn't change the host so there is nothing to roll back
+    def unchanged(self):
+        shutil.rmtree(self.host_dir, ignore_errors=True)
+        os.makedirs(self.host_dir, exist_ok=True)
+        self.write(self.hash_file, json.dumps({'unchanged': True}))
+
+
+# CAPTURE: napalm get_config, the running config is got in the same connection (and timeout) as the deploy
+def capture(state_path):
+    def capture_host(host, device):
+        RollbackConfig(state_path, host).save(device.get_config(retrieve='running')['running'])
+    return capture_host
+
+
+# ROLL_BACK: Hosts marked unchanged are left alone, hosts without a saved copy fall back to the checkpoint on the device (napalm rollback)
+def roll_back(driver_factory, hosts, state_path, diff_dir=None, timeout=360, concurrency=10, dry_run=False):
+    hashes = {host: RollbackConfig(state_path, host).load() for host in hosts}
+    configs = {host: RollbackConfig(state_path, host).filename for host, rb_hash in hashes.items() if rb_hash not in [None, 'unchanged']}
+    checkpoint = sorted(host for host, rb_hash in hashes.items() if rb_hash == None)
+
+    # SKIP: Running config is already the rollback config, saves the minutes a replace takes even with no changes
+    def skip(host, device):
+        if config_hash(device.get_config(retrieve='running')['running']) == hashes[host]:
+            return 'no changes'
+        return None
+    deployer = Deployer(driver_factory, configs, diff_dir, timeout, dry_run=dry_run, skip=skip, diff_file='{}_rollback.txt')
+    result = {host: 'unchanged by the last deploy' for host, rb_hash in hashes.items() if rb_hash == 'unchanged'}
+    if len(configs) != 0:
+        statuses = deployer.run_wave({'name': 'rollback', 'concurrency': concurrency, 'hosts': sorted(configs)}, deployer.deploy_host)
+        result.update({host: 'rolled back' if status == 'deployed' else status for host, status in statuses.items()})
+    # CHECKPOINT: Can't be diffed so in check mode is only reported
+    if len(checkpoint) != 0 and dry_run:
+        result.update({host: 'would roll back to the device checkpoint' for host in checkpoint})
+    elif len(checkpoint) != 0:
+        statuses = deployer.run_wave({'name': 'rollback (device checkpoint)', 'concurrency': concurrency, 'hosts': checkpoint},
+                                     deployer.rollback_host)
+        result.update({host: 'rolled back to the device checkpoint' if status == 'rolled back' else status for host, status in statuses.items()})
+    return result
@@ -0,0 +1,40 @@
+"""Per-run cache of a hosts data-model so that it is only built once no matter how many roles use it.
+
+The service_interface DM is used by the base (bse_tmpl.j2), services (svc_intf_tmpl.j2) and intf_cleanup (get_intf) roles,
+each role runs in a separate Ansible worker so the DM can't be kept in memory between them. It is saved in the hosts folder of
+ans.dir_path (deleted at the start of every build so only lives for the run) along with a hash of the inputs it was built from,
+it is only used if the inputs are the same (any change to the input or a different playbook using other inputs rebuilds it).
+
+-load: Returns the cached DM if it was built from the same inputs, otherwise None
+-save: Saves the DM (atomically) with the hash of its inputs and returns it
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+
+class RunCache(object):
+    def __init__(self, directory, hostname, name, inputs):
+        self.host_dir = os.path.join(os.path.expanduser(directory), hostname)
+        self.filename = os.path.join(self.host_dir, name + '_dm.json')
+        self.digest = hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+    def load(self):
+        if not os.path.exists(self.filename):
+            return None
+        try:
+            with open(self.filename, 'r') as file_content:
+                cached = json.load(file_content)
+        except ValueError:
+            return None
+        return cached['dm'] if cached.get('hash') == self.digest else None
+
+    def save(self, dm):
+        os.makedirs(self.host_dir, exist_ok=True)
+        tmp_fd, tmp_name = tempfile.mkstemp(dir=self.host_dir, suffix='.tmp')
+        with os.fdopen(tmp_fd, 'w') as file_content:
+            json.dump({'hash': self.digest, 'dm': dm}, file_content)
+        os.replace(tmp_name, self.filename)
+        return dm
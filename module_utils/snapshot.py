@@ -0,0 +1,70 @@
+"""Keeps a snapshot of the last actual state and report of each custom_validate command so the next run only compares what changed.
+
+On a stable fabric most of a routing or BGP table is the same each run. The snapshot (compact JSON in the validate folder of
+ans.state_path, one file per host per command) holds the desired state, actual state of the desired entries and report of the
+last run. Each top-level entry (route, prefix, interface, etc) whose desired and actual state are both unchanged reuses its last
+result, only changed, added or removed entries are compared. Missing and '_mode: strict' extra entries are worked out again from the keys so the report
+is the same as a full comparison. If the command isn't a dict of entries (list or value) or there is no snapshot it is fully compared.
+
+The result of an entry only depends on its desired and actual state so the snapshot is replaced every run (whether it complied or not).
+
+-compare: Compares the desired and actual state reusing the last result of unchanged entries, saves the new snapshot
+"""
+
+import json
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import os
+import tempfile
+
+from module_utils.collector import cmd_filename
+from module_utils.compare import compare_dict
+
+
+class Snapshot(object):
+    def __init__(self, directory, hostname, cmd):
+        self.host_dir = os.path.join(os.path.expanduser(directory), 'validate', hostname)
+        self.filename = os.path.join(self.host_dir, cmd_filename(cmd))
+
+    def load(self):
+        if not os.path.exists(self.filename):
+            return None
+        try:
+            with open(self.filename, 'r') as file_content:
+                return json.load(file_content)
+        except ValueError:
+            return None
+
+    def save(self, desired, actual, report):
+        # COMPACT: Only the actual state of the desired entries is needed to tell if they have changed (extras are got from the keys)
+        if isinstance(desired, dict) and isinstance(actual, Mapping):
+            actual = {key: actual[key] for key in desired if key in actual}
+        os.makedirs(self.host_dir, exist_ok=True)
+        tmp_fd, tmp_name = tempfile.mkstemp(dir=self.host_dir, suffix='.tmp')
+        with os.fdopen(tmp_fd, 'w') as file_content:
+            json.dump({'desired': desired, 'actual': actual, 'report': report}, file_content, separators=(',', ':'), default=str)
+        os.replace(tmp_name, self.filename)
+
+    # PREVIOUS: Last result of each entry where the desired and actual state are the same as the last run
+    def previous(self, old, desired, actual):
+        old_desired, old_actual = old['desired'], old['actual']
+        old_present = old['report'].get('present', {}) if isinstance(old['report'], dict) else {}
+        return {key: old_present[key] for key in desired
+                if key in old_present and key in actual and key in old_desired and key in old_actual
+                and desired[key] == old_desired[key] and actual[key] == old_actual[key]}
+
+    # COMPARE: CMP is the full compare (napalm or native), also used for each changed entry
+    def compare(self, cmp, desired, actual):
+        # Desired state is saved as is (napalm removes '_mode' from it when comparing)
+        saved_desired = json.loads(json.dumps(desired, default=str))
+        old = self.load()
+        if old == None or not isinstance(desired, dict) or 'list' in desired or not isinstance(actual, Mapping) or \
+           not isinstance(old.get('desired'), dict) or not isinstance(old.get('actual'), dict):
+            report = cmp(desired, actual)
+        else:
+            strict = 'strict' in desired.get('_mode', '').split()
+            report = compare_dict(desired, actual, strict, self.previous(old, saved_desired, actual), cmp)
+        self.save(saved_desired, actual, report)
+        return report
@@ -0,0 +1,249 @@
+"""Records how long each phase of the pipeline takes per host (spans) so the time is spent optimising the phases that are actually slow.
+
+A span is the phase (inventory, input_fbc_validate, create_svc_intf_dm, render, get_intf, deploy, custom_validate, etc), the host it was
+for (None if not per-host), when it started, its duration and the peak memory (max RSS) of the process at the end of it, along with how
+much the span raised that peak. Plugins use the traced decorator (or span as a context manager for part of a method), both do nothing
+unless tracing is enabled.
+
+Tracing is enabled by ans.trace and the spans are written to the trace folder of ans.dir_path. The inventory plugin (inv_from_vars) is
+the first thing the run does and is in the ansible-playbook process, so it passes the settings of the run (vars/ansible.yml with any
+-e extra vars) to configure which exports them (BUILD_FABRIC_TRACE_SETTINGS) for every Ansible worker and pool process it forks.
+The BUILD_FABRIC_TRACE environment variable is a folder to trace to instead (command line tools such as render and pipeline_bench).
+Every process of a run appends to the same file, named after the run (BUILD_FABRIC_RUN, the PID of ansible-playbook or the command
+line tool exported when this is first imported), a JSON object per line (format ndjson) or a Chrome trace (format chrome, open in
+chrome://tracing or Perfetto). Only the newest keep runs are kept.
+
+Run on its own it prints the slowest phases and hosts of the newest run in the folder (or of a file), --chrome converts it to a Chrome trace.
+
+python -m module_utils.trace ~/device_configs/trace --top 10 --chrome ~/trace.json
+
+-configure: Sets and exports the settings of the run from ans.trace and ans.dir_path
+-span: Context manager that records a span of the phase and host
+-traced: Decorator that records a span for each call, the host is got from an argument
+-load: Reads the spans of a trace file (either format)
+-summary: The slowest phases and hosts of a list of spans
+"""
+
+import argparse
+import contextlib
+import functools
+import inspect
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# RUN: Imported first by the process that starts the run (ansible-playbook or the command line tool), its workers inherit the id
+RUN = os.environ.setdefault('BUILD_FABRIC_RUN', str(os.getpid()))
+# SETTINGS: Loaded once per process from the environment (forked workers inherit it), {} is tracing disabled
+SETTINGS = None
+CREATED = set()
+LOCK = threading.Lock()
+
+
+# CONFIGURE: Called once per run before any workers are started, the exported settings are what every later process reads
+def configure(trace, dir_path):
+    global SETTINGS
+    SETTINGS = {}
+    if trace not in [None, False] and dir_path != None:
+        SETTINGS = dict(trace if isinstance(trace, dict) else {}, directory=os.path.join(os.path.expanduser(dir_path), 'trace'))
+    os.environ['BUILD_FABRIC_TRACE_SETTINGS'] = json.dumps(SETTINGS)
+    return SETTINGS
+
+
+def settings():
+    global SETTINGS
+    if SETTINGS == None:
+        SETTINGS = {}
+        if os.environ.get('BUILD_FABRIC_TRACE'):
+            SETTINGS = {'directory': os.path.expanduser(os.environ['BUILD_FABRIC_TRACE'])}
+        elif os.environ.get('BUILD_FABRIC_TRACE_SETTINGS'):
+            try:
+                SETTINGS = json.loads(os.environ['BUILD_FABRIC_TRACE_SETTINGS'])
+            except ValueError:
+                pass
+    return SETTINGS
+
+
+# MAX_RSS: Peak memory of the process (KiB), is bytes on macOS
+def max_rss():
+    if resource == None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+# TRACE_FILE: One file per run (RUN), created with its header by a link so no process ever appends to a half created file
+def trace_file():
+    chrome = settings().get('format', 'ndjson') == 'chrome'
+    directory = settings()['directory']
+    filename = os.path.join(directory, '{}.{}'.format(RUN, 'json' if chrome else 'ndjson'))
+    with LOCK:
+        if filename not in CREATED:
+            os.makedirs(directory, exist_ok=True)
+            tmp_fd, tmp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(tmp_fd, 'w') as file_content:
+                file_content.write('[\n' if chrome else '')
+            try:
+                os.link(tmp_name, filename)
+                prune(directory, settings().get('keep', 5))
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp_name)
+            CREATED.add(filename)
+    return filename, chrome
+
+
+# PRUNE: Only the newest keep runs are kept, is done by the process that created the file of a new run
+def prune(directory, keep):
+    runs = sorted((each_file for each_file in os.listdir(directory) if each_file.endswith(('.ndjson', '.json'))),
+                  key=lambda each_file: os.path.getmtime(os.path.join(directory, each_file)), reverse=True)
+    for each_file in runs[keep:]:
+        try:
+            os.remove(os.path.join(directory, each_file))
+        except FileNotFoundError:
+            pass
+
+
+# WRITE: A single append of a whole line, so lines from different processes and threads are never mixed
+def write(event):
+    filename, chrome = trace_file()
+    if chrome:
+        line = json.dumps({'name': event['phase'], 'ph': 'X', 'ts': int(event['start'] * 1000000), 'dur': int(event['dur'] * 1000000),
+                           'pid': event['pid'], 'tid': event['tid'], 'args': event}) + ',\n'
+    else:
+        line = json.dumps(event) + '\n'
+    file_fd = os.open(filename, os.O_WRONLY | os.O_APPEND)
+    try:
+        os.write(file_fd, line.encode())
+    finally:
+        os.close(file_fd)
+
+
+# SPAN: ATTRS are added to the span (wave, mode, etc), a span that raises an error has its type as the status
+@contextlib.contextmanager
+def span(phase, host=None, **attrs):
+    if len(settings()) == 0:
+        yield
+        return
+    start, perf_start, rss_start = time.time(), time.perf_counter(), max_rss()
+    status = 'ok'
+    try:
+        yield
+    except BaseException as err:
+        status = 'error, {}'.format(type(err).__name__)
+        raise
+    finally:
+        rss = max_rss()
+        event = {'run': RUN, 'phase': phase, 'host': host, 'start': round(start, 6),
+                 'dur': round(time.perf_counter() - perf_start, 6), 'pid': os.getpid(), 'tid': threading.get_ident(),
+                 'max_rss_kb': rss, 'rss_growth_kb': rss - rss_start if rss != None else None, 'status': status}
+        event.update(attrs)
+        try:
+            write(event)
+        except OSError:
+            pass                                    # Tracing never fails the build
+
+
+# TRACED: HOST is the name of the argument that is the hostname or a function that gets it from the arguments ({name: value})
+def traced(phase, host=None):
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if len(settings()) == 0:
+                return func(*args, **kwargs)
+            hostname = None
+            if host != None:
+                arguments = signature.bind_partial(*args, **kwargs).arguments
+                hostname = host(arguments) if callable(host) else arguments.get(host)
+            with span(phase, hostname):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# LOAD: Chrome traces are the same spans (args) one per line, the header and any line that isn't complete are skipped
+def load(filename):
+    spans = []
+    with open(os.path.expanduser(filename), 'r') as file_content:
+        for line in file_content:
+            line = line.strip().rstrip(',')
+            if line in ['', '[', ']']:
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            spans.append(event['args'] if 'ph' in event else event)
+    return spans
+
+
+def newest(directory):
+    runs = [os.path.join(directory, each_file) for each_file in os.listdir(directory) if each_file.endswith(('.ndjson', '.json'))]
+    if len(runs) == 0:
+        raise FileNotFoundError('No traces in {}'.format(directory))
+    return max(runs, key=os.path.getmtime)
+
+
+# SUMMARY: Phases are sorted by their total time, hosts by the total of their per-host spans (nested spans are counted in each)
+def summary(spans, top=10):
+    phases, hosts = {}, {}
+    for each_span in spans:
+        phase = phases.setdefault(each_span['phase'], {'spans': 0, 'total': 0, 'max': 0, 'max_rss_kb': 0, 'errors': 0})
+        phase['spans'] += 1
+        phase['total'] += each_span['dur']
+        phase['max'] = max(phase['max'], each_span['dur'])
+        phase['max_rss_kb'] = max(phase['max_rss_kb'], each_span.get('max_rss_kb') or 0)
+        phase['errors'] += each_span.get('status', 'ok') != 'ok'
+        if each_span.get('host') != None:
+            host = hosts.setdefault(each_span['host'], {'total': 0, 'phases': {}})
+            host['total'] += each_span['dur']
+            host['phases'][each_span['phase']] = host['phases'].get(each_span['phase'], 0) + each_span['dur']
+    lines = ['{:<28}{:>7}{:>11}{:>10}{:>10}{:>12}{:>8}'.format('PHASE', 'SPANS', 'TOTAL(s)', 'MEAN(s)', 'MAX(s)', 'PEAK(MiB)', 'ERRORS')]
+    for name, phase in sorted(phases.items(), key=lambda each_phase: each_phase[1]['total'], reverse=True)[:top]:
+        lines.append('{:<28}{:>7}{:>11.3f}{:>10.3f}{:>10.3f}{:>12.1f}{:>8}'.format(
+            name, phase['spans'], phase['total'], phase['total'] / phase['spans'], phase['max'], phase['max_rss_kb'] / 1024, phase['errors']))
+    if len(hosts) != 0:
+        lines.extend(['', '{:<28}{:>11}  {}'.format('HOST', 'TOTAL(s)', 'SLOWEST PHASE')])
+        for name, host in sorted(hosts.items(), key=lambda each_host: each_host[1]['total'], reverse=True)[:top]:
+            slowest = max(host['phases'].items(), key=lambda each_phase: each_phase[1])
+            lines.append('{:<28}{:>11.3f}  {} ({:.3f}s)'.format(name, host['total'], slowest[0], slowest[1]))
+    return '\n'.join(lines)
+
+
+# CHROME: Times are from the start of the run so the trace opens at the first span
+def chrome(spans, filename):
+    first = min([each_span['start'] for each_span in spans] or [0])
+    events = [{'name': each_span['phase'] if each_span.get('host') == None else '{} {}'.format(each_span['phase'], each_span['host']),
+               'cat': each_span['phase'], 'ph': 'X', 'ts': int((each_span['start'] - first) * 1000000),
+               'dur': int(each_span['dur'] * 1000000), 'pid': each_span['pid'], 'tid': each_span['tid'], 'args': each_span}
+              for each_span in spans]
+    with open(os.path.expanduser(filename), 'w') as file_content:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file_content)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prints the slowest phases and hosts of a pipeline trace')
+    parser.add_argument('trace', help='Trace file or a folder of them (the newest run is used), such as ~/device_configs/trace')
+    parser.add_argument('--top', type=int, default=10, help='Number of phases and hosts printed')
+    parser.add_argument('--chrome', help='Also write the run as a Chrome trace to this file')
+    args = parser.parse_args()
+
+    filename = os.path.expanduser(args.trace)
+    if os.path.isdir(filename):
+        filename = newest(filename)
+    spans = load(filename)
+    print('{}: {} spans\n'.format(filename, len(spans)))
+    print(summary(spans, args.top))
+    if args.chrome != None:
+        chrome(spans, args.chrome)
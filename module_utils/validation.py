@@ -0,0 +1,85 @@
+"""Parses the output of each command into the actual_state and compares it against the desired_state (napalm validate.compare).
+
+The commands are independent of each other so the parse and compare of each can be run in its own process. A large routing
+or BGP table can make a single host CPU bound for tens of seconds, with a process pool the other commands (and tables) are done
+at the same time. Starting the pool costs more than it saves for small outputs so it is only used if there is more than one
+command and the total output is at least min_size (bytes), otherwise (or if workers is 1) it is run serially as before.
+
+The comparison is done by napalm validate.compare or for any commands in native by the native engine (module_utils/compare)
+that gives the same report but is much faster for tables with tens of thousands of entries. If snapshot (state_path, hostname)
+is set only the entries that changed since the last run are compared (module_utils/snapshot).
+
+-validate_cmd: Parses the output of one command and compares it against the desired_state of that command
+-cmd_desired: The desired_state of only that command, what is sent to a pool worker
+-validate: Runs validate_cmd for all commands (serially or in a process pool), returns the per-cmd report
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from napalm.base import validate as napalm_validate
+
+from module_utils.compare import compare as native_compare
+from module_utils.parsers import get_parser, parse_cmd
+from module_utils.snapshot import Snapshot
+
+
+# VALIDATE_CMD: Returns (key, report), report is None if there is no desired_state for the cmd. None if no parser
+# Only the report is returned as pickling the actual_state of a large table back from a worker can take longer than parsing it
+def validate_cmd(os_type, cmd, output, desired_state, native=(), snapshot=None):
+    # COLUMNAR: The native compare reads the route and BGP tables as a PrefixTable, napalm needs nested dicts so they are parsed straight to dicts
+    parser = get_parser(os_type, cmd)
+    result = parse_cmd(os_type, cmd, output, columnar=parser != None and parser[0] in native)
+    if result == None:
+        return None
+    key, actual_state = result
+    desired_results = desired_state.get(key)
+    # Safe guard in case any empty desired_results, stops script failing
+    if desired_results == None:
+        return key, None
+    try:
+        cmp = native_compare if key in native else napalm_validate.compare
+        if snapshot != None:
+            report = Snapshot(snapshot[0], snapshot[1], key).compare(cmp, desired_results, actual_state)
+        else:
+            report = cmp(desired_results, actual_state)
+    # If validation couldn't be run on a command adds skipped key to the cmd dictionary
+    except NotImplementedError:
+        report = {"skipped": True, "reason": "NotImplemented"}
+    return key, report
+
+
+# SERIAL: Same process, used for small outputs and if the pool can't be started
+def validate_serial(os_type, cmd_output, desired_state, native, snapshot):
+    return [validate_cmd(os_type, cmd, output, desired_state, native, snapshot) for cmd, output in cmd_output.items()]
+
+
+# CMD_DESIRED: Only the desired_state of the cmd (key as parse_cmd returns it) is pickled to the worker rather than that of every cmd
+def cmd_desired(os_type, cmd, output, desired_state):
+    parser = get_parser(os_type, cmd)
+    key = cmd.replace(' | json', '') if output == None or parser == None else parser[0]
+    return {key: desired_state[key]} if key in desired_state else {}
+
+
+def validate_pool(os_type, cmd_output, desired_state, workers, native, snapshot):
+    with ProcessPoolExecutor(max_workers=min(workers, len(cmd_output))) as pool:
+        futures = [pool.submit(validate_cmd, os_type, cmd, output, cmd_desired(os_type, cmd, output, desired_state), native, snapshot)
+                   for cmd, output in cmd_output.items()]
+        return [each_future.result() for each_future in futures]
+
+
+# VALIDATE: Returns the report {cmd: result} in the same order as the desired_state. NATIVE: cmds (desired_state) to use native compare
+def validate(os_type, cmd_output, desired_state, workers=1, min_size=1000000, native=(), snapshot=None):
+    native = list(native or [])
+    size = sum(len(output) for output in cmd_output.values() if output != None)
+    results = None
+    if workers > 1 and len(cmd_output) > 1 and size >= min_size:
+        try:
+            results = validate_pool(os_type, cmd_output, desired_state, workers, native, snapshot)
+        except (BrokenProcessPool, OSError):
+            results = None
+    if results == None:
+        results = validate_serial(os_type, cmd_output, desired_state, native, snapshot)
+
+    cmd_report = dict(each_result for each_result in results if each_result != None and each_result[1] != None)
+    return {cmd: cmd_report[cmd] for cmd in desired_state if cmd in cmd_report}
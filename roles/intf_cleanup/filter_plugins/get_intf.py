@@ -1,47 +1,46 @@
 '''
 Decleratively cleans up all interfaces not used by ensuring config is the default.
+The ports of the switch (fbc.num_intf, can be over multiple slots and include breakout sub-ports) are a port-space (module_utils/port_space),
+the unused interfaces are the ports not used by the fabric or services and are returned in numeric order (Ethernet1/2 before Ethernet1/10).
+With intf_range contiguous interfaces are collapsed into NX-OS interface ranges (Ethernet1/10-48, Ethernet1/49/1-4) so there is one stanza
+per range rather than per interface.
 '''
 
+import os
+import sys
+
+# Shared helpers (module_utils) are in the root of the repo which isn't on the python path of role filter plugins
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+from module_utils.port_space import PortSpace
+from module_utils.trace import traced
+
 class FilterModule(object):
     def filters(self):
         return {
             'get_intf': self.get_intf
         }
 
-    def get_intf(self, hostvar, bse_intf, svc_intf):
-        intf_fmt = bse_intf['intf_fmt']
-        used_intf, total_intf, left_intf = ([] for i in range(3))
-
-        # ACTUAL_INTF: Uses the value specified in fbc.num_intf to create a list of all possible interfaces on the device
-        first_intf = int(hostvar['num_intf'].split(',')[0])
-        last_intf = int(hostvar['num_intf'].split(',')[1]) + 1     # Needs +1 as range doesn't include last number
+    @traced('get_intf', lambda args: args['hostvar'].get('inventory_hostname'))
+    def get_intf(self, hostvar, bse_intf, svc_intf, intf_range=False):
+        used_intf = []
+        # ACTUAL_INTF: Uses the value specified in fbc.num_intf to create the port-space of all possible interfaces on the device
+        space = PortSpace(bse_intf['intf_fmt'], hostvar['num_intf'])
 
-        # Creates list of all possible interfaces on the device
-        for intf in range(first_intf, last_intf):
-            total_intf.append(bse_intf['intf_fmt'] + (str(intf)))
-
-        # INTF_FBC: Creates a list of the fabric interfaces, are got from the inventory
-        for intf in hostvar['intf_fbc'].keys():
-             if intf_fmt in  intf:
-                used_intf.append(intf)
-        # intf_mlag_peer: Creates a list of the MLAG peer-link interfaces, are got from the inventory
+        # INTF_FBC: The fabric interfaces, are got from the inventory
+        used_intf.extend(hostvar['intf_fbc'].keys())
+        # intf_mlag_peer: The MLAG peer-link interfaces, are got from the inventory
         if hostvar.get('intf_mlag_peer') != None:                # get required as Spine wont have intf_mlag_peer dict
-            for intf in hostvar['intf_mlag_peer'].keys():
-                 if intf_fmt in intf:
-                    used_intf.append(intf)
-        # intf_mlag_kalive: Creates a list of the MLAG keepalive interfaces, are got from the inventory
+            used_intf.extend(hostvar['intf_mlag_peer'].keys())
+        # intf_mlag_kalive: The MLAG keepalive interfaces, are got from the inventory
         if hostvar.get('intf_mlag_kalive') != None:                # get required as intf_kalive_peer dict is optional
-            for intf in hostvar['intf_mlag_kalive'].keys():
-                 if intf_fmt in intf:
-                    used_intf.append(intf)
-        # SVC_INTF: Creates a list of the physical interfaces (not PO or LP), are got from *svc_intf_dm* method in *format_dm.py* custom filter plugin
+            used_intf.extend(hostvar['intf_mlag_kalive'].keys())
+        # SVC_INTF: The interfaces got from *svc_intf_dm* method in *format_dm.py* custom filter plugin, PO and LP are not ports so are ignored
         if svc_intf != None:
             for intf in svc_intf:
-                if intf_fmt in intf['intf_num']:
-                    used_intf.append(intf['intf_num'])
-
-        #COMPARE: Gets just the none duplicates from both lists, so the interfaces not used
-        left_intf  = list(set(total_intf) ^ set(used_intf))
-        left_intf.sort()
+                used_intf.append(intf['intf_num'])
 
-        return left_intf
\ No newline at end of file
+        # COMPARE: The ports of the switch that are not used
+        left_intf = space.unused(used_intf)
+        if intf_range == True:
+            return space.ranges(left_intf)
+        return space.names(left_intf)
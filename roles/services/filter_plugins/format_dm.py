@@ -1,17 +1,74 @@
+import glob
+import hashlib
+import inspect
+import os
+import sys
 from collections import defaultdict
 from pprint import pprint
+
+# Shared helpers (module_utils) are in the root of the repo which isn't on the python path of role filter plugins
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+from module_utils.intf_alloc import IntfAllocator
+from module_utils.change_set import ChangeSet, source_hash
+from module_utils.intf_ledger import IntfLedger, digest, pair_name
+from module_utils.run_cache import RunCache
+from module_utils.trace import traced
+from module_utils.records import Tenant, Vlan, ServiceInterface, BgpPeer, StaticRoute, PrefixListEntry, RouteMapEntry, plain
+
 class FilterModule(object):
     def filters(self):
         return {
             'create_svc_tnt_dm': self.svc_tnt_dm,
             'create_svc_intf_dm': self.svc_intf_dm,
-            'create_svc_rte_dm': self.svc_rte_dm
+            'create_svc_rte_dm': self.svc_rte_dm,
+            'svc_changes': self.svc_changes,
+            'svc_changes_commit': self.svc_changes_commit
         }
 
 
+###################################### CHANGE_SET: Which devices need their DM and config snippets regenerating ######################################
+# Diffs the service input against a snapshot from the last run, returns the hosts to regenerate (all if no state_path) and the cache folder
+# MLAG_SECTIONS: Input sections (dual_homed) where an element affects both switches in the MLAG pair
+# LEDGER: The DM uses the interface ledger, a host whose ledger is changed (or deleted) outside of the input is also regenerated
+# SOURCES: The templates of the service (all OS types), this plugin and the module_utils it builds the DM with, a change to any regenerates all
+
+    def svc_sources(self, name):
+        templates = glob.glob(os.path.join(os.path.dirname(__file__), '..', 'templates', '*', name + '_tmpl.j2'))
+        return [os.path.abspath(each_file) for each_file in templates] + [os.path.abspath(__file__)] + \
+               [inspect.getfile(each_obj) for each_obj in (IntfAllocator, IntfLedger, Tenant)]
+
+    def svc_changes(self, sections, shared, name, hosts, state_path=None, mlag_sections=[], ledger=False):
+        if state_path == None:
+            return {'regen': list(hosts), 'cache': None, 'name': name, 'state_path': None, 'ledger': ledger}
+        shared = {'input': shared, 'sources': source_hash(self.svc_sources(name))}
+        digests = self.ledger_digests(state_path, hosts) if ledger else None
+        chg = ChangeSet(state_path, name, sections, shared, digests)
+        regen = chg.affected(hosts, mlag_sections)
+        for host in regen:
+            chg.host_dir(host)
+        chg.stage()
+        return {'regen': regen, 'cache': chg.cache_dir, 'name': name, 'state_path': state_path, 'ledger': ledger, 'digests': digests}
+
+    def ledger_digests(self, state_path, hosts):
+        return {host: digest(state_path, host) for host in hosts}
+
+    # COMMIT: Once all the regenerated hosts have been cached the new input becomes the snapshot used for the next run
+    # HOSTS: Hosts that got this far (ansible_play_hosts) so have a valid cache, any that failed are regenerated next run. A cached host
+    # whose ledger was changed by the run (an MLAG peer's build) is also not valid so is regenerated next run
+    def svc_changes_commit(self, svc_chg, hosts):
+        if svc_chg['state_path'] != None:
+            digests = None
+            if svc_chg.get('ledger'):
+                digests = self.ledger_digests(svc_chg['state_path'], hosts)
+                hosts = [host for host in hosts if host in svc_chg['regen'] or digests[host] == svc_chg['digests'].get(host)]
+            ChangeSet.commit(svc_chg['state_path'], svc_chg['name'], hosts, digests)
+        return svc_chg
+
+
 ###################################### TNT DATA-MODEL: Uses input from service_tenant.yml ######################################
 # Creates 2 new separate Data Models for Leaf and Border devices with only the tenants and vlans on those device roles and incorporating the VNIs
 
+    @traced('create_svc_tnt_dm')
     def svc_tnt_dm(self, srv_tnt, srv_tnt_adv, vpc_peer_vlan, rm_name_tmp):
         l3vni = srv_tnt_adv['bse_vni']['l3vni']
         tnt_vlan = srv_tnt_adv['bse_vni']['tnt_vlan']
@@ -30,6 +87,7 @@ class FilterModule(object):
 
             # For each VLAN makes decisions based on the VLAN settings
             for vl in tnt['vlans']:
+                vl = Vlan(vl)                               # Slotted record (copy) rather than editing the input dict
                 # Creates a L2VNI by adding vlan num to base VNI
                 vl['vni'] = l2vni + vl['num']
                 # Creates separate lists of VLANs on leafs and borders. 'setdefault' adds a dictionary for the default values
@@ -69,8 +127,8 @@ class FilterModule(object):
                 if tnt['l3_tenant'] == True:
                     bdr_vlan_numb.append(tnt_vlan)
                 # Creates the new leaf DM of tenant & vlan properties
-                border_vlans.append({'name': tnt['tenant_name'] + '_L3VNI' , 'num': tnt_vlan, 'ip_addr': 'l3_vni', 'ipv4_bgp_redist': False, 'vni': l3vni})
-                border_tnt.append({'tnt_name': tnt['tenant_name'], 'l3_tnt': tnt['l3_tenant'], 'l3vni': l3vni, 'tnt_vlan': tnt_vlan, 'tnt_redist': tnt_redist, 'rm_name':rm_name, 'bgp_redist_tag': tnt['bgp_redist_tag'], 'vlans': border_vlans})
+                border_vlans.append(Vlan(name=tnt['tenant_name'] + '_L3VNI', num=tnt_vlan, ip_addr='l3_vni', ipv4_bgp_redist=False, vni=l3vni))
+                border_tnt.append(Tenant(tnt_name=tnt['tenant_name'], l3_tnt=tnt['l3_tenant'], l3vni=l3vni, tnt_vlan=tnt_vlan, tnt_redist=tnt_redist, rm_name=rm_name, bgp_redist_tag=tnt['bgp_redist_tag'], vlans=border_vlans))
 
             if len(leaf_vlans) != 0:
                 # Creates a list of just the VLAN numbers on leaf switches
@@ -79,14 +137,14 @@ class FilterModule(object):
                 if tnt['l3_tenant'] == True:
                     lf_vlan_numb.append(tnt_vlan)
                 # Creates the new leaf DM of tenant & vlan properties
-                leaf_vlans.append({'name': tnt['tenant_name'] + '_L3VNI' , 'num': tnt_vlan, 'ip_addr': 'l3_vni', 'ipv4_bgp_redist': False, 'vni': l3vni})
-                leaf_tnt.append({'tnt_name': tnt['tenant_name'], 'l3_tnt': tnt['l3_tenant'], 'l3vni': l3vni, 'tnt_vlan': tnt_vlan, 'tnt_redist': tnt_redist, 'rm_name':rm_name, 'bgp_redist_tag': tnt['bgp_redist_tag'], 'vlans': leaf_vlans})
+                leaf_vlans.append(Vlan(name=tnt['tenant_name'] + '_L3VNI', num=tnt_vlan, ip_addr='l3_vni', ipv4_bgp_redist=False, vni=l3vni))
+                leaf_tnt.append(Tenant(tnt_name=tnt['tenant_name'], l3_tnt=tnt['l3_tenant'], l3vni=l3vni, tnt_vlan=tnt_vlan, tnt_redist=tnt_redist, rm_name=rm_name, bgp_redist_tag=tnt['bgp_redist_tag'], vlans=leaf_vlans))
 
             # For each tenant (doesn't matter if L3_tnt or not) increments VLAN and L3VNI by 1
             l3vni = l3vni + vni_incre['l3vni']
             tnt_vlan = tnt_vlan + vni_incre['tnt_vlan']
 
-        return [leaf_tnt, border_tnt, self.vlan_seq(lf_vlan_numb), self.vlan_seq(bdr_vlan_numb)]
+        return plain([leaf_tnt, border_tnt, self.vlan_seq(lf_vlan_numb), self.vlan_seq(bdr_vlan_numb)])
 
 
 ################################################## DRY Functions used by INTF DATA-MODEL ##################################################
@@ -123,20 +181,63 @@ class FilterModule(object):
         # Return it as one big string
         return ','.join([str(elem) for elem in vlan_seq])
 
+    # ASSIGN_NUM: Used by 'svc_intf_dm' to give interfaces the number they have in the ledger (if still free) and the rest the next free number
+    def assign_num(self, need_intf, num_range, ledger, intf_key, field):
+        assigned, new_intf = ({} for i in range(2))
+        # 1. LEDGER: Reuse the number from the last run, only if it hasn't since been statically assigned (pinned) to another interface
+        for idx, intf in enumerate(need_intf):
+            num = ledger.get(intf_key[id(intf)], field) if ledger != None else None
+            if num != None and num_range.reserve(num):
+                assigned[idx] = num
+            else:
+                new_intf[idx] = intf
+        # 2. NEW: Any new interfaces get the next free number which is recorded in the ledger (stops if the range is full)
+        for idx, intf in new_intf.items():
+            num = num_range.allocate()
+            if num == None:
+                break
+            assigned[idx] = num
+            if ledger != None:
+                ledger.set(intf_key[id(intf)], field, num)
+        # Returned in the same order as the interfaces were defined
+        return [(need_intf[idx], assigned[idx]) for idx in sorted(assigned)]
+
 ###################################### INTF DATA-MODEL: Uses input from service_interface.yml ######################################
 # Creates a per-device data model of all interfaces to be configured on that device
-    def svc_intf_dm(self, all_homed, hostname, intf_adv, bse_intf):
+# If state_path is set dynamically assigned numbers are kept in a ledger so interfaces keep the same number across runs
+# READ_ONLY: The ledger is read but not saved (post-validation, check mode and the roles that only need the DM)
+# RUN_CACHE: Folder (ans.dir_path) the DM is cached in for the run, base, services and intf_cleanup all use the DM built by the first.
+# A read-only DM is cached separately so the first build that saves the ledger is never skipped
+    @traced('create_svc_intf_dm', 'hostname')
+    def svc_intf_dm(self, all_homed, hostname, intf_adv, bse_intf, state_path=None, run_cache=None, read_only=False):
+        if run_cache == None:
+            return self.build_svc_intf_dm(all_homed, hostname, intf_adv, bse_intf, state_path, read_only)
+        cache = RunCache(run_cache, hostname, 'svc_intf_ro' if read_only else 'svc_intf', [all_homed, hostname, intf_adv, bse_intf, state_path])
+        all_intf = cache.load()
+        if all_intf == None:
+            all_intf = cache.save(self.build_svc_intf_dm(all_homed, hostname, intf_adv, bse_intf, state_path, read_only))
+        return all_intf
+
+    def build_svc_intf_dm(self, all_homed, hostname, intf_adv, bse_intf, state_path=None, read_only=False):
         sl_hmd = intf_adv['single_homed']
         dl_hmd = intf_adv['dual_homed']
         intf_fmt = bse_intf['intf_fmt']
         lp_fmt = bse_intf['lp_fmt']
         mlag_fmt = bse_intf['mlag_fmt']
-        tmp_all_intf, have_intf, sl_need_intf, dl_need_intf, all_intf_num, sl_range, dl_range, need_po, all_po_num, po_range = ([] for i in range(10))
-        all_lp_num, lp_need_intf, lp_range = ([] for i in range(3))
+        tmp_all_intf, have_intf, sl_need_intf, dl_need_intf, all_intf_num, need_po, all_po_num = ([] for i in range(7))
+        all_lp_num, lp_need_intf = ([] for i in range(2))
+        intf_key = {}
+        # LEDGER: Single-homed numbers are per-switch, dual-homed are shared by the MLAG pair so are stored under the odd numbered switch
+        sl_ledger, dl_ledger = (None for i in range(2))
+        if state_path != None:
+            sl_ledger = IntfLedger(state_path, hostname, 'single_homed', read_only)
+            if len(all_homed.get('dual_homed') or []) != 0:
+                dl_ledger = IntfLedger(state_path, pair_name(hostname), 'dual_homed', read_only)
 
         # 1. DEFAULTS: Fill out default values and change the nested dict into a list
         for homed, interfaces in all_homed.items():
             for intf in interfaces:
+                intf = ServiceInterface(intf)               # Slotted record (copy) rather than editing the input dict
                 # Adds homed as a dict and adds some default value dicts
                 intf.setdefault('intf_num', None)
                 if homed == 'single_homed':
@@ -166,6 +267,8 @@ class FilterModule(object):
         for intf in tmp_all_intf:
             # SH: Single-homed to be created if hostname is in the list of switches
             if intf['dual_homed'] == False and hostname in intf['switch']:
+                if sl_ledger != None:
+                    intf_key[id(intf)] = sl_ledger.key(intf)                       # Stable identity of the interface used in the ledger
                 # LP: Loopback interfaces to be created on this device
                 if intf['type'] == 'loopback':
                     if intf['intf_num'] == None:
@@ -189,6 +292,8 @@ class FilterModule(object):
             # DH: Dual-homed interfaces need to be created on both MLAG pairs so logic matches both hostnames
             elif intf['dual_homed'] == True:
                 if hostname in intf['switch'] or hostname[:-2] + "{:02d}".format(int(hostname[-2:]) -1) in intf['switch']:
+                    if dl_ledger != None:
+                        intf_key[id(intf)] = dl_ledger.key(intf)
                     if intf['intf_num'] == None:
                         dl_need_intf.append(intf)
                     else:
@@ -197,42 +302,24 @@ class FilterModule(object):
                         have_intf.append(intf)
             del intf['switch']                                                  # Removes as no longer needed
 
-        # 3. INTF_RANGES: Adjust interface assignment ranges to remove any already used interfaces
-        # Loopback
-        for intf_num in range(sl_hmd['first_lp'], sl_hmd['last_lp'] + 1):
-            lp_range.append(intf_num)
-        lp_range = set(lp_range) - set(all_lp_num)
-        lp_range = list(lp_range)
-        lp_range.sort()
-        # Single-homed
-        for intf_num in range(sl_hmd['first_intf'], sl_hmd['last_intf'] + 1):
-            sl_range.append(intf_num)
-        sl_range = set(sl_range) - set(all_intf_num)
-        sl_range = list(sl_range)
-        sl_range.sort()
-       # Dual-homed
-        for intf_num in range(dl_hmd['first_intf'], dl_hmd['last_intf'] + 1):
-            dl_range.append(intf_num)
-        dl_range = set(dl_range) - set(all_intf_num)
-        dl_range = list(dl_range)
-        dl_range.sort()
-
-        # 4. INTF_ASSIGN: Assigns an interface number and adds that number to the existing interface DM
+        # 3. INTF_RANGES: Bitmap of free numbers in each assignment range with any already used (pinned) numbers reserved
+        lp_range = IntfAllocator(sl_hmd['first_lp'], sl_hmd['last_lp'], all_lp_num)
+        sl_range = IntfAllocator(sl_hmd['first_intf'], sl_hmd['last_intf'], all_intf_num)
+        dl_range = IntfAllocator(dl_hmd['first_intf'], dl_hmd['last_intf'], all_intf_num)
+
+        # 4. INTF_ASSIGN: Assigns a number (from the ledger or next free) and adds that number to the existing interface DM
         # Loopback
-        for intf, int_num in zip(lp_need_intf, lp_range):
-            if intf['type'] == 'loopback':
-                intf['intf_num'] = lp_fmt + str(int_num)
-                have_intf.append(intf)
+        for intf, int_num in self.assign_num(lp_need_intf, lp_range, sl_ledger, intf_key, 'intf_num'):
+            intf['intf_num'] = lp_fmt + str(int_num)
+            have_intf.append(intf)
         # Single-homed
-        for intf, int_num in zip(sl_need_intf, sl_range):
-            if intf['dual_homed'] == False:
-                intf['intf_num'] = intf_fmt + str(int_num)
-                have_intf.append(intf)
+        for intf, int_num in self.assign_num(sl_need_intf, sl_range, sl_ledger, intf_key, 'intf_num'):
+            intf['intf_num'] = intf_fmt + str(int_num)
+            have_intf.append(intf)
         # Dual-homed
-        for intf, int_num in zip(dl_need_intf, dl_range):
-            if intf['dual_homed'] == True:
-                intf['intf_num'] = intf_fmt + str(int_num)
-                have_intf.append(intf)
+        for intf, int_num in self.assign_num(dl_need_intf, dl_range, dl_ledger, intf_key, 'intf_num'):
+            intf['intf_num'] = intf_fmt + str(int_num)
+            have_intf.append(intf)
 
         # 5. PO: Adds PO to interface and adds a port-channel interface with the VPC number
         all_intf = []
@@ -245,23 +332,19 @@ class FilterModule(object):
                     # If PO number is defined creates new PO interface and adds VPC number
                     all_po_num.append(intf['po_num'])
                     all_intf.append(intf)
-                    all_intf.append({'intf_num': mlag_fmt + str(intf['po_num']), 'descr': intf['descr'], 'type': intf['type'],
-                                     'ip_vlan': intf['ip_vlan'], 'vpc_num': intf['po_num'], 'stp': intf['stp']})
+                    all_intf.append(ServiceInterface(intf_num=mlag_fmt + str(intf['po_num']), descr=intf['descr'], type=intf['type'],
+                                                    ip_vlan=intf['ip_vlan'], vpc_num=intf['po_num'], stp=intf['stp']))
             else:
                 all_intf.append(intf)
 
-        # Adjust PO assignment ranges to remove any already used POs
-        for po_num in range(dl_hmd['first_po'], dl_hmd['last_po'] + 1):
-            po_range.append(po_num)
-        po_range = set(po_range) - set(all_po_num)
-        po_range = list(po_range)
-        po_range.sort()
+        # Adjust PO assignment range to remove any already used POs
+        po_range = IntfAllocator(dl_hmd['first_po'], dl_hmd['last_po'], all_po_num)
         # Adds PO to interface and adds a port-channel interface with the VPC number
-        for intf, po_num in zip(need_po, po_range):
+        for intf, po_num in self.assign_num(need_po, po_range, dl_ledger, intf_key, 'po_num'):
             intf['po_num'] = po_num
             all_intf.append(intf)
-            all_intf.append({'intf_num': mlag_fmt + str(intf['po_num']), 'descr': intf['descr'], 'type': intf['type'],
-                             'ip_vlan': intf['ip_vlan'], 'vpc_num': intf['po_num'], 'stp': intf['stp']})
+            all_intf.append(ServiceInterface(intf_num=mlag_fmt + str(intf['po_num']), descr=intf['descr'], type=intf['type'],
+                                            ip_vlan=intf['ip_vlan'], vpc_num=intf['po_num'], stp=intf['stp']))
 
         for intf in all_intf:
             # If PO member interface descriptions are defined (po_mbr_descr) sets description based on whether odd or even hostname node ID
@@ -275,7 +358,11 @@ class FilterModule(object):
             if 'trunk' in intf['type'] and isinstance(intf['ip_vlan'], str) == True:
                 intf['ip_vlan'] = self.vlan_seq(intf['ip_vlan'])
 
-        return all_intf
+        # LEDGER: Saves any new assignments and drops interfaces that are no longer defined
+        for ledger in [sl_ledger, dl_ledger]:
+            if ledger != None:
+                ledger.save()
+        return plain(all_intf)
 
 
 ################################################## DRY Functions used by RTR DATA-MODEL ##################################################
@@ -292,18 +379,18 @@ class FilterModule(object):
                 if isinstance(all_pfx, str) == True:
                     # If the BGP_ATTR is applied to only a default route (default keyword)
                     if all_pfx == 'default':
-                        self.all_pfx_lst.append((pl_name.replace('val', str(bgp_attr_value)), pl_seq + 5, 'permit', '0.0.0.0/0'))
+                        self.all_pfx_lst.append(PrefixListEntry(pl_name.replace('val', str(bgp_attr_value)), pl_seq + 5, 'permit', '0.0.0.0/0'))
                     # If the BGP_ATTR is applied to any traffic (any keyword)
                     elif all_pfx == 'any':
-                        self.all_pfx_lst.append((pl_name.replace('val', str(bgp_attr_value)), pl_seq + 5, 'permit', '0.0.0.0/0 le 32'))
+                        self.all_pfx_lst.append(PrefixListEntry(pl_name.replace('val', str(bgp_attr_value)), pl_seq + 5, 'permit', '0.0.0.0/0 le 32'))
                 # If the BGP_ATTR is applied to a list of prefixes
                 elif isinstance(all_pfx, list) == True:
                     for pfx in all_pfx:
                         # As is a list of multiple prefixes increments the prefix-list sequence number by 5 each loop
                         pl_seq += 5
-                        self.all_pfx_lst.append((pl_name.replace('val', str(bgp_attr_value)), pl_seq, 'permit', pfx))
+                        self.all_pfx_lst.append(PrefixListEntry(pl_name.replace('val', str(bgp_attr_value)), pl_seq, 'permit', pfx))
                 # 4. CREATE_RM: Creates a tuple (rm_name, seq, pl_name, weight) which is added to the list of all route-maps
-                self.all_rm.append((rm_name, self.rm_seq, 'permit', pl_name.replace('val', str(bgp_attr_value)), (bgp_attr, bgp_attr_value)))
+                self.all_rm.append(RouteMapEntry(rm_name, self.rm_seq, 'permit', pl_name.replace('val', str(bgp_attr_value)), (bgp_attr, bgp_attr_value)))
 
             # 5. CLEANUP: Removes the BGP attribute key:value, if inbound/outbound dict is now empty deletes
             del input_data[direction][bgp_attr]
@@ -327,13 +414,13 @@ class FilterModule(object):
                     # Increments the PL sequence number by 5 for each prefix in the list (iteration of loop)
                     pl_seq += 5
                     # Adds the PL and RM entry at each prefix loop. The RM will always be same so is just overwriting same entry each time.
-                    self.all_pfx_lst.append((pl_name, pl_seq, 'deny', pfx))
-                    self.all_rm.append((rm_name, self.rm_seq, 'permit', pl_name, (None, None)))
+                    self.all_pfx_lst.append(PrefixListEntry(pl_name, pl_seq, 'deny', pfx))
+                    self.all_rm.append(RouteMapEntry(rm_name, self.rm_seq, 'permit', pl_name, (None, None)))
 
             # 2. DENY_DEFAULT: Has string of 'default route', uses pre-defined prefix list 'pl_default' in RM entry
             if input_data.get(direction, {}).get('deny') != None and input_data.get(direction, {}).get('deny') == 'default':
                 self.rm_seq += 10
-                self.all_rm.append((rm_name, self.rm_seq, 'deny', dflt_pl['pl_default'], (None, None)))
+                self.all_rm.append(RouteMapEntry(rm_name, self.rm_seq, 'deny', dflt_pl['pl_default'], (None, None)))
 
             # 2. ALLOW_SPECIFIC: Loops through ALLOW prefixes and adds tuple entry to the list of all prefix-lists
             if input_data.get(direction, {}).get('allow') != None:
@@ -341,23 +428,23 @@ class FilterModule(object):
                     # If the pl_seq has not been incremented it means the previous DENY if statement has not been matched, so needs to add the RM_seq and RM entry
                     if pl_seq == 0:
                         self.rm_seq += 10
-                        self.all_rm.append((rm_name, self.rm_seq, 'permit',pl_name, (None, None)))
+                        self.all_rm.append(RouteMapEntry(rm_name, self.rm_seq, 'permit',pl_name, (None, None)))
                     for pfx in input_data[direction]['allow']:
                         pl_seq += 5
-                        self.all_pfx_lst.append((pl_name, pl_seq, 'permit', pfx))
+                        self.all_pfx_lst.append(PrefixListEntry(pl_name, pl_seq, 'permit', pfx))
 
                 # 5. ALLOW_DEFAULT: Has string of 'default route', uses pre-defined prefix list 'pl_default' in RM entry
                 if input_data.get(direction, {}).get('allow') == 'default':
                     self.rm_seq += 10
-                    self.all_rm.append((rm_name, self.rm_seq, 'permit', dflt_pl['pl_default'], (None, None)))
+                    self.all_rm.append(RouteMapEntry(rm_name, self.rm_seq, 'permit', dflt_pl['pl_default'], (None, None)))
                 # 6. ALLOW_ANY: Has string of 'any', uses pre-defined prefix list 'pl_allow' in RM entry
                 elif input_data.get(direction, {}).get('allow') == 'any':
                     self.rm_seq += 10
-                    self.all_rm.append((rm_name, self.rm_seq, 'permit', dflt_pl['pl_allow'], (None, None)))
+                    self.all_rm.append(RouteMapEntry(rm_name, self.rm_seq, 'permit', dflt_pl['pl_allow'], (None, None)))
             # 7. DENY_ANY: Should always be last entry in route-map. Has string of 'any', uses pre-defined prefix list 'pl_deny' in RM entry
             if input_data.get(direction, {}).get('deny') != None and input_data.get(direction, {}).get('deny') == 'any':
                 self.rm_seq += 10
-                self.all_rm.append((rm_name, self.rm_seq, 'permit', dflt_pl['pl_deny'], (None, None)))
+                self.all_rm.append(RouteMapEntry(rm_name, self.rm_seq, 'permit', dflt_pl['pl_deny'], (None, None)))
 
             # 8. CLEANUP: If the inbound/ outbound dict exists it is deleted
             if input_data.get(direction) != None:
@@ -387,7 +474,7 @@ class FilterModule(object):
        # 2. NO PFX_LST: Creates blank RM with on matching prefix-list if both allow and metric not defined (redistribute all)
         if allow_pfx == None and pfx_attr == None:
             rm_seq += 10
-            self.all_rm.append((rm_name, rm_seq, 'permit', None, (None, None)))
+            self.all_rm.append(RouteMapEntry(rm_name, rm_seq, 'permit', None, (None, None), source))
 
         # 3. METRIC: Creates the PL and RM for any prefixes that are to be redistributed with a metric value
         elif pfx_attr != None:
@@ -398,45 +485,92 @@ class FilterModule(object):
                 pl_seq = 0
                 # 3a. DEFAULT: If redistributing only default route (default keyword) with a metric value
                 if isinstance(all_pfx, str) == True and all_pfx == 'default':
-                    self.all_pfx_lst.append((pl_metric_name.replace('val', str(attr_value)), pl_seq + 5, 'permit', '0.0.0.0/0'))
+                    self.all_pfx_lst.append(PrefixListEntry(pl_metric_name.replace('val', str(attr_value)), pl_seq + 5, 'permit', '0.0.0.0/0'))
                 # 3b. ANY: If redistributing only all prefixes (any keyword) with a metric value
                 elif isinstance(all_pfx, str) == True and all_pfx == 'any':
-                    self.all_pfx_lst.append((pl_metric_name.replace('val', str(attr_value)), pl_seq + 5, 'permit', '0.0.0.0/0 le 32'))
+                    self.all_pfx_lst.append(PrefixListEntry(pl_metric_name.replace('val', str(attr_value)), pl_seq + 5, 'permit', '0.0.0.0/0 le 32'))
                 # 3c. PREFIXES: Adds all prefixes in the list to the one PL, incrementing the prefix-list sequence number by 5 each loop
                 else:
                     for pfx in all_pfx:
                         pl_seq += 5
-                        self.all_pfx_lst.append((pl_metric_name.replace('val', str(attr_value)), pl_seq, 'permit', pfx))
+                        self.all_pfx_lst.append(PrefixListEntry(pl_metric_name.replace('val', str(attr_value)), pl_seq, 'permit', pfx))
                 # 3d. RM: Adds a tuple (rm_name, seq, , permit/deny, pl_name, (metric, metric_value)) to list of all route-maps
-                self.all_rm.append((rm_name, rm_seq, 'permit', pl_metric_name.replace('val', str(attr_value)), ('metric', attr_value)))
+                self.all_rm.append(RouteMapEntry(rm_name, rm_seq, 'permit', pl_metric_name.replace('val', str(attr_value)), ('metric', attr_value), source))
 
         # 4a. ALLOW_DFLT: Adds 10 to the rm_seq and adds a RM entry with the predefind 'default' PL (no metric)
         if allow_pfx == 'default':
             rm_seq += 10
-            self.all_rm.append((rm_name, rm_seq, 'permit', dflt_pl['pl_default'], (None, None)))
+            self.all_rm.append(RouteMapEntry(rm_name, rm_seq, 'permit', dflt_pl['pl_default'], (None, None), source))
         # 4b. ALLOW_ANY: Adds 10 to the rm_seq and adds a RM entry with the predefind 'any' PL (no metric)
         elif allow_pfx == 'any':
             rm_seq += 10
-            self.all_rm.append((rm_name, rm_seq, 'permit', dflt_pl['pl_allow'], (None, None)))
+            self.all_rm.append(RouteMapEntry(rm_name, rm_seq, 'permit', dflt_pl['pl_allow'], (None, None), source))
         # 4c. CONN: RM_SEQ starts at 20 as RM already exists (created in svc_tnt). No PL so adds interfaces in its place in the RM list
         elif allow_pfx != None and source == 'CONN':
             rm_seq += 20                                                                    # 20 as redist in tenant (tag of SVIs in tnt) is 10
-            self.all_rm.append((rm_name, rm_seq, 'permit', ' '.join(allow_pfx), (None, None)))        # Adds interfaces rather than PL name
+            self.all_rm.append(RouteMapEntry(rm_name, rm_seq, 'permit', ' '.join(allow_pfx), (None, None), source))        # Adds interfaces rather than PL name
         # 4d. ALLOW: Creates PL of all prefixes (seq 5 between) and adds 10 to the rm_seq before adding a RM entry (no metric)
         elif allow_pfx != None:
             pl_seq = 0
             for pfx in allow_pfx:
                 pl_seq += 5
-                self.all_pfx_lst.append((pl_name, pl_seq, 'permit', pfx))
+                self.all_pfx_lst.append(PrefixListEntry(pl_name, pl_seq, 'permit', pfx))
             rm_seq += 10
-            self.all_rm.append((rm_name, rm_seq, 'permit', pl_name, (None, None)))
+            self.all_rm.append(RouteMapEntry(rm_name, rm_seq, 'permit', pl_name, (None, None), source))
 
         # 5. Returns the RM name back to be added to the  BGP or OSPF redist dictionary
         return rm_name
 
 
+# DEDUP: Function to only create one copy of identical prefix-lists and BGP group/peer route-maps, all references are changed to use that one copy
+    # CONTENT_NAMES: {name: kept name}, a name whose content is unique keeps its name, names sharing content all use one named by a hash
+    # of the content (PREFIX_<hash>) so adding or removing an unrelated filter never changes the name a route-map points at
+    def content_names(self, entries, prefix):
+        by_content = defaultdict(list)
+        for name, content in entries.items():
+            by_content[tuple(content)].append(name)
+        alias = {}
+        for content, names in by_content.items():
+            shared = prefix + hashlib.sha256(repr(content).encode()).hexdigest()[:12].upper()
+            alias.update({name: name if len(names) == 1 else shared for name in names})
+        # KEEP: {kept name: the name (first alphabetically) whose entries are kept}
+        keep = {}
+        for name in sorted(alias):
+            keep.setdefault(alias[name], name)
+        return alias, keep
+
+    def dedup_rm_pfx_lst(self, group, peer):
+        pl_entries, rm_entries = (defaultdict(list) for i in range(2))
+        # 1. PL_CONTENT: Ordered entries (seq, action, pfx) of each prefix-list are its content, identical prefix-lists are only created once
+        for pl_name, seq, action, pfx in self.all_pfx_lst:
+            pl_entries[pl_name].append((seq, action, pfx))
+        pl_alias, pl_keep = self.content_names(pl_entries, 'PL_')
+        self.all_pfx_lst = [pfx._replace(name=pl_alias[pfx[0]]) for pfx in self.all_pfx_lst if pl_keep[pl_alias[pfx[0]]] == pfx[0]]
+
+        # 2. RM_CONTENT: Route-maps now match on the kept prefix-list. Only BGP group/peer route-maps are deduplicated as redistribution
+        # route-maps can have entries created elsewhere (svc_tnt adds to the connected route-map)
+        bgp_rm = set()
+        for obj in list(group.values()) + [pr for all_pr in peer.values() for pr in all_pr['peers']]:
+            bgp_rm.update([obj[rm] for rm in ['inbound_rm', 'outbound_rm'] if obj.get(rm) != None])
+        for idx, rm in enumerate(self.all_rm):
+            # MATCH: Connected redistribution route-maps match interfaces (same test as the template) rather than a prefix-list
+            if rm.source != 'CONN':
+                self.all_rm[idx] = rm._replace(match=pl_alias.get(rm.match, rm.match))
+            rm_entries[rm[0]].append(self.all_rm[idx][1:])
+        rm_alias, rm_keep = self.content_names({rm_name: entries for rm_name, entries in rm_entries.items() if rm_name in bgp_rm}, 'RM_')
+        self.all_rm = [rm if rm[0] not in rm_alias else rm._replace(name=rm_alias[rm[0]]) for rm in self.all_rm
+                       if rm[0] not in rm_alias or rm_keep[rm_alias[rm[0]]] == rm[0]]
+
+        # 3. UPDATE_REF: Groups and peers use the kept route-map
+        for obj in list(group.values()) + [pr for all_pr in peer.values() for pr in all_pr['peers']]:
+            for rm in ['inbound_rm', 'outbound_rm']:
+                if obj.get(rm) != None:
+                    obj[rm] = rm_alias[obj[rm]]
+
+
 ###################################### RTR DATA MODEL: Uses input from service_route.yml ######################################
 # Creates 7 data models for Prefix-lists, Route-maps, BGP groups, BGP peers (includes network, summary, redist), OSPF processes, OSPF interfaces and static routes
+    @traced('create_svc_rte_dm', 'hostname')
     def svc_rte_dm(self, hostname, bgp_grps, bgp_tnt_adv, ospf, static_route, adv, fbc):
         pl_rm_name = adv['bgp_naming']
         bse_intf = fbc['adv']['bse_intf']
@@ -454,6 +588,7 @@ class FilterModule(object):
                 rte_tmp = []
                 # 3. LOOP_RTE: Loops through routes finding those on this device, uses the switch from the tenant if not specified
                 for each_route in grp['route']:
+                    each_route = StaticRoute(each_route)        # Record per-tenant so cleanup doesn't edit the same route twice
                     if hostname in each_route.setdefault('switch', grp['switch']):
                         # 4. DFLT_VAL: Creates default values of None so can put added in JINJA template but be empty if that option is not configured
                         each_route.setdefault('gateway', None)
@@ -611,7 +746,7 @@ class FilterModule(object):
                     tnt = each_peer.pop('tenant')
                     # PEER_DICT: Creates new dictionary of VRFs with the values being lists of the peer dictionaries within that VRF
                     for each_tnt in tnt:
-                        tmp_peers[each_tnt].append(each_peer.copy())  # Needs a copy or you cant edit later as mutable (same object reference multiple times)
+                        tmp_peers[each_tnt].append(BgpPeer(each_peer))  # Needs a copy (record) or you cant edit later as mutable (same object reference multiple times)
 
                     # 1b. GROUP_DICT: Creates new dictionary with the Key the name of the group/templates and the values being its attributes
                     group[grp['name']]['timers'] = grp.setdefault('timers', adv['bgp_timers'])     # Sets default BGP timers for groups if not specified
@@ -718,6 +853,9 @@ class FilterModule(object):
                 if len(redist_tmp) != 0:
                     peer[tnt['name']]['redist'] = redist_tmp
 
+        # 9. DEDUP: Identical prefix-lists and route-maps (for example same filters on many peers) are only created once
+        if adv.get('dedup_filters') == True:
+            self.dedup_rm_pfx_lst(group, peer)
 
 #### Output returned back to ansible to be used in the jinja2 template
-        return [self.all_pfx_lst, self.all_rm, dict(stc_rte), ospf_proc, ospf_intf, dict(group), dict(peer)]
\ No newline at end of file
+        return plain([self.all_pfx_lst, self.all_rm, dict(stc_rte), ospf_proc, ospf_intf, dict(group), dict(peer)])
\ No newline at end of file
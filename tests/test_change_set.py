@@ -0,0 +1,56 @@
+"""Checks the service_interface change set only regenerates the switches affected by an input change or a change to their interface ledger.
+
+python -m pytest -q tests
+"""
+
+import copy
+import os
+import sys
+
+import yaml
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(REPO, 'roles', 'services', 'filter_plugins'))
+from format_dm import FilterModule
+
+HOSTS = ['DC1-N9K-LEAF01', 'DC1-N9K-LEAF02', 'DC1-N9K-BORDER01']
+with open(os.path.join(REPO, 'vars', 'service_interface.yml'), 'r') as file_content:
+    SVC_INTF = yaml.safe_load(file_content)['svc_intf']
+with open(os.path.join(REPO, 'vars', 'fabric.yml'), 'r') as file_content:
+    BSE_INTF = yaml.safe_load(file_content)['fbc']['adv']['bse_intf']
+
+
+# BUILD: As the services role, works out the affected hosts, builds their DM (saving the ledger) and commits. Returns the regenerated hosts
+def build(state_path, all_homed=None):
+    svc_fltr = FilterModule()
+    all_homed = all_homed or SVC_INTF['intf']
+    svc_chg = svc_fltr.svc_changes(all_homed, [SVC_INTF['adv'], BSE_INTF], 'svc_intf', HOSTS, state_path, ['dual_homed'], True)
+    for host in svc_chg['regen']:
+        svc_fltr.build_svc_intf_dm(copy.deepcopy(all_homed), host, SVC_INTF['adv'], BSE_INTF, state_path)
+    svc_fltr.svc_changes_commit(svc_chg, HOSTS)
+    return svc_chg['regen']
+
+
+def test_unchanged(tmp_path):
+    assert build(str(tmp_path)) == HOSTS
+    assert build(str(tmp_path)) == []
+
+
+def test_input_change(tmp_path):
+    build(str(tmp_path))
+    all_homed = copy.deepcopy(SVC_INTF['intf'])
+    all_homed['single_homed'].insert(0, {'descr': 'NEW', 'type': 'access', 'ip_vlan': 10, 'switch': ['DC1-N9K-LEAF02']})
+    assert build(str(tmp_path), all_homed) == ['DC1-N9K-LEAF02']
+
+
+def test_ledger_deleted(tmp_path):
+    build(str(tmp_path))
+    os.remove(os.path.join(str(tmp_path), 'intf_ledger', 'DC1-N9K-LEAF02_single_homed.json'))
+    assert build(str(tmp_path)) == ['DC1-N9K-LEAF02']
+
+
+# PEER: The dual-homed ledger is shared by the MLAG pair so changing it regenerates both members
+def test_pair_ledger_changed(tmp_path):
+    build(str(tmp_path))
+    os.remove(os.path.join(str(tmp_path), 'intf_ledger', 'DC1-N9K-LEAF01_dual_homed.json'))
+    assert build(str(tmp_path)) == ['DC1-N9K-LEAF01', 'DC1-N9K-LEAF02']
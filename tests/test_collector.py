@@ -0,0 +1,99 @@
+"""Checks the collector (module_utils/collector) against the fake NX-API (module_utils/nxos_sim) served on ephemeral ports.
+
+Covers gathering several devices at once into their cache folders, retrying (with backoff) a device that drops the connection and
+giving up on a device that doesn't answer within the timeout.
+
+python -m pytest -q tests
+"""
+
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from module_utils.collector import Collector, cmd_filename
+from module_utils.nxos_sim import NxosSim, serve_fabric
+
+HOSTS = ['DC1-N9K-BORDER01', 'DC1-N9K-LEAF01', 'DC1-N9K-SPINE01']
+CMDS = ['show ip ospf neighbors detail | json', 'show port-channel summary | json']
+
+
+# RECORDED: Output of each cmd per device (same layout as the collector cache), the second cmd isn't recorded for the spine
+@pytest.fixture
+def recorded(tmp_path):
+    for host in HOSTS:
+        host_dir = tmp_path / 'recorded' / host
+        host_dir.mkdir(parents=True)
+        for cmd in CMDS:
+            if 'SPINE' in host and 'port-channel' in cmd:
+                continue
+            (host_dir / cmd_filename(cmd)).write_text(json.dumps({'host': host, 'cmd': cmd}))
+    return tmp_path
+
+
+def devices(tmp_path, servers):
+    return {host: {'address': '127.0.0.1', 'port': sim.port, 'cmds': CMDS, 'cache': str(tmp_path / 'cache' / host)}
+            for host, sim in servers.items()}
+
+
+def collector(**settings):
+    return Collector('admin', 'ansible', **dict({'transport': 'http', 'timeout': 5, 'retries': 2, 'backoff': 0.1}, **settings))
+
+
+def test_collect_all_hosts(recorded):
+    servers = serve_fabric(str(recorded / 'recorded'))
+    try:
+        stale = recorded / 'cache' / 'DC1-N9K-SPINE01' / 'stale.json'
+        stale.parent.mkdir(parents=True)
+        stale.write_text('{}')
+        result = collector().run(devices(recorded, servers))
+    finally:
+        for sim in servers.values():
+            sim.stop()
+    assert result == {host: 'ok' for host in HOSTS}
+    for host in HOSTS:
+        cache = recorded / 'cache' / host
+        expected = sorted(cmd_filename(cmd) for cmd in CMDS if not ('SPINE' in host and 'port-channel' in cmd))
+        assert sorted(os.listdir(str(cache))) == expected
+        for each_file in expected:
+            assert (cache / each_file).read_text() == (recorded / 'recorded' / host / each_file).read_text()
+        # BATCH: All the cmds of a device are sent in one request
+        assert servers[host].requests == 1 and servers[host].commands == len(CMDS)
+
+
+def test_retry_dropped_connection(recorded):
+    sim = NxosSim(str(recorded / 'recorded' / HOSTS[0]), 0, drop=2).start()
+    try:
+        start = time.perf_counter()
+        result = collector(backoff=0.2).run(devices(recorded, {HOSTS[0]: sim}))
+        elapsed = time.perf_counter() - start
+    finally:
+        sim.stop()
+    assert result == {HOSTS[0]: 'ok'}
+    assert sim.requests == 3
+    assert elapsed >= 0.2 + 0.4                     # Backoff of 1x and then 2x before the retries
+    assert len(os.listdir(str(recorded / 'cache' / HOSTS[0]))) == len(CMDS)
+
+
+def test_retries_exhausted(recorded):
+    sim = NxosSim(str(recorded / 'recorded' / HOSTS[0]), 0, drop=10).start()
+    try:
+        result = collector(retries=1).run(devices(recorded, {HOSTS[0]: sim}))
+    finally:
+        sim.stop()
+    assert result[HOSTS[0]].startswith('failed (2 attempts), ConnectionError')
+    assert sim.requests == 2
+    assert os.listdir(str(recorded / 'cache' / HOSTS[0])) == []
+
+
+def test_timeout(recorded):
+    sim = NxosSim(str(recorded / 'recorded' / HOSTS[0]), 0, delay=1).start()
+    try:
+        result = collector(timeout=0.2, retries=0).run(devices(recorded, {HOSTS[0]: sim}))
+    finally:
+        sim.stop()
+    assert result == {HOSTS[0]: 'failed (1 attempts), timed out after 0.2s'}
+    assert os.listdir(str(recorded / 'cache' / HOSTS[0])) == []
@@ -0,0 +1,76 @@
+"""Checks the native compare engine (module_utils/compare) gives the same report as napalm validate.compare.
+
+Each case is compared by both engines (napalm gets its own copy as it removes '_mode' from the desired state) and the reports
+must be identical. Covers strict mode, lists, regex values, numeric ('<', '>') and range ('<->') values and missing keys, as well as
+randomised route tables.
+
+python -m pytest -q tests
+"""
+
+import copy
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from module_utils.compare import compare
+from napalm.base import validate as napalm_validate
+from napalm.base.exceptions import ValidationException
+
+ROUTE = {'10.10.10.0/24': {'type': 'ospf-intra', 'nh_addr': '192.168.1.1', 'pref': 110}}
+
+CASES = {
+    'same': (ROUTE, ROUTE),
+    'missing_key': ({'10.10.10.0/24': {}, '10.10.20.0/24': {}}, ROUTE),
+    'changed_value': ({'10.10.10.0/24': {'type': 'ospf-inter'}}, ROUTE),
+    'strict_extra': ({'_mode': 'strict', '10.10.20.0/24': {}}, ROUTE),
+    'strict_no_extra': ({'_mode': 'strict', '10.10.10.0/24': {}}, ROUTE),
+    'strict_nested': ({'10.10.10.0/24': {'_mode': 'strict', 'type': 'ospf-intra'}}, ROUTE),
+    'regex': ({'10.10.10.0/24': {'type': 'ospf-.*', 'nh_addr': r'192\.168\.1\.\d+'}}, ROUTE),
+    'regex_fail': ({'10.10.10.0/24': {'type': '^bgp'}}, ROUTE),
+    'integer': ({'10.10.10.0/24': {'pref': 110}}, ROUTE),
+    'less_than': ({'10.10.10.0/24': {'pref': '<200'}}, ROUTE),
+    'less_than_fail': ({'10.10.10.0/24': {'pref': '<100'}}, ROUTE),
+    'more_than': ({'10.10.10.0/24': {'pref': '>100'}}, ROUTE),
+    'range': ({'10.10.10.0/24': {'pref': '100<->120'}}, ROUTE),
+    'range_fail': ({'10.10.10.0/24': {'pref': '1<->20'}}, ROUTE),
+    'list': ({'vlans': {'list': [10, 20]}}, {'vlans': [10, 20, 30]}),
+    'list_missing': ({'vlans': {'list': [10, 40]}}, {'vlans': [10, 20, 30]}),
+    'list_strict': ({'vlans': {'_mode': 'strict', 'list': [10, 20]}}, {'vlans': [10, 20, 30]}),
+    'list_of_dicts': ({'nbr': {'list': [{'_mode': 'strict', 'state': 'FULL'}]}}, {'nbr': [{'state': 'FULL'}]}),
+    'list_of_dicts_missing': ({'nbr': {'list': [{'_mode': 'strict', 'state': 'FULL'}]}}, {'nbr': [{'state': 'INIT'}]}),
+    'list_empty_actual': ({'nbr': {'list': [{'_mode': 'strict', 'state': 'FULL'}]}}, {'nbr': []}),
+    'list_not_list': ({'nbr': {'_mode': 'strict', 'list': [{'state': 'FULL'}]}}, {'nbr': {'state': 'FULL'}}),
+}
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+def test_same_as_napalm(name):
+    src, dst = CASES[name]
+    assert compare(copy.deepcopy(src), copy.deepcopy(dst)) == napalm_validate.compare(copy.deepcopy(src), copy.deepcopy(dst))
+
+
+def test_desired_state_unchanged():
+    src = copy.deepcopy(CASES['strict_extra'][0])
+    compare(src, ROUTE)
+    assert src == CASES['strict_extra'][0]
+
+
+def test_unknown_mode():
+    for engine in [compare, napalm_validate.compare]:
+        with pytest.raises(ValidationException):
+            engine({'_mode': 'loose', 'a': 1}, {'a': 1})
+
+
+def test_random_route_tables():
+    rand = random.Random(1)
+    for each_table in range(50):
+        dst = {'10.{}.{}.0/24'.format(rand.randint(0, 5), idx): {'type': rand.choice(['ospf-intra', 'bgp', 'static']),
+                                                                 'pref': rand.choice([1, 20, 110, 200])} for idx in range(40)}
+        src = {prefix: {'type': rand.choice(['ospf-intra', 'bgp', 'ospf-.*']), 'pref': rand.choice(['<150', '>10', '100<->120', 110])}
+               for prefix in rand.sample(sorted(dst), 20) + ['172.16.{}.0/24'.format(idx) for idx in range(rand.randint(0, 3))]}
+        if rand.random() < 0.5:
+            src['_mode'] = 'strict'
+        assert compare(copy.deepcopy(src), dst) == napalm_validate.compare(copy.deepcopy(src), copy.deepcopy(dst))
@@ -0,0 +1,129 @@
+"""Checks the wave deploy (module_utils/deploy) and the rollback (module_utils/rollback) against the mock NX-OS driver (module_utils/nxos_mock).
+
+Covers the wave order (borders and spines before leafs, MLAG pair members in different waves), a failed or unhealthy host stopping the
+later waves (or rolling back the hosts committed this run) and a rollback restoring the config saved before the deploy.
+
+python -m pytest -q tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from module_utils.deploy import Deployer, plan_waves
+from module_utils.nxos_mock import SimFabric, driver_factory
+from module_utils.rollback import RollbackConfig, capture, roll_back
+
+GROUPS = {'border': ['DC1-N9K-BORDER01', 'DC1-N9K-BORDER02'], 'spine': ['DC1-N9K-SPINE01', 'DC1-N9K-SPINE02'],
+          'leaf': ['DC1-N9K-LEAF01', 'DC1-N9K-LEAF02', 'DC1-N9K-LEAF03', 'DC1-N9K-LEAF04']}
+HOSTS = [host for group in ['leaf', 'spine', 'border'] for host in GROUPS[group]]
+NO_LATENCY = {'open': 0, 'load': 0, 'commit': 0, 'rollback': 0, 'cli': 0}
+
+
+# FABRIC: Simulated devices with their original running config and the new config.cfg of each host
+@pytest.fixture
+def fabric(tmp_path):
+    sim = SimFabric(str(tmp_path / 'sim'), latency=NO_LATENCY).create(HOSTS)
+    configs = {}
+    for host in HOSTS:
+        configs[host] = str(tmp_path / '{}.cfg'.format(host))
+        with open(configs[host], 'w') as file_content:
+            file_content.write('hostname {}\nfeature bgp\n'.format(host))
+    return sim, configs
+
+
+def running(sim, host):
+    return sim.read(host, 'running-config.cfg')
+
+
+def test_wave_order():
+    waves = plan_waves(HOSTS + ['DC1-SVC-FW01'], GROUPS)
+    assert [(wave['name'], wave['hosts']) for wave in waves] == [
+        ('border (first of pair)', ['DC1-N9K-BORDER01']), ('border (second of pair)', ['DC1-N9K-BORDER02']),
+        ('spine', ['DC1-N9K-SPINE01', 'DC1-N9K-SPINE02']),
+        ('leaf (first of pair)', ['DC1-N9K-LEAF01', 'DC1-N9K-LEAF03']), ('leaf (second of pair)', ['DC1-N9K-LEAF02', 'DC1-N9K-LEAF04']),
+        ('other', ['DC1-SVC-FW01'])]
+    assert waves[2]['concurrency'] == 1
+    # PAIRS: Both members of a pair are never in the same wave
+    for wave in waves:
+        pairs = [host[:-2] + '{:02d}'.format((int(host[-2:]) + 1) // 2) for host in wave['hosts'] if 'SPINE' not in host]
+        assert len(pairs) == len(set(pairs))
+
+
+def test_only_hosts_to_deploy():
+    waves = plan_waves(['DC1-N9K-LEAF02', 'DC1-N9K-SPINE01'], GROUPS, [{'group': 'spine'}, {'group': 'leaf', 'pairs': True}], 5)
+    assert [(wave['name'], wave['hosts'], wave['concurrency']) for wave in waves] == [
+        ('spine', ['DC1-N9K-SPINE01'], 5), ('leaf (second of pair)', ['DC1-N9K-LEAF02'], 5)]
+
+
+def test_deploy_all_waves(fabric):
+    sim, configs = fabric
+    result = Deployer(driver_factory(sim), configs).run(plan_waves(HOSTS, GROUPS))
+    assert result['complete'] == True
+    assert result['hosts'] == {host: 'deployed' for host in HOSTS}
+    assert all('feature bgp' in running(sim, host) for host in HOSTS)
+    # NO_CHANGES: Deploying the same config again commits nothing
+    result = Deployer(driver_factory(sim), configs).run(plan_waves(HOSTS, GROUPS))
+    assert result['hosts'] == {host: 'no changes' for host in HOSTS}
+
+
+def test_failure_stops_later_waves(fabric):
+    sim, configs = fabric
+    sim.fail = {'commit': ['DC1-N9K-SPINE02']}
+    result = Deployer(driver_factory(sim), configs).run(plan_waves(HOSTS, GROUPS))
+    assert result['complete'] == False
+    assert result['waves'] == ['border (first of pair)', 'border (second of pair)', 'spine']
+    assert result['hosts']['DC1-N9K-SPINE02'].startswith('failed (committing), CommitError')
+    assert result['hosts']['DC1-N9K-SPINE01'] == 'deployed'
+    for host in GROUPS['leaf']:
+        assert result['hosts'][host] == 'not deployed'
+        assert running(sim, host) == 'hostname {}\n'.format(host)
+
+
+def test_unhealthy_stops_later_waves(fabric):
+    sim, configs = fabric
+    health = lambda hosts: {host: 'bgp down' if host == 'DC1-N9K-BORDER01' else True for host in hosts}
+    result = Deployer(driver_factory(sim), configs, health=health).run(plan_waves(HOSTS, GROUPS))
+    assert result['waves'] == ['border (first of pair)']
+    assert result['hosts']['DC1-N9K-BORDER01'] == 'unhealthy, bgp down'
+    assert running(sim, 'DC1-N9K-BORDER02') == 'hostname DC1-N9K-BORDER02\n'
+
+
+def test_failure_rolls_back_committed(fabric):
+    sim, configs = fabric
+    sim.fail = {'commit': ['DC1-N9K-LEAF03']}
+    result = Deployer(driver_factory(sim), configs, on_failure='rollback').run(plan_waves(HOSTS, GROUPS))
+    assert result['complete'] == False
+    for host in GROUPS['border'] + GROUPS['spine'] + ['DC1-N9K-LEAF01']:
+        assert result['hosts'][host] == 'rolled back'
+        assert running(sim, host) == 'hostname {}\n'.format(host)
+    assert result['hosts']['DC1-N9K-LEAF02'] == 'not deployed'
+
+
+def test_rollback_saved_config(fabric, tmp_path):
+    sim, configs = fabric
+    state_path = str(tmp_path / 'state')
+    sim.write('DC1-N9K-LEAF01', 'running-config.cfg', 'hostname DC1-N9K-LEAF01\n!Time: 1\nfeature ospf\n')
+    deployer = Deployer(driver_factory(sim), configs, capture=capture(state_path))
+    deployer.run(plan_waves(['DC1-N9K-LEAF01', 'DC1-N9K-LEAF02'], GROUPS))
+    RollbackConfig(state_path, 'DC1-N9K-SPINE01').unchanged()
+    # CHECKPOINT: A host deployed before the running configs were saved is rolled back to the checkpoint on the device
+    sim.write('DC1-N9K-LEAF03', 'checkpoint.cfg', 'hostname DC1-N9K-LEAF03\nfeature pim\n')
+    # NO_CHECKPOINT: Neither a saved config nor a checkpoint on the device so its rollback fails
+    hosts = ['DC1-N9K-LEAF01', 'DC1-N9K-LEAF02', 'DC1-N9K-LEAF03', 'DC1-N9K-LEAF04', 'DC1-N9K-SPINE01']
+
+    assert roll_back(driver_factory(sim), hosts, state_path, dry_run=True)['DC1-N9K-LEAF01'] == 'would change'
+    assert 'feature bgp' in running(sim, 'DC1-N9K-LEAF01')
+    result = roll_back(driver_factory(sim), hosts, state_path)
+    assert result['DC1-N9K-LEAF01'] == 'rolled back' and result['DC1-N9K-LEAF02'] == 'rolled back'
+    assert result['DC1-N9K-LEAF03'] == 'rolled back to the device checkpoint'
+    assert result['DC1-N9K-LEAF04'].startswith('rollback failed, ReplaceConfigException')
+    assert result['DC1-N9K-SPINE01'] == 'unchanged by the last deploy'
+    assert running(sim, 'DC1-N9K-LEAF01') == 'hostname DC1-N9K-LEAF01\n!Time: 1\nfeature ospf\n'
+    assert running(sim, 'DC1-N9K-LEAF02') == 'hostname DC1-N9K-LEAF02\n'
+    assert running(sim, 'DC1-N9K-LEAF03') == 'hostname DC1-N9K-LEAF03\nfeature pim\n'
+    # ALREADY_ROLLED_BACK: Running config has the saved hash (the !Time line is ignored) so the host is skipped
+    sim.write('DC1-N9K-LEAF01', 'running-config.cfg', 'hostname DC1-N9K-LEAF01\n!Time: 2\nfeature ospf\n')
+    assert roll_back(driver_factory(sim), ['DC1-N9K-LEAF01'], state_path)['DC1-N9K-LEAF01'] == 'no changes'
@@ -0,0 +1,62 @@
+"""Checks the interface ledger keeps assignments across runs and that a read-only DM (post-validation, check mode, base and intf_cleanup)
+gives the build's numbers without ever writing the ledger.
+
+python -m pytest -q tests
+"""
+
+import copy
+import os
+import sys
+
+import yaml
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(REPO, 'roles', 'services', 'filter_plugins'))
+from format_dm import FilterModule
+
+HOST = 'DC1-N9K-LEAF02'
+with open(os.path.join(REPO, 'vars', 'service_interface.yml'), 'r') as file_content:
+    SVC_INTF = yaml.safe_load(file_content)['svc_intf']
+with open(os.path.join(REPO, 'vars', 'fabric.yml'), 'r') as file_content:
+    BSE_INTF = yaml.safe_load(file_content)['fbc']['adv']['bse_intf']
+
+
+def intf_dm(all_homed, state_path, read_only=False):
+    all_intf = FilterModule().build_svc_intf_dm(copy.deepcopy(all_homed), HOST, SVC_INTF['adv'], BSE_INTF, state_path, read_only)
+    return {intf['descr']: intf['intf_num'] for intf in all_intf}
+
+
+def ledger_files(state_path):
+    directory = os.path.join(state_path, 'intf_ledger')
+    files = {}
+    for each_file in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, each_file), 'r') as file_content:
+            files[each_file] = file_content.read()
+    return files
+
+
+# INSERTED: An interface added at the top of service_interface.yml
+def inserted():
+    all_homed = copy.deepcopy(SVC_INTF['intf'])
+    all_homed['single_homed'].insert(0, {'descr': 'NEW', 'type': 'access', 'ip_vlan': 10, 'switch': [HOST]})
+    return all_homed
+
+
+def test_insert_keeps_numbers(tmp_path):
+    first = intf_dm(SVC_INTF['intf'], str(tmp_path))
+    second = intf_dm(inserted(), str(tmp_path))
+    assert {descr: num for descr, num in second.items() if descr != 'NEW'} == first
+
+
+def test_read_only_same_numbers_not_written(tmp_path):
+    intf_dm(SVC_INTF['intf'], str(tmp_path))
+    ledger = ledger_files(str(tmp_path))
+    read_only = intf_dm(inserted(), str(tmp_path), read_only=True)
+    assert ledger_files(str(tmp_path)) == ledger
+    assert read_only == intf_dm(inserted(), str(tmp_path))
+    assert read_only != intf_dm(inserted(), None)
+
+
+def test_read_only_no_ledger(tmp_path):
+    intf_dm(SVC_INTF['intf'], str(tmp_path), read_only=True)
+    assert not os.path.exists(os.path.join(str(tmp_path), 'intf_ledger'))
@@ -0,0 +1,83 @@
+"""Checks the streaming parsers (ijson over TextReader) give the same actual_state as the normal parsers for large route and BGP tables,
+and that validating in a process pool (each worker only gets the desired_state of its cmd) gives the same report as serially.
+
+python -m pytest -q tests
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from module_utils import parsers
+from module_utils.columnar import PrefixTable, to_dict
+from module_utils.parsers import TextReader, parse_cmd
+from module_utils.validation import cmd_desired, validate
+
+pytest.importorskip('ijson')
+
+
+def route_table(num_rows):
+    rows = [{'ipprefix': '10.{}.{}.0/24'.format(idx // 250, idx % 250), 'ucast-nhops': '1',
+             'TABLE_path': {'ROW_path': {'clientname': 'ospf-1' if idx % 2 else 'static', 'ipnexthop': '10.0.0.1', 'pref': '110'}}}
+            for idx in range(num_rows)]
+    return {'TABLE_vrf': {'ROW_vrf': [{'vrf-name-out': vrf, 'TABLE_addrf': {'ROW_addrf': {'addrf': 'ipv4',
+                                       'TABLE_prefix': {'ROW_prefix': rows}}}} for vrf in ['default', 'BLU']]}}
+
+
+def bgp_table(num_rows):
+    rows = [{'ipprefix': '1.{}.0.0/16'.format(idx), 'TABLE_path': {'ROW_path': [{'type': 'external', 'status': 'valid',
+                                                                                  'best': 'bestpath', 'weight': 32768}]}}
+            for idx in range(num_rows)]
+    return {'TABLE_vrf': {'ROW_vrf': {'vrf-name-out': 'default', 'TABLE_afi': {'ROW_afi': {'afi': 1, 'TABLE_safi': {'ROW_safi': {
+        'safi': 1, 'TABLE_rd': {'ROW_rd': {'TABLE_prefix': {'ROW_prefix': rows}}}}}}}}}}
+
+
+@pytest.mark.parametrize('cmd, output', [('show ip route vrf all | json', route_table(600)),
+                                         ('show bgp vrf all ipv4 unicast | json', bgp_table(300))])
+def test_stream_same_as_parser(monkeypatch, cmd, output):
+    stream = parse_cmd('nxos', cmd, json.dumps(output))
+    monkeypatch.setattr(parsers, 'ijson', None)
+    assert to_dict(stream[1]) == to_dict(parse_cmd('nxos', cmd, json.dumps(output))[1])
+
+
+def test_text_reader():
+    reader = TextReader('{"descr": "café"}')
+    chunks = [reader.read(4) for idx in range(6)]
+    assert b''.join(chunks).decode() == '{"descr": "café"}' and chunks[-1] == b''
+
+
+# COLUMNAR: Only the native compare gets a PrefixTable, napalm compare and the DM output get the same table as nested dicts
+@pytest.mark.parametrize('stream', [True, False])
+def test_parse_to_dicts(monkeypatch, stream):
+    if not stream:
+        monkeypatch.setattr(parsers, 'ijson', None)
+    output = json.dumps(route_table(20))
+    columnar = parse_cmd('nxos', 'show ip route vrf all | json', output)[1]
+    nested = parse_cmd('nxos', 'show ip route vrf all | json', output, columnar=False)[1]
+    assert isinstance(columnar, PrefixTable) and not isinstance(nested, PrefixTable)
+    assert nested == to_dict(columnar) and list(nested) == list(columnar)
+    assert parsers.parse('nxos', {'show ip route vrf all | json': output})['show ip route vrf all'] == nested
+
+
+POOL_OUTPUT = {'show ip route vrf all | json': json.dumps(route_table(50)), 'show bgp vrf all ipv4 unicast | json': json.dumps(bgp_table(20)),
+               'show port-channel summary | json': None}
+POOL_DESIRED = {'show ip route vrf all': {'10.0.1.0/24': {'vrf': 'global', 'ad': '110'}, '9.9.9.9/32': {'vrf': 'BLU'}},
+                'show bgp vrf all ipv4 unicast': {'1.3.0.0/16': {'vrf': 'global'}}, 'show port-channel summary': {'Po1': {}}}
+
+
+def test_cmd_desired():
+    assert cmd_desired('nxos', 'show ip route vrf all | json', '{}', POOL_DESIRED) == {
+        'show ip route vrf all': POOL_DESIRED['show ip route vrf all']}
+    assert cmd_desired('nxos', 'show port-channel summary | json', None, POOL_DESIRED) == {
+        'show port-channel summary': {'Po1': {}}}
+    assert cmd_desired('nxos', 'show vpc | json', '{}', POOL_DESIRED) == {}
+
+
+@pytest.mark.parametrize('native', [(), list(POOL_DESIRED)])
+def test_pool_same_as_serial(native):
+    serial = validate('nxos', POOL_OUTPUT, json.loads(json.dumps(POOL_DESIRED)), native=native)
+    pool = validate('nxos', POOL_OUTPUT, json.loads(json.dumps(POOL_DESIRED)), workers=2, min_size=0, native=native)
+    assert pool == serial and list(pool) == list(POOL_DESIRED)
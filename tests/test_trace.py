@@ -0,0 +1,57 @@
+"""Checks the trace settings and run id set once per run (module_utils/trace) are used by the processes the run starts.
+
+python -m pytest -q tests
+"""
+
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from module_utils import trace
+
+
+@pytest.fixture
+def run(monkeypatch):
+    monkeypatch.setattr(trace, 'SETTINGS', None)
+    monkeypatch.setattr(trace, 'CREATED', set())
+    monkeypatch.delenv('BUILD_FABRIC_TRACE', raising=False)
+    monkeypatch.setenv('BUILD_FABRIC_TRACE_SETTINGS', '')
+    yield
+    trace.SETTINGS = None
+
+
+def worker(host):
+    with trace.span('render', host):
+        pass
+
+
+# WORKERS: Spans of the process that configured the run and of the processes it starts are in the one file named after the run
+def test_run_file(run, tmp_path):
+    settings = trace.configure({'format': 'ndjson', 'keep': 2}, str(tmp_path))
+    assert settings == {'format': 'ndjson', 'keep': 2, 'directory': str(tmp_path / 'trace')}
+    with trace.span('inventory'):
+        pass
+    procs = [multiprocessing.get_context('spawn').Process(target=worker, args=(host,)) for host in ['LEAF01', 'LEAF02']]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    assert os.listdir(str(tmp_path / 'trace')) == ['{}.ndjson'.format(trace.RUN)]
+    spans = trace.load(str(tmp_path / 'trace' / '{}.ndjson'.format(trace.RUN)))
+    assert sorted((each_span['phase'], each_span['host']) for each_span in spans) == [
+        ('inventory', None), ('render', 'LEAF01'), ('render', 'LEAF02')]
+    assert {each_span['run'] for each_span in spans} == {trace.RUN}
+    assert len({each_span['pid'] for each_span in spans}) == 3
+
+
+# DISABLED: No ans.trace (such as -e overriding the var file) is exported as disabled so no process reads any other settings
+def test_disabled(run, tmp_path):
+    trace.configure(None, str(tmp_path))
+    trace.SETTINGS = None
+    assert trace.settings() == {}
+    with trace.span('inventory'):
+        pass
+    assert not os.path.exists(str(tmp_path / 'trace'))